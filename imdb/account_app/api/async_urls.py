@@ -0,0 +1,17 @@
+"""
+The routes of urls.py, with registration served by its async variant (see
+async_views.py). Used by the ASGI application through imdb/async_urls.py.
+"""
+from django.urls import path
+
+from . import async_views, urls
+
+ASYNC_VIEWS = {
+    'api-register': async_views.AsyncRegisterView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,32 @@
+"""
+Async registration, served by the ASGI application (see imdb/async_urls.py).
+
+Validation and the insert are cheap; the password hash is not. Hashing runs in
+the bounded pool of account_app.api.hashing, so a burst of signups keeps at most
+PASSWORD_HASH_WORKERS cores busy and never holds the thread that runs other
+requests' synchronous code. The insert then runs in a worker thread like every
+other write.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from account_app.api.hashing import amake_password
+from account_app.api.serializers import RegistrationSerializer
+from watchlist_app.api.async_views import AsyncDispatchMixin
+
+
+class AsyncRegisterView(AsyncDispatchMixin, APIView):
+    """
+    Register a user (async); same request and responses as views.register.
+    """
+
+    async def post(self, request):
+        serializer = RegistrationSerializer(data=request.data)
+        # Validation runs no queries; uniqueness is left to the insert
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        password_hash = await amake_password(serializer.validated_data['password'])
+        # A taken username or email raises a ValidationError, answered with a 400
+        await sync_to_async(serializer.save)(password_hash=password_hash)
+        return Response({'message': 'User registered successfully'}, status=201)
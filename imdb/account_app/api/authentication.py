@@ -0,0 +1,213 @@
+"""
+Token authentication that caches the resolved user instead of joining
+authtoken_token and auth_user on every request.
+
+Resolved tokens are kept in two tiers:
+
+* a bounded, per-process LRU (TOKEN_CACHE_SIZE entries, each trusted for
+  TOKEN_CACHE_LOCAL_TTL seconds), which costs no I/O at all;
+* the shared default cache (TOKEN_CACHE_TTL seconds), so a token resolved by
+  one worker is a cache hit for the others.
+
+Logging out, changing a password and deactivating or deleting a user evict the
+token from the shared cache and from the local LRU of the process that made the
+change (see account_app.signals). Other processes stop using their local copy
+within TOKEN_CACHE_LOCAL_TTL seconds.
+
+Cache keys are hashes of the token, so raw tokens never reach the cache server.
+Entries hold only the user fields authentication needs (USER_FIELDS), never
+the password hash; the user is rebuilt from them, unsaved, like token_user()
+does for JSON web tokens.
+
+JWTAuthentication is the stateless alternative: a JSON web token is verified by
+its signature and expiry and the user is rebuilt from its claims, so no request
+touches the database. Logout revokes a token through account_app.api.revocation.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt import authentication as jwt_authentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from account_app.api.revocation import revoked_tokens
+
+
+# What a cached token keeps of its user: enough for permissions and foreign keys
+USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+class TokenCache:
+    """
+    Two-tier cache of resolved tokens keyed by token: the token's key and
+    creation time, and the USER_FIELDS of its user. Each lookup builds new
+    Token and User instances, so concurrent requests never share objects.
+    """
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(('local_hits', 'shared_hits', 'misses', 'evictions'), 0)
+
+    @property
+    def maxsize(self):
+        return getattr(settings, 'TOKEN_CACHE_SIZE', 10000)
+
+    @property
+    def local_ttl(self):
+        return getattr(settings, 'TOKEN_CACHE_LOCAL_TTL', 5)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'TOKEN_CACHE_TTL', 300)
+
+    @staticmethod
+    def shared_key(key):
+        # v2: entries used to be pickled Token instances, password hash included
+        return 'auth:token:v2:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def dump(token):
+        return (token.key, token.created, tuple(getattr(token.user, name) for name in USER_FIELDS))
+
+    @staticmethod
+    def load(entry):
+        key, created, values = entry
+        user = User(**dict(zip(USER_FIELDS, values)))
+        token = Token(key=key, user=user, created=created)
+        # Both exist in the database; they are never saved from here
+        user._state.adding = token._state.adding = False
+        return token
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(key)
+                self._counts['local_hits'] += 1
+                return self.load(entry[1])
+        payload = cache.get(self.shared_key(key))
+        if payload is None:
+            self._count('misses')
+            return None
+        self._count('shared_hits')
+        self._remember(key, payload)
+        return self.load(payload)
+
+    def set(self, key, token):
+        payload = self.dump(token)
+        cache.set(self.shared_key(key), payload, self.ttl)
+        self._remember(key, payload)
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, payload)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def evict(self, *keys):
+        if not keys:
+            return
+        cache.delete_many([self.shared_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+            self._counts['evictions'] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        """
+        Hit, miss and eviction counters of this process, plus the LRU size.
+        """
+        with self._lock:
+            return {**self._counts, 'local_size': len(self._local)}
+
+
+token_cache = TokenCache()
+
+
+def token_cache_metrics():
+    """
+    Collector exposing `token_cache.stats()` on /metrics (see imdb.metrics).
+    """
+    stats = token_cache.stats()
+    lookups = {
+        (('result', result),): stats[key]
+        for result, key in (('local_hit', 'local_hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses'))
+    }
+    return [
+        ('token_cache_lookups_total', 'counter', 'Token cache lookups by outcome.', lookups),
+        ('token_cache_evictions_total', 'counter', 'Tokens evicted from the cache.', {(): stats['evictions']}),
+        ('token_cache_local_entries', 'gauge', 'Tokens held in the in-process LRU.', {(): stats['local_size']}),
+    ]
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication backed by `token_cache`.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+            return (user, token)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (token.user, token)
+
+
+def token_user(validated_token):
+    """
+    The user a validated token was issued to, rebuilt from its claims (see
+    ClaimsTokenObtainPairSerializer) without a query. Unlike simplejwt's
+    TokenUser it is a User instance, so it can be assigned to foreign keys and
+    compared with users loaded from the database. It is never saved.
+    """
+    user = User(
+        # simplejwt stores the id as a string
+        id=User._meta.pk.to_python(validated_token[jwt_settings.USER_ID_CLAIM]),
+        username=validated_token.get('username', ''),
+        is_staff=validated_token.get('is_staff', False),
+        is_superuser=validated_token.get('is_superuser', False),
+        is_active=True,
+    )
+    user._state.adding = False
+    return user
+
+
+class JWTAuthentication(jwt_authentication.JWTAuthentication):
+    """
+    Stateless authentication with an 'Authorization: Bearer <access token>'
+    header. A deactivated user's tokens stay valid until they expire
+    (ACCESS_TOKEN_LIFETIME), unless revoked by logging out.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revoked_tokens.is_revoked(token[jwt_settings.JTI_CLAIM], token['exp']):
+            raise InvalidToken('Token has been revoked.')
+        return token
+
+    def get_user(self, validated_token):
+        if jwt_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return token_user(validated_token)
@@ -0,0 +1,43 @@
+"""
+Password hashing off the request thread.
+
+A PBKDF2 hash with Django's default iterations costs hundreds of milliseconds
+of CPU. Under ASGI, synchronous code runs on one shared thread per worker
+(`sync_to_async` is thread-sensitive by default), so a signup hashing there
+would stall every other synchronous request. The async register view hands the
+hash to a pool of PASSWORD_HASH_WORKERS threads instead; hashlib releases the
+GIL while hashing, so the pool keeps that many cores busy and queues the rest.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def executor():
+    """
+    This process's hashing pool, created on first use (and again after a fork,
+    whose child doesn't inherit the threads).
+    """
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash',
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+async def amake_password(password):
+    """
+    `make_password(password)`, run in the hashing pool.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor(), make_password, password)
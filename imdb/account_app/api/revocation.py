@@ -0,0 +1,236 @@
+"""
+Revocation of JSON web tokens without a database.
+
+Access and refresh tokens are verified by their signature and expiry alone
+(see account_app.api.authentication.JWTAuthentication). Logging out revokes a
+token by its JTI (the random id in its `jti` claim), and every request checks
+the JTI against an in-memory Bloom filter of revoked JTIs:
+
+* the check hashes nothing: JTIs are random 128-bit hex strings, so the JTI
+  itself, read as an integer, supplies the bit positions (double hashing). It
+  does no I/O and allocates nothing beyond that integer;
+* a miss means "not revoked" and ends the check; a hit is confirmed against an
+  exact per-JTI key in the shared cache, so the filter's false positives
+  (JWT_REVOCATION_ERROR_RATE at JWT_REVOCATION_CAPACITY revocations) never
+  reject a valid token.
+
+Revoked JTIs only matter until the token expires, so filters are kept per
+generation: a token belongs to generation `exp // window`, window being the
+longer of the two token lifetimes. At most two generations are alive at any
+time and expired ones are dropped whole, so a filter never needs deletes.
+
+Revocations reach the other workers through the shared default cache: each
+generation has a counter and one numbered key per revoked JTI. Every worker
+reads the counter at most once per JWT_REVOCATION_SYNC_SECONDS and adds the
+JTIs it hasn't seen yet to its filter; the worker that revokes a token adds it
+at once. As with the token cache, several workers need a shared cache backend
+(Redis, Memcached) that keeps these keys until they expire.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+MASK_64 = (1 << 64) - 1
+
+
+def jti_key(jti):
+    """
+    The 128-bit integer a JTI is looked up by: simplejwt JTIs are uuid4 hex,
+    anything else is hashed down to the same size.
+    """
+    if len(jti) == 32:
+        try:
+            return int(jti, 16)
+        except ValueError:
+            pass
+    return int.from_bytes(hashlib.blake2b(jti.encode(), digest_size=16).digest(), 'big')
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over 128-bit integer keys, sized for `capacity`
+    keys at `error_rate` false positives. The low and high 64 bits of a key are
+    the two hashes of Kirsch-Mitzenmacher double hashing.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key):
+        bits, size = self.bits, self.size
+        position, step = (key & MASK_64) % size, ((key >> 64) | 1) % size
+        for _ in range(self.hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+            position = (position + step) % size
+        self.count += 1
+
+    def __contains__(self, key):
+        bits, size = self.bits, self.size
+        position, step = (key & MASK_64) % size, ((key >> 64) | 1) % size
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + step) % size
+        return True
+
+
+class Generation:
+    """
+    The filter of one generation and how far it has caught up with the shared
+    list of revocations.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.filter = BloomFilter(capacity, error_rate)
+        self.synced = 0
+        # Numbered revocations that were missing at the last sync (not written yet)
+        self.missing = ()
+        self.checked_at = -math.inf
+
+
+class RevocationList:
+    """
+    Revoked JTIs, shared by every worker through the default cache.
+    """
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(('misses', 'false_positives', 'revoked', 'revocations'), 0)
+
+    @property
+    def capacity(self):
+        return getattr(settings, 'JWT_REVOCATION_CAPACITY', 100_000)
+
+    @property
+    def error_rate(self):
+        return getattr(settings, 'JWT_REVOCATION_ERROR_RATE', 0.001)
+
+    @property
+    def sync_seconds(self):
+        return getattr(settings, 'JWT_REVOCATION_SYNC_SECONDS', 1)
+
+    @property
+    def window(self):
+        # Seconds covered by one generation: the longest a token lives
+        lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+        return max(1, int(lifetime.total_seconds()))
+
+    @staticmethod
+    def count_key(generation):
+        return f'auth:jwt:revoked:{generation}'
+
+    @staticmethod
+    def entry_key(generation, number):
+        return f'auth:jwt:revoked:{generation}:{number}'
+
+    @staticmethod
+    def jti_cache_key(jti):
+        return f'auth:jwt:revoked:jti:{jti}'
+
+    def _timeout(self, generation):
+        # Keep a generation's keys until its last token has expired
+        return max(1, math.ceil((generation + 1) * self.window - time.time()) + 60)
+
+    def _generation(self, generation):
+        """
+        The local state of `generation`, synced with the shared cache if it
+        hasn't been for JWT_REVOCATION_SYNC_SECONDS.
+        """
+        state = self._generations.get(generation)
+        if state is not None and state.checked_at + self.sync_seconds > time.monotonic():
+            return state
+        with self._lock:
+            state = self._generations.get(generation)
+            if state is None:
+                state = self._generations[generation] = Generation(self.capacity, self.error_rate)
+                # Expired generations can't hold a token that would still be accepted
+                current = int(time.time()) // self.window
+                for stale in [g for g in self._generations if g < current]:
+                    del self._generations[stale]
+            if state.checked_at + self.sync_seconds <= time.monotonic():
+                self._sync(generation, state)
+        return state
+
+    def _sync(self, generation, state):
+        count = cache.get(self.count_key(generation)) or 0
+        numbers = [*state.missing, *range(state.synced + 1, count + 1)]
+        if numbers:
+            found = cache.get_many([self.entry_key(generation, n) for n in numbers])
+            for n in numbers:
+                jti = found.get(self.entry_key(generation, n))
+                if jti is not None:
+                    state.filter.add(jti_key(jti))
+            # A revocation numbered but not yet written is retried once, at the next sync
+            state.missing = [
+                n for n in numbers[len(state.missing):] if self.entry_key(generation, n) not in found
+            ]
+            state.synced = max(state.synced, count)
+        state.checked_at = time.monotonic()
+
+    def revoke(self, jti, exp):
+        """
+        Revoke the token with this JTI and `exp` claim, for every worker.
+        """
+        generation = int(exp) // self.window
+        timeout = self._timeout(generation)
+        cache.set(self.jti_cache_key(jti), True, max(1, math.ceil(exp - time.time()) + 60))
+        # add() is a no-op if the counter exists; incr() is atomic on shared backends
+        cache.add(self.count_key(generation), 0, timeout)
+        number = cache.incr(self.count_key(generation))
+        cache.set(self.entry_key(generation, number), jti, timeout)
+        state = self._generation(generation)
+        with self._lock:
+            state.filter.add(jti_key(jti))
+            self._counts['revocations'] += 1
+
+    def is_revoked(self, jti, exp):
+        state = self._generation(int(exp) // self.window)
+        if jti_key(jti) not in state.filter:
+            self._counts['misses'] += 1
+            return False
+        if cache.get(self.jti_cache_key(jti)) is None:
+            self._counts['false_positives'] += 1
+            return False
+        self._counts['revoked'] += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._generations.clear()
+
+    def stats(self):
+        """
+        Check outcomes and revocations of this process, plus the revoked JTIs
+        held by its filters.
+        """
+        with self._lock:
+            entries = sum(state.filter.count for state in self._generations.values())
+            return {**self._counts, 'entries': entries}
+
+
+revoked_tokens = RevocationList()
+
+
+def revocation_metrics():
+    """
+    Collector exposing `revoked_tokens.stats()` on /metrics (see imdb.metrics).
+    """
+    stats = revoked_tokens.stats()
+    checks = {
+        (('result', result),): stats[key]
+        for result, key in (('miss', 'misses'), ('false_positive', 'false_positives'), ('revoked', 'revoked'))
+    }
+    return [
+        ('jwt_revocation_checks_total', 'counter', 'JWT revocation checks by outcome.', checks),
+        ('jwt_revocations_total', 'counter', 'JWTs revoked by this process.', {(): stats['revocations']}),
+        ('jwt_revocation_entries', 'gauge', 'Revoked JTIs held in the in-process filters.', {(): stats['entries']}),
+    ]
@@ -1,8 +1,40 @@
 # The `RegistrationSerializer` class in Django is used for serializing and validating user
-# registration data, ensuring passwords match and checking for existing usernames and emails before
-# saving the user.
+# registration data, ensuring passwords match. Usernames and emails are kept unique by the
+# database (see account_app/migrations/0001_unique_user_email.py): the user is inserted
+# directly and a unique violation is reported as a validation error. The token serializers
+# put the claims JWTAuthentication needs into JWTs and honour revocations on refresh.
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account_app.api.revocation import revoked_tokens
+
+
+# Created by account_app's migration 0001
+EMAIL_INDEX = 'account_user_email_uniq'
+
+
+def duplicate_error(exc):
+    """
+    The validation error for an insert that hit auth_user's unique username or
+    the unique email index, or None for any other integrity error. PostgreSQL
+    names the constraint (auth_user_username_key, or an index name), SQLite
+    the column.
+    """
+    diag = getattr(exc.__cause__, 'diag', None)
+    message = f"{exc} {getattr(diag, 'constraint_name', None) or ''}"
+    if EMAIL_INDEX in message or 'auth_user.email' in message:
+        return {'email': ['Email already exists.']}
+    if 'auth_user.username' in message or 'auth_user_username' in message:
+        return {'username': ['A user with that username already exists.']}
+    return None
+
 
 class RegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
@@ -10,24 +42,64 @@ class RegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'email', 'password', 'password2']
-        
-    def save(self,):
-        user = User(
-            username=self.validated_data['username'],
-            email=self.validated_data['email']
-        )
-        password = self.validated_data['password']
-        password2 = self.validated_data['password2']
-        
-        if password != password2:
+        # No UniqueValidator: it would query for the username before the insert checks it anyway
+        extra_kwargs = {'username': {'validators': [UnicodeUsernameValidator()]}}
+
+    def validate(self, attrs):
+        if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError("Passwords do not match")
-        
-        if User.objects.filter(username=user.username).exists():
-            raise serializers.ValidationError("Username already exists")
-        
-        if User.objects.filter(email=user.email).exists():
-            raise serializers.ValidationError("Email already exists")
-        
-        user.set_password(password)
-        user.save()
+        return attrs
+
+    def create(self, validated_data):
+        """
+        Insert the user, hashing the password exactly once. The async view
+        hashes it off the request thread and passes `password_hash` to save().
+        """
+        password = validated_data.pop('password')
+        validated_data.pop('password2')
+        password_hash = validated_data.pop('password_hash', None) or make_password(password)
+        user = User(password=password_hash, **validated_data)
+        try:
+            # A savepoint, so a duplicate doesn't break an enclosing transaction
+            with transaction.atomic():
+                user.save()
+        except IntegrityError as exc:
+            error = duplicate_error(exc)
+            if error is None:
+                raise
+            raise serializers.ValidationError(error)
         return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Token pairs carrying what permissions need to know about the user, so
+    JWTAuthentication never has to load it. Access tokens copy these claims
+    from the refresh token they are issued from.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses refresh tokens revoked by logout. With ROTATE_REFRESH_TOKENS the
+    refresh token that was used is revoked in turn, as the blacklist app would
+    do with a table.
+    """
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        jti, exp = refresh[jwt_settings.JTI_CLAIM], refresh['exp']
+        if revoked_tokens.is_revoked(jti, exp):
+            raise InvalidToken('Token has been revoked.')
+        data = super().validate(attrs)
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            revoked_tokens.revoke(jti, exp)
+        return data
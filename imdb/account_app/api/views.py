@@ -1,7 +1,12 @@
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.authentication import TokenAuthentication
+from account_app.api.authentication import CachedTokenAuthentication, JWTAuthentication
+from account_app.api.revocation import revoked_tokens
+from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import RegistrationSerializer
 
 @api_view(['POST'])
@@ -9,19 +14,33 @@ def register(request):
     if request.method == 'POST':
         serializer = RegistrationSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            user.set_password(serializer.validated_data['password'])
-            user.save()
+            # Hashes the password once; a taken username or email raises a 400
+            serializer.save()
             return Response({'message': 'User registered successfully'}, status=201)
         return Response(serializer.errors, status=400)
     return Response({'error': 'Method not allowed'}, status=405)
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def logout(request):
-    # With IsAuthenticated + TokenAuthentication, request.auth is a Token instance.
-    # Still guard defensively to be safe:
-    if getattr(request, "auth", None) is not None:
+    # With CachedTokenAuthentication, request.auth is a Token instance. Deleting it
+    # also evicts it from the token cache.
+    if isinstance(request.auth, Token):
         request.auth.delete()
-    return Response({'message': 'User logged out successfully'}, status=200)
\ No newline at end of file
+        return Response({'message': 'User logged out successfully'}, status=200)
+
+    # With JWTAuthentication, request.auth is the validated access token; revoke it,
+    # and the refresh token it came with if one is posted as {"refresh": ...}
+    tokens = [request.auth]
+    if request.data.get('refresh'):
+        try:
+            refresh = RefreshToken(request.data['refresh'])
+        except TokenError as exc:
+            return Response({'refresh': [str(exc)]}, status=400)
+        if refresh[jwt_settings.USER_ID_CLAIM] != request.auth[jwt_settings.USER_ID_CLAIM]:
+            return Response({'refresh': ['Token belongs to another user.']}, status=400)
+        tokens.append(refresh)
+    for token in tokens:
+        revoked_tokens.revoke(token[jwt_settings.JTI_CLAIM], token['exp'])
+    return Response({'message': 'User logged out successfully'}, status=200)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AccountAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'account_app'
+
+    def ready(self):
+        # Connect the token cache eviction signal handlers
+        from account_app import signals  # noqa: F401
+        from account_app.api.authentication import token_cache_metrics
+        from account_app.api.revocation import revocation_metrics
+        from imdb.metrics import registry
+        registry.register_collector(token_cache_metrics)
+        registry.register_collector(revocation_metrics)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncRequestFactory
+from rest_framework import serializers
+
+from account_app.api.async_views import AsyncRegisterView
+from account_app.api.serializers import RegistrationSerializer
+from watchlist_app.benchmarks import QueryTimer, scratch_database, summarize
+
+PASSWORD = 'benchmark-password'
+
+
+class LegacyRegistrationSerializer(serializers.ModelSerializer):
+    """
+    RegistrationSerializer as it was before hashing once: existence checks
+    before the insert, and a hash in save().
+    """
+    password = serializers.CharField(write_only=True, required=True)
+    password2 = serializers.CharField(write_only=True, required=True)
+
+    class Meta:
+        model = User
+        fields = ['username', 'email', 'password', 'password2']
+
+    def save(self):
+        user = User(username=self.validated_data['username'], email=self.validated_data['email'])
+        if self.validated_data['password'] != self.validated_data['password2']:
+            raise serializers.ValidationError("Passwords do not match")
+        if User.objects.filter(username=user.username).exists():
+            raise serializers.ValidationError("Username already exists")
+        if User.objects.filter(email=user.email).exists():
+            raise serializers.ValidationError("Email already exists")
+        user.set_password(self.validated_data['password'])
+        user.save()
+        return user
+
+
+def legacy_register(data):
+    # The old view hashed and saved a second time after the serializer
+    serializer = LegacyRegistrationSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    user = serializer.save()
+    user.set_password(serializer.validated_data['password'])
+    user.save()
+
+
+def register(data):
+    serializer = RegistrationSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure signups per second per core of the registration pipeline before "
+        "(two password hashes, existence checks, an INSERT and an UPDATE) and after "
+        "(one hash, one INSERT), one signup at a time, then of the async endpoint with "
+        "--clients concurrent signups hashing in the PASSWORD_HASH_WORKERS pool. Runs on "
+        "a scratch database with the configured password hasher."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=20, help='Signups per mode.')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent signups on the async endpoint.')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the scratch database.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['signups'] < 1 or options['clients'] < 1:
+            raise CommandError('--signups and --clients must be positive.')
+        hasher = get_hasher()
+        report = {
+            'hasher': hasher.algorithm,
+            'iterations': getattr(hasher, 'iterations', None),
+            'cpus': os.cpu_count(),
+            'hash_workers': settings.PASSWORD_HASH_WORKERS,
+            'signups': options['signups'],
+            'clients': options['clients'],
+        }
+        with scratch_database(keepdb=options['keepdb']):
+            User.objects.filter(username__startswith='bench-').delete()
+            report['before'] = self.run_sequential(legacy_register, 'before', options['signups'])
+            report['after'] = self.run_sequential(register, 'after', options['signups'])
+            report['after_async'] = asyncio.run(self.run_async(options['signups'], options['clients']))
+            for alias in connections:
+                connections[alias].close()
+
+        report['speedup_per_core'] = round(
+            report['after']['signups_per_core_second'] / report['before']['signups_per_core_second'], 2
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{report['hasher']} ({report['iterations']} iterations), {report['cpus']} CPU(s), "
+            f"{report['hash_workers']} hash worker(s)"
+        )
+        for name in ('before', 'after', 'after_async'):
+            stats = report[name]
+            queries = f"  {stats['queries_per_signup']:4.1f} queries" if 'queries_per_signup' in stats else ''
+            self.stdout.write(
+                f"{name:12} {stats['signups_per_second']:8.2f} signups/s  "
+                f"{stats['signups_per_core_second']:8.2f} per core  p50 {stats['p50_ms']:8.2f} ms{queries}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Signups per core: {report['speedup_per_core']}x"))
+
+    @staticmethod
+    def data(mode, i):
+        return {'username': f'bench-{mode}-{i}', 'email': f'bench-{mode}-{i}@example.com',
+                'password': PASSWORD, 'password2': PASSWORD}
+
+    def run_sequential(self, signup, mode, count):
+        timer = QueryTimer()
+        samples = []
+        cpu, wall = time.process_time(), time.perf_counter()
+        with connection.execute_wrapper(timer):
+            for i in range(count):
+                start = time.perf_counter()
+                signup(self.data(mode, i))
+                samples.append((time.perf_counter() - start) * 1000)
+        report = self.summary(samples, time.perf_counter() - wall, time.process_time() - cpu)
+        report['queries_per_signup'] = round(timer.count / count, 2)
+        return report
+
+    async def run_async(self, count, clients):
+        view = AsyncRegisterView.as_view()
+        factory = AsyncRequestFactory()
+        queue = iter(range(count))
+        samples = []
+
+        async def client():
+            for i in queue:
+                request = factory.post('/api/account/register/', self.data('async', i), content_type='application/json')
+                start = time.perf_counter()
+                response = await view(request)
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 201:
+                    raise CommandError(f'Signup failed with {response.status_code}: {response.data}')
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return self.summary(samples, time.perf_counter() - wall, time.process_time() - cpu)
+
+    @staticmethod
+    def summary(samples, seconds, cpu_seconds):
+        # Process CPU time covers every thread, so signups per CPU second is per core
+        return {
+            'signups_per_second': round(len(samples) / seconds, 2),
+            'signups_per_core_second': round(len(samples) / max(cpu_seconds, 1e-9), 2),
+            **summarize(samples),
+        }
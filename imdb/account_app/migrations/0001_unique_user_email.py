@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count
+
+EMAIL_INDEX = 'account_user_email_uniq'
+# Duplicated emails listed when the index can't be created
+MAX_REPORTED = 20
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Refuse to go on while users share an email: the index would fail with a
+    bare IntegrityError. Accounts made in the admin or with createsuperuser
+    never went through registration's check, so older databases may have some.
+    """
+    users = apps.get_model('auth', 'User').objects.using(schema_editor.connection.alias)
+    shared = list(
+        users.exclude(email='').values('email').annotate(n=Count('pk')).filter(n__gt=1)
+        .order_by('email').values_list('email', flat=True)[:MAX_REPORTED + 1]
+    )
+    if not shared:
+        return
+    lines = [
+        f"  {email}: users {', '.join(map(str, users.filter(email=email).order_by('pk').values_list('pk', flat=True)))}"
+        for email in shared[:MAX_REPORTED]
+    ]
+    if len(shared) > MAX_REPORTED:
+        lines.append('  ...')
+    raise RuntimeError(
+        'Cannot make user emails unique: these are shared by several users.\n' + '\n'.join(lines)
+        + '\nGive each of these users an email of their own, or clear it, then run migrate again.'
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Registration relies on the database to reject a taken email, as auth_user
+    already does for usernames. Users without an email are exempt.
+    """
+
+    dependencies = [
+        # After auth's last change to auth_user: SQLite applies those by rebuilding
+        # the table, which would drop this index
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        # Partial unique indexes have the same syntax on PostgreSQL and SQLite
+        migrations.RunSQL(
+            f"CREATE UNIQUE INDEX {EMAIL_INDEX} ON auth_user (email) WHERE email <> ''",
+            f"DROP INDEX {EMAIL_INDEX}",
+        ),
+    ]
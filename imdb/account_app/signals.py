@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from account_app.api.authentication import token_cache
+
+
+def _evict(keys, using=None):
+    token_cache.evict(*keys)
+    # Evict again once the write is visible: a request may have cached the old
+    # row between the first eviction and the commit
+    transaction.on_commit(lambda: token_cache.evict(*keys), using=using)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, using=None, **kwargs):
+    """
+    Logging out deletes the token; it must stop authenticating at once.
+    """
+    _evict([instance.key], using)
+
+
+@receiver(post_save, sender=User)
+def evict_user_tokens(sender, instance, created, using=None, **kwargs):
+    """
+    A password change or deactivation must not be hidden by a cached user.
+    """
+    if created:
+        return
+    keys = list(Token.objects.using(using).filter(user=instance).values_list('key', flat=True))
+    if keys:
+        _evict(keys, using)
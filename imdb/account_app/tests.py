@@ -1,8 +1,25 @@
-from django.urls import reverse
+from importlib import import_module
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.hashers import check_password, get_hasher
+from django.urls import resolve, reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.apps import apps
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+
+from datetime import date
+
+from account_app.api.authentication import token_cache
+from account_app.api.revocation import BloomFilter, jti_key, revoked_tokens
+from account_app.api.serializers import EMAIL_INDEX, duplicate_error
+from watchlist_app.api.throttle_stores import get_store
+from watchlist_app.models import Review, WatchList
 # Create your tests here.
 
 class UserRegistrationTests(APITestCase):
@@ -16,4 +33,196 @@ class UserRegistrationTests(APITestCase):
         response = self.client.post(reverse('api-register'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def register(self, username, email='', password='testpassword', password2=None):
+        data = {'username': username, 'email': email, 'password': password, 'password2': password2 or password}
+        return self.client.post(reverse('api-register'), data, format='json')
+
+    def test_hashes_once_and_only_inserts(self):
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.register('hashonce', 'once@example.com')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(encode.call_count, 1)
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        self.assertEqual([s for s in statements if s in ('SELECT', 'INSERT', 'UPDATE')], ['INSERT'])
+        self.assertTrue(check_password('testpassword', User.objects.get(username='hashonce').password))
+
+    def test_duplicates_are_rejected_by_the_database(self):
+        self.register('taken', 'taken@example.com')
+        response = self.register('taken', 'other@example.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', response.data)
+        response = self.register('other', 'taken@example.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'email': ['Email already exists.']})
+        # An email is optional, and many users may leave it out
+        self.assertEqual(self.register('no-email-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.register('no-email-2').status_code, status.HTTP_201_CREATED)
+        response = self.register('mismatch', password='testpassword', password2='different')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_other_integrity_errors_are_not_reported_as_duplicates(self):
+        self.assertEqual(duplicate_error(IntegrityError('UNIQUE constraint failed: auth_user.username')),
+                         {'username': ['A user with that username already exists.']})
+        self.assertIsNone(duplicate_error(IntegrityError('NOT NULL constraint failed: auth_user.password')))
+        with mock.patch.object(User, 'save', side_effect=IntegrityError('CHECK constraint failed: other')):
+            with self.assertRaises(IntegrityError):
+                self.register('broken', 'broken@example.com')
+
+    def test_email_index_migration_reports_shared_emails(self):
+        migration = import_module('account_app.migrations.0001_unique_user_email')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX {EMAIL_INDEX}')  # Rolled back with the test
+        for username in ('admin1', 'admin2'):
+            User.objects.create_superuser(username, 'shared@example.com', 'pw')
+        User.objects.create_user('solo', 'solo@example.com', 'pw')
+        editor = mock.Mock(connection=connection)
+        with self.assertRaisesMessage(RuntimeError, 'shared@example.com: users'):
+            migration.check_duplicate_emails(apps, editor)
+        User.objects.filter(username='admin2').update(email='')
+        migration.check_duplicate_emails(apps, editor)
+
+    def test_async_registration(self):
+        url = reverse('api-register')
+        self.assertTrue(iscoroutinefunction(resolve(url, urlconf='imdb.async_urls').func))
+        data = {'username': 'asyncuser', 'email': 'async@example.com', 'password': 'pw', 'password2': 'pw'}
+        with self.settings(ROOT_URLCONF='imdb.async_urls'):
+            response = async_to_sync(self.async_client.post)(url, data, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            response = async_to_sync(self.async_client.post)(url, data, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(check_password('pw', User.objects.get(username='asyncuser').password))
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'readerpassword')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('user-reviews') + '?username=reader'
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        return [q['sql'] for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+
+    def test_token_lookup_is_cached(self):
+        before = token_cache.stats()
+        self.assertEqual(len(self.auth_queries()), 1)
+        self.assertEqual(self.auth_queries(), [])
+        after = token_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['local_hits'] - before['local_hits'], 1)
+
+    def test_shared_cache_serves_other_workers(self):
+        self.auth_queries()
+        token_cache.clear()  # Another process: empty LRU, same shared cache
+        before = token_cache.stats()
+        self.assertEqual(self.auth_queries(), [])
+        self.assertEqual(token_cache.stats()['shared_hits'] - before['shared_hits'], 1)
+
+    def test_cache_holds_no_password_hash(self):
+        self.auth_queries()
+        entry = cache.get(token_cache.shared_key(self.token.key))
+        self.assertNotIn(self.user.password, repr(entry))
+        token_cache.clear()
+        token = token_cache.get(self.token.key)
+        self.assertEqual((token.pk, token.user_id), (self.token.pk, self.user.pk))
+        self.assertEqual((token.user.username, token.user.password), ('reader', ''))
+
+    def test_logout_evicts_token(self):
+        self.auth_queries()
+        response = self.client.post(reverse('api-logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_evicts_token(self):
+        self.auth_queries()
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_evicts_token(self):
+        self.auth_queries()
+        self.user.set_password('a-new-password')
+        self.user.save()
+        self.assertEqual(len(self.auth_queries()), 1)
+
+
+class JWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_store().clear()
+        revoked_tokens.clear()
+        self.user = User.objects.create_user('jwtreader', 'jwt@example.com', 'readerpassword')
+        self.admin = User.objects.create_user('jwtadmin', 'jwtadmin@example.com', 'adminpassword', is_staff=True)
+        self.movie = WatchList.objects.create(
+            title='Signed', description='A description long enough to validate.', release_date=date(2020, 1, 1),
+        )
+
+    def login(self, username, password):
+        response = self.client.post(reverse('token-obtain-pair'), {'username': username, 'password': password})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        return response.data
+
+    def test_verification_needs_no_queries(self):
+        self.login('jwtreader', 'readerpassword')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user-reviews') + '?username=jwtreader')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # Authenticated, no reviews yet
+        # Only the view's own query, which joins auth_user to filter by username
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('authtoken', ctx.captured_queries[0]['sql'])
+
+    def test_claims_drive_writes_and_permissions(self):
+        self.login('jwtreader', 'readerpassword')
+        url = reverse('review-create', args=[self.movie.pk])
+        response = self.client.post(url, {'rating': 8, 'review_text': 'Stateless.'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['review_user'], 'jwtreader')
+        review = Review.objects.get()
+        self.assertEqual(review.review_user, self.user)
+        # Owner checks compare the claims user with the stored one
+        response = self.client.put(reverse('review-detail', args=[review.pk]), {'rating': 9, 'review_text': 'Edited.'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = {'title': 'New', 'description': 'A description long enough to validate.', 'release_date': '2021-01-01'}
+        self.assertEqual(self.client.post(reverse('movie-list'), data).status_code, status.HTTP_403_FORBIDDEN)
+        self.login('jwtadmin', 'adminpassword')
+        self.assertEqual(self.client.post(reverse('movie-list'), data).status_code, status.HTTP_201_CREATED)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        tokens = self.login('jwtreader', 'readerpassword')
+        url = reverse('user-reviews') + '?username=jwtreader'
+        response = self.client.post(reverse('api-logout'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        # Another worker: empty filters, same shared cache
+        revoked_tokens.clear()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rotated_refresh_token_is_revoked(self):
+        tokens = self.login('jwtreader', 'readerpassword')
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.client.get(reverse('user-reviews') + '?username=jwtreader').status_code, 404)
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        members = [jti_key(f'{i:032x}') for i in range(1000)]
+        for key in members:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in members))
+        others = [jti_key(f'other-{i}') for i in range(10000)]
+        self.assertLess(sum(key in bloom for key in others), 300)
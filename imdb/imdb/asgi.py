@@ -2,6 +2,8 @@
 ASGI config for imdb project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests it handles resolve against imdb/async_urls.py, which serves the read
+endpoints with async views; imdb.wsgi.application keeps the synchronous ones.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +11,20 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imdb.settings')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+
+class AsyncReadRequest(ASGIRequest):
+    # Django resolves a request against request.urlconf when it has one
+    urlconf = 'imdb.async_urls'
+
+
+class AsyncReadHandler(ASGIHandler):
+    request_class = AsyncReadRequest
+
+
+application = AsyncReadHandler()
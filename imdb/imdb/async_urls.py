@@ -0,0 +1,17 @@
+"""
+Root URLconf of the ASGI application (see imdb/asgi.py): imdb/urls.py with the
+watchlist API's read endpoints, exports and registration served by async views. Route names are the same,
+so reverse() gives the same URLs under both applications.
+"""
+from django.urls import include, path
+
+from account_app.api import async_urls as account_async_urls
+from imdb import urls
+from watchlist_app.api import async_urls as watchlist_async_urls
+
+urlpatterns = [
+    # Listed first, so it shadows the synchronous include in imdb.urls
+    path('api/watchlist/', include(watchlist_async_urls)),
+    path('api/account/', include(account_async_urls)),
+    *urls.urlpatterns,
+]
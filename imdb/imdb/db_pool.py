@@ -0,0 +1,268 @@
+"""
+Per-process database connection pools.
+
+Without a pool every request pays for a fresh connection (TCP, TLS and
+authentication round trips) because CONN_MAX_AGE is 0. With the pooled
+backend (imdb.pooled_postgresql) Django still "closes" its connection at the
+end of each request, but the connection goes back to a pool instead and the
+next request checks it out again.
+
+Each worker process has its own pool per database, configured by the POOL
+entry of the database settings:
+
+* MIN_SIZE: idle connections kept open even when unused;
+* MAX_SIZE: connections open at once; checkouts beyond it wait. A deployment
+  opens at most workers x MAX_SIZE connections per database;
+* TIMEOUT: seconds a checkout waits before raising PoolTimeout;
+* MAX_IDLE: idle connections beyond MIN_SIZE are closed after this many seconds;
+* MAX_LIFETIME: connections are closed when returned after this many seconds;
+* CHECK_AFTER: a connection idle for this many seconds is pinged on checkout,
+  and replaced if the ping fails.
+
+Pool statistics are exported on /metrics.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+from imdb.metrics import registry
+
+DEFAULTS = {
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 4,
+    'TIMEOUT': 10.0,
+    'MAX_IDLE': 300.0,
+    'MAX_LIFETIME': 3600.0,
+    'CHECK_AFTER': 5.0,
+}
+
+
+class PoolTimeout(OperationalError):
+    """
+    No connection became available within the pool's TIMEOUT.
+    """
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of DB-API connections.
+
+    `connect` opens a connection. `check(connection)` tells whether an idle
+    connection still works (e.g. by running SELECT 1); `reset(connection)`
+    prepares a returned connection for its next user and returns False if it
+    should be closed instead. Both are optional.
+    """
+
+    def __init__(self, connect, *, check=None, reset=None, name='default', **options):
+        options = {**DEFAULTS, **{key.upper(): value for key, value in options.items()}}
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.name = name
+        self.min_size = options['MIN_SIZE']
+        self.max_size = options['MAX_SIZE']
+        self.timeout = options['TIMEOUT']
+        self.max_idle = options['MAX_IDLE']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.check_after = options['CHECK_AFTER']
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # (connection, opened, returned); the most recently returned is on the right
+        self._idle = deque()
+        self._opened = {}
+        self._size = 0
+        self._waiting = 0
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'opened': 0,
+            'closed': 0,
+            'failed_checks': 0,
+        }
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._lock:
+                self._evict(time.monotonic())
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection available in the {self.name!r} pool after {self.timeout} seconds '
+                            f'({self.max_size} in use).'
+                        )
+                    if not waited:
+                        waited = True
+                        self.stats['waits'] += 1
+                    self._waiting += 1
+                    try:
+                        self._available.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    connection, opened, returned = self._idle.pop()
+                else:
+                    # Reserve the slot, then connect without holding the lock
+                    connection = None
+                    self._size += 1
+
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except BaseException:
+                    with self._lock:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+                with self._lock:
+                    self._opened[id(connection)] = time.monotonic()
+                    self.stats['opened'] += 1
+            elif self.check and time.monotonic() - returned >= self.check_after and not self.check(connection):
+                with self._lock:
+                    self.stats['failed_checks'] += 1
+                self._discard(connection)
+                continue
+
+            with self._lock:
+                self.stats['checkouts'] += 1
+                if waited:
+                    self.stats['wait_seconds'] += time.monotonic() - started
+            return connection
+
+    def putconn(self, connection):
+        now = time.monotonic()
+        with self._lock:
+            opened = self._opened.get(id(connection), now)
+        if now - opened >= self.max_lifetime or (self.reset and not self.reset(connection)):
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append((connection, opened, now))
+            self._evict(now)
+            self._available.notify()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened.pop(id(connection), None)
+            self._size -= 1
+            self.stats['closed'] += 1
+            self._available.notify()
+
+    def _evict(self, now):
+        # Called with the lock held; the least recently returned connections go first
+        while len(self._idle) and self._size > self.min_size and now - self._idle[0][2] >= self.max_idle:
+            connection, opened, returned = self._idle.popleft()
+            self._opened.pop(id(connection), None)
+            self._size -= 1
+            self.stats['closed'] += 1
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self.stats['closed'] += len(idle)
+        for connection, opened, returned in idle:
+            self._opened.pop(id(connection), None)
+            connection.close()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'max_size': self.max_size,
+                **self.stats,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(key, factory):
+    """
+    The pool stored under `key` in this process, created by `factory()` on
+    first use. Pools are never shared with forked children, which start empty.
+    """
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Inherited connections belong to the parent; forget, don't close them
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = factory()
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_metrics():
+    """
+    Collector exposing the state of every pool on /metrics (see imdb.metrics).
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    gauges = {'size': {}, 'idle': {}, 'in_use': {}, 'waiting': {}, 'max_size': {}}
+    counters = {'checkouts': {}, 'waits': {}, 'wait_seconds': {}, 'timeouts': {}, 'opened': {}, 'closed': {},
+                'failed_checks': {}}
+    for pool in pools:
+        labels = (('database', pool.name),)
+        snapshot = pool.snapshot()
+        for name, samples in (*gauges.items(), *counters.items()):
+            # Several pools (e.g. after the test database replaced the real one) add up
+            samples[labels] = samples.get(labels, 0) + snapshot[name]
+    descriptions = {
+        'size': 'Open connections.',
+        'idle': 'Connections waiting in the pool.',
+        'in_use': 'Connections checked out.',
+        'waiting': 'Checkouts waiting for a connection.',
+        'max_size': 'Maximum open connections.',
+        'checkouts': 'Connections checked out.',
+        'waits': 'Checkouts that had to wait for a connection.',
+        'wait_seconds': 'Time spent waiting for a connection.',
+        'timeouts': 'Checkouts that gave up waiting.',
+        'opened': 'Connections opened.',
+        'closed': 'Connections closed (idle, too old, or failing a health check).',
+        'failed_checks': 'Idle connections that failed the checkout health check.',
+    }
+    return [
+        *(
+            (f'db_pool_{name}', 'gauge', descriptions[name], samples)
+            for name, samples in gauges.items()
+        ),
+        *(
+            (f'db_pool_{name}_total', 'counter', descriptions[name], samples)
+            for name, samples in counters.items()
+        ),
+    ]
+
+
+registry.register_collector(pool_metrics)
@@ -0,0 +1,257 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+ReplicaRoutingMiddleware picks, once per request, where that request's reads go:
+
+* safe methods (GET, HEAD, OPTIONS) read from a replica in
+  settings.DATABASE_REPLICAS, chosen round-robin or by least replication lag
+  (settings.REPLICA_SELECTION);
+* other methods, and every request from a client that wrote within the last
+  settings.REPLICA_PIN_SECONDS, use the primary, so clients see their own writes.
+
+Clients are identified by their Authorization header or session cookie (hashed),
+and pins live in the default cache, so they hold across workers. Anonymous
+clients cannot write and are never pinned. `request.pinned_to_primary` tells
+whether a safe request's client is pinned, and `reads_from_replica()` whether
+the current request reads from a replica.
+
+ReplicaRouter applies the choice, which is kept in a context variable so that it
+follows the request into sync_to_async threads and into streaming bodies (read
+after the middleware has returned). Writes always go to the primary, as do reads
+of users, tokens and sessions: those are cached anyway, and a token created by a
+login must authenticate the very next request.
+
+A replica whose lag exceeds settings.REPLICA_MAX_LAG_SECONDS, or that cannot be
+reached, is skipped; with no usable replica, reads fall back to the primary.
+"""
+import contextvars
+import hashlib
+import itertools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from imdb.metrics import registry
+
+logger = logging.getLogger('imdb.db_router')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Apps whose rows are always read from the primary
+PRIMARY_ONLY_APPS = frozenset({'auth', 'authtoken', 'sessions'})
+
+# Replica lag, in seconds; 0 when caught up
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    ),
+}
+
+# Alias the current request reads from; None means the primary
+read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+class ReplicaSelector:
+    """
+    Chooses a replica per request and keeps the (briefly cached) lag of each.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._lag = {}
+        self.reads = {}
+
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def choose(self):
+        replicas = self.replicas()
+        if not replicas:
+            return None
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+        usable = [alias for alias in replicas if self.lag(alias) <= max_lag]
+        if not usable:
+            return None
+        if getattr(settings, 'REPLICA_SELECTION', 'round_robin') == 'least_lag':
+            alias = min(usable, key=self.lag)
+        else:
+            alias = usable[next(self._turn) % len(usable)]
+        with self._lock:
+            self.reads[alias] = self.reads.get(alias, 0) + 1
+        return alias
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked, lag = self._lag.get(alias, (None, 0.0))
+        if checked is not None and now - checked < getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 2):
+            return lag
+        lag = self.measure_lag(alias)
+        with self._lock:
+            self._lag[alias] = (now, lag)
+        return lag
+
+    @staticmethod
+    def measure_lag(alias):
+        connection = connections[alias]
+        sql = LAG_QUERIES.get(connection.vendor)
+        try:
+            if sql is None:
+                # No way to tell (e.g. SQLite stand-ins); only check the replica answers
+                connection.ensure_connection()
+                return 0.0
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                return float(cursor.fetchone()[0])
+        except DatabaseError:
+            logger.warning('Replica %s is unreachable; reading from the primary instead', alias, exc_info=True)
+            return float('inf')
+
+    def forget(self):
+        with self._lock:
+            self._lag.clear()
+            self.reads.clear()
+            self._turn = itertools.count()
+
+
+selector = ReplicaSelector()
+
+
+def replica_metrics():
+    """
+    Collector exposing replica lag and routed reads on /metrics (see imdb.metrics).
+    """
+    with selector._lock:
+        lag = {(('alias', alias),): value for alias, (checked, value) in selector._lag.items()}
+        reads = {(('alias', alias),): count for alias, count in selector.reads.items()}
+    return [
+        ('db_replica_lag_seconds', 'gauge', 'Last measured replication lag per replica.', lag),
+        ('db_replica_requests_total', 'counter', 'Requests whose reads were routed to each replica.', reads),
+    ]
+
+
+registry.register_collector(replica_metrics)
+
+
+def client_key(request):
+    """
+    A hash identifying the client for pinning, or None for anonymous clients.
+    """
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'db:pin:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+def reads_from_replica():
+    return read_alias.get() is not None
+
+
+def pinned_stream(content, alias):
+    """
+    Wrap a streaming body, sync or async, so that it is read from `alias` too.
+    """
+    if hasattr(content, '__aiter__'):
+        async def stream():
+            token = read_alias.set(alias)
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                read_alias.reset(token)
+        return stream()
+
+    def stream():
+        token = read_alias.set(alias)
+        try:
+            yield from content
+        finally:
+            read_alias.reset(token)
+    return stream()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decides per request whether reads may go to a replica, and pins clients to
+    the primary after they write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        client, token = self.start(request)
+        alias = read_alias.get()
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        return self.finish(request, response, client, alias)
+
+    async def __acall__(self, request):
+        client, token = self.start(request)
+        alias = read_alias.get()
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        return self.finish(request, response, client, alias)
+
+    @staticmethod
+    def start(request):
+        request.pinned_to_primary = False
+        if not selector.replicas():
+            return None, read_alias.set(None)
+        client = client_key(request)
+        alias = None
+        if request.method in SAFE_METHODS:
+            request.pinned_to_primary = bool(client and cache.get(client))
+            if not request.pinned_to_primary:
+                alias = selector.choose()
+        return client, read_alias.set(alias)
+
+    @staticmethod
+    def finish(request, response, client, alias):
+        if client and request.method not in SAFE_METHODS and response.status_code < 400:
+            # Read your writes: this client reads from the primary for a while
+            cache.set(client, True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+        if alias is not None and response.streaming:
+            # Exports query as their body is read, after the alias was reset
+            response.streaming_content = pinned_stream(response.streaming_content, alias)
+        return response
+
+
+class ReplicaRouter:
+    """
+    Send each request's reads where ReplicaRoutingMiddleware decided; writes,
+    and reads outside a request, go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
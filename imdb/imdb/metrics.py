@@ -0,0 +1,156 @@
+"""
+In-process metrics served in the Prometheus text format at /metrics.
+
+Histograms are fixed-bucket and keyed by label values, so recording a request
+is a bisect and a few additions under a lock. Other components expose their own
+numbers by registering a collector: a callable returning
+`(name, type, help, samples)` tuples, evaluated on every scrape, where samples
+maps label pairs such as `(('tier', 'local'),)` (or `()`) to a value.
+
+Each process keeps its own registry: with several workers, scrape each worker
+(or run one metrics port per worker) and sum in Prometheus.
+"""
+import hmac
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    A Prometheus histogram with one series per combination of label values.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Bucket counts are stored per bucket and summed on scrape
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        names = self.labelnames + ('le',)
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """
+    The histograms and collectors rendered by the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for pairs, value in samples.items():
+                    lines.append(f'{name}{_labels(*zip(*pairs)) if pairs else ""} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self._metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+REQUEST_LABELS = ('route', 'method', 'status')
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time from the first middleware to the rendered response.',
+    REQUEST_LABELS,
+)
+request_db_duration = registry.histogram(
+    'http_request_db_duration_seconds', 'Time spent executing SQL per request.', REQUEST_LABELS,
+)
+request_queries = registry.histogram(
+    'http_request_queries', 'SQL queries executed per request.', REQUEST_LABELS, QUERY_BUCKETS,
+)
+request_app_duration = registry.histogram(
+    'http_request_app_duration_seconds',
+    'Time in middleware, views and serializers, excluding SQL and rendering.', REQUEST_LABELS,
+)
+request_render_duration = registry.histogram(
+    'http_request_render_duration_seconds', 'Time spent rendering the response body.', REQUEST_LABELS,
+)
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Response body size.', REQUEST_LABELS, SIZE_BUCKETS,
+)
+
+
+def metrics_view(request):
+    """
+    Serve the registry. When settings.METRICS_TOKEN is set, scrapers must send
+    it as `Authorization: Bearer <token>`.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized\n', status=401, content_type=CONTENT_TYPE)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
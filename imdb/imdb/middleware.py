@@ -0,0 +1,197 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware should come first in MIDDLEWARE so that it times the
+whole stack. For every request it measures:
+
+* total time, from entering the middleware to having a rendered response;
+* the number of SQL queries and the time spent executing them (on every
+  database connection, including those of the threads sync_to_async runs ORM
+  calls in);
+* render time: for DRF responses, turning the serialized data into bytes;
+* app time: everything else, mostly views and serializers;
+* response size (for streamed responses, once the stream has been sent; SQL
+  run while streaming is not counted).
+
+These are returned in a `Server-Timing` header (shown by browser dev tools),
+recorded in the histograms of imdb.metrics labelled by route name, method and
+status, and, for requests slower than settings.SLOW_REQUEST_MS, logged to the
+`imdb.requests` logger together with their SQL.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from imdb import metrics
+
+logger = logging.getLogger('imdb.requests')
+
+# SQL statements kept per request for the slow-request log
+MAX_LOGGED_QUERIES = 50
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting queries, summing their time and keeping
+    the first MAX_LOGGED_QUERIES statements (without parameters).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < MAX_LOGGED_QUERIES:
+                self.statements.append((elapsed, sql))
+
+
+# The recorder of the request being handled. Connections are per thread, but
+# context variables follow a request into the threads of sync_to_async.
+current_recorder = ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection, passing each query to the
+    current request's recorder, if any.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request, adds the Server-Timing header and records the metrics.
+    Works in both sync and async stacks, so it never forces an ASGI request
+    into a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Called right before render(); async, so Django doesn't wrap it in a thread
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, start = self.start(request)
+        # Connections opened before this module was imported lack the wrapper
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder, start = self.start(request)
+        # ORM calls run in sync_to_async threads, with a copy of this context
+        token = current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    @staticmethod
+    def start(request):
+        request._render_seconds = 0.0
+        return QueryRecorder(), time.perf_counter()
+
+    def finish(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        labels = (match.view_name if match else 'unmatched', request.method, str(response.status_code))
+        render = request._render_seconds
+        app = max(total - recorder.seconds - render, 0.0)
+        response['Server-Timing'] = (
+            f'db;dur={recorder.seconds * 1000:.2f};desc="{recorder.count} queries", '
+            f'app;dur={app * 1000:.2f}, render;dur={render * 1000:.2f}, total;dur={total * 1000:.2f}'
+        )
+        metrics.request_duration.observe(total, *labels)
+        metrics.request_db_duration.observe(recorder.seconds, *labels)
+        metrics.request_queries.observe(recorder.count, *labels)
+        metrics.request_app_duration.observe(app, *labels)
+        metrics.request_render_duration.observe(render, *labels)
+        if response.streaming:
+            count = self.acount_streamed if response.is_async else self.count_streamed
+            response.streaming_content = count(response.streaming_content, labels)
+        else:
+            metrics.response_size.observe(len(response.content), *labels)
+
+        if total * 1000 >= getattr(settings, 'SLOW_REQUEST_MS', 500):
+            self.log_slow(request, labels, total, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs last among template-response hooks, right before render()
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return RequestMetricsMiddleware.process_template_response(self, request, response)
+
+    @staticmethod
+    def count_streamed(chunks, labels):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.response_size.observe(size, *labels)
+
+    @staticmethod
+    async def acount_streamed(chunks, labels):
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.response_size.observe(size, *labels)
+
+    @staticmethod
+    def log_slow(request, labels, total, recorder):
+        statements = '\n'.join(f'  {seconds * 1000:8.2f} ms  {sql}' for seconds, sql in recorder.statements)
+        if recorder.count > len(recorder.statements):
+            statements += f'\n  ... {recorder.count - len(recorder.statements)} more'
+        logger.warning(
+            'Slow request %s %s (%s, status %s): %.1f ms, %d queries in %.1f ms\n%s',
+            request.method, request.get_full_path(), labels[0], labels[2],
+            total * 1000, recorder.count, recorder.seconds * 1000, statements,
+        )
@@ -0,0 +1,70 @@
+"""
+The PostgreSQL backend with a per-process connection pool (see imdb.db_pool).
+
+Works with psycopg2 and psycopg 3. Without a POOL entry in the database
+settings it behaves exactly like django.db.backends.postgresql.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.base.base import NO_DB_ALIAS
+
+from imdb.db_pool import ConnectionPool, get_pool
+
+# Transaction status values shared by psycopg2 and psycopg 3
+TRANSACTION_IDLE = 0
+TRANSACTION_UNKNOWN = 4
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def connection_pool(self):
+        options = self.settings_dict.get('POOL')
+        # Connections made without a database (e.g. creating the test database) aren't pooled
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        settings = self.settings_dict
+        # The test runner switches NAME to the test database; that gets its own pool
+        key = (self.alias, settings['NAME'], settings['HOST'], settings['PORT'], settings['USER'])
+        return get_pool(key, lambda: ConnectionPool(
+            lambda: super(DatabaseWrapper, self).get_new_connection(self.get_connection_params()),
+            check=self.check_connection, reset=self.reset_connection, name=self.alias, **options,
+        ))
+
+    def get_new_connection(self, conn_params):
+        pool = self.connection_pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.getconn()
+
+    def _close(self):
+        pool = self.connection_pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            connection, self.connection = self.connection, None
+            pool.putconn(connection)
+
+    def check_connection(self, connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return self.reset_connection(connection)
+
+    @staticmethod
+    def reset_connection(connection):
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == TRANSACTION_UNKNOWN:
+            return False
+        if status != TRANSACTION_IDLE:
+            # Returned mid-transaction (e.g. closed inside atomic()); don't leak it
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                return False
+        return True
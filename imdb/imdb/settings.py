@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Full-text search and trigram lookups
 ]
 
 EXTERNAL_APPS = [
@@ -52,6 +54,10 @@ EXTERNAL_APPS = [
 INSTALLED_APPS += EXTERNAL_APPS
 
 MIDDLEWARE = [
+    # First, so it times everything below it (see imdb/middleware.py)
+    'imdb.middleware.RequestMetricsMiddleware',
+    # Before anything that reads the database (see imdb/db_router.py)
+    'imdb.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,17 +90,54 @@ WSGI_APPLICATION = 'imdb.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection details come from the environment. Each worker process keeps a
+# pool of connections per database (see imdb/db_pool.py), so requests don't pay
+# for connecting; CONN_MAX_AGE stays 0 so that every request hands its
+# connection back. Set DATABASE_POOL_MAX_SIZE=0 to connect per request instead.
+DATABASE_POOL_MAX_SIZE = int(os.environ.get('DATABASE_POOL_MAX_SIZE', 4))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'railway',                       
-        'USER': 'postgres',                        
-        'PASSWORD': 'ccOKTNveYpqNBbxaqXXRiRDIEOzUwfKd', 
-        'HOST': 'trolley.proxy.rlwy.net',          
-        'PORT': '28950',                           
+        'ENGINE': os.environ.get('DATABASE_ENGINE', 'imdb.pooled_postgresql'),
+        'NAME': os.environ.get('DATABASE_NAME', 'railway'),
+        'USER': os.environ.get('DATABASE_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', 'ccOKTNveYpqNBbxaqXXRiRDIEOzUwfKd'),
+        'HOST': os.environ.get('DATABASE_HOST', 'trolley.proxy.rlwy.net'),
+        'PORT': os.environ.get('DATABASE_PORT', '28950'),
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': DATABASE_POOL_MAX_SIZE,
+            # Seconds a request waits for a free connection before failing
+            'TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+            # Idle connections beyond MIN_SIZE are closed after this many seconds
+            'MAX_IDLE': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 300)),
+            'MAX_LIFETIME': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+            # Connections idle for this long are pinged before being handed out
+            'CHECK_AFTER': float(os.environ.get('DATABASE_POOL_CHECK_AFTER', 5)),
+        } if DATABASE_POOL_MAX_SIZE else None,
     }
 }
 
+# Read replicas (see imdb/db_router.py). Each host in DATABASE_REPLICA_HOSTS
+# (comma-separated) gets an alias with the primary's credentials; tests mirror
+# them to the primary. Locally, any extra alias in DATABASES listed in
+# DATABASE_REPLICAS works, e.g. a copy of a SQLite database.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['imdb.db_router.ReplicaRouter']
+
+# 'round_robin' or 'least_lag'
+REPLICA_SELECTION = os.environ.get('REPLICA_SELECTION', 'round_robin')
+# After a write, the client reads from the primary for this many seconds
+REPLICA_PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS', 5))
+# Replicas lagging more than this are skipped; lag is re-measured this often
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_LAG_CHECK_SECONDS = 2
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -131,34 +174,133 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Response-cache generations live here. With more than one
+# worker process, point this at a shared backend (e.g. Redis or Memcached) so
+# invalidation reaches every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Token authentication cache (see account_app/api/authentication.py): entries in
+# the shared cache live TOKEN_CACHE_TTL seconds; each worker also keeps up to
+# TOKEN_CACHE_SIZE tokens in memory for TOKEN_CACHE_LOCAL_TTL seconds.
+TOKEN_CACHE_TTL = 300
+TOKEN_CACHE_LOCAL_TTL = 5
+TOKEN_CACHE_SIZE = 10000
+
+# Passwords hashed at once per worker process by the async register endpoint
+# (account_app.api.hashing); PBKDF2 is CPU-bound, so one thread per core.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+
+# Throttle state (see watchlist_app/api/throttle_stores.py). The SQLite store is
+# shared by every worker on one host; put it on tmpfs (e.g. /dev/shm) to keep it
+# in memory. For several hosts use RedisThrottleStore with a redis:// LOCATION.
+THROTTLE_STORES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'THROTTLE_STORE_BACKEND', 'watchlist_app.api.throttle_stores.SQLiteThrottleStore'
+        ),
+        'LOCATION': os.environ.get('THROTTLE_STORE_LOCATION', str(BASE_DIR / 'throttle.sqlite3')),
+    }
+}
+
+# Seconds a rendered response stays in the versioned response cache
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Items validated and written per transaction by the bulk endpoints
+BULK_CHUNK_SIZE = 1000
+
+# Most movies one batch lookup (/api/watchlist/batch/) may ask for
+BATCH_LOOKUP_MAX_IDS = 100
+
+# Rows fetched per round trip (server-side cursor batch) by the export endpoints
+EXPORT_CHUNK_SIZE = 2000
+
+# Deferred work (see watchlist_app/jobs.py), run by `manage.py run_jobs`. A job
+# that raises is retried after JOB_RETRY_BACKOFF * 2**(attempt - 1) seconds, up
+# to JOB_MAX_ATTEMPTS times; one running longer than JOB_TIMEOUT seconds is
+# queued again. JOBS_EAGER=1 runs jobs inside the request instead, for
+# development without a worker.
+JOBS_EAGER = os.environ.get('JOBS_EAGER', '') == '1'
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 5
+JOB_TIMEOUT = 600
+
+# Latest reviews embedded in a title by ?expand=reviews; the rest are paged at
+# the title's `reviews_url`
+REVIEW_PREVIEW_SIZE = int(os.environ.get('REVIEW_PREVIEW_SIZE', 5))
+
+# Titles kept on each top-rated leaderboard (overall, per platform, per year)
+LEADERBOARD_SIZE = 100
+
+# m of the weighted rating: reviews a title needs before its own average counts
+# as much as the catalog mean. Unset, refresh_rating_prior uses the mean number
+# of reviews per reviewed title.
+WEIGHTED_RATING_MIN_REVIEWS = (
+    float(os.environ['WEIGHTED_RATING_MIN_REVIEWS']) if os.environ.get('WEIGHTED_RATING_MIN_REVIEWS') else None
+)
+
+# Requests slower than this are logged with their SQL to the 'imdb.requests' logger
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# If set, /metrics requires 'Authorization: Bearer <METRICS_TOKEN>'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
-    """ 'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.IsAuthenticated',
-    ], """
+    # 'DEFAULT_PERMISSION_CLASSES': [
+    #     'rest_framework.permissions.IsAuthenticated',
+    # ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        #'rest_framework.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with the resolved user cached per token
+        'account_app.api.authentication.CachedTokenAuthentication',
+        # Stateless 'Bearer' JWTs, see SIMPLE_JWT below
+        'account_app.api.authentication.JWTAuthentication',
         #'rest_framework.authentication.BasicAuthentication',
     ],
-    """ 'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-    ], """
+    # 'DEFAULT_THROTTLE_CLASSES': [
+    #     'rest_framework.throttling.AnonRateThrottle',
+    #     'rest_framework.throttling.UserRateThrottle',
+    # ],
+    'DEFAULT_PAGINATION_CLASS': 'watchlist_app.api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 20,
     'DEFAULT_THROTTLE_RATES': {
         'anon': '5/day',
         'user': '10/day',
         'streaming_platforms': '5/minute',
+        # Batch lookups are charged per id; the burst must cover BATCH_LOOKUP_MAX_IDS
+        'batch': '1000/hour',
         }
 }
 
-""" SIMPLE_JWT = {
+# JWT authentication (see account_app/api/authentication.py). Tokens carry the
+# username and staff flags, so verifying one needs no query. There is no
+# blacklist table: refresh tokens used with rotation, and tokens revoked by
+# logout, go into the revocation filter (account_app/api/revocation.py).
+SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,
-    } """
\ No newline at end of file
+    'UPDATE_LAST_LOGIN': False,
+    'TOKEN_OBTAIN_SERIALIZER': 'account_app.api.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'account_app.api.serializers.RevocableTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'account_app.api.authentication.token_user',
+    }
+
+# Revoked JWTs: each worker's filter is sized for JWT_REVOCATION_CAPACITY
+# revocations per token lifetime at JWT_REVOCATION_ERROR_RATE false positives
+# (about 180 KB with the defaults), and picks up other workers' revocations
+# every JWT_REVOCATION_SYNC_SECONDS.
+JWT_REVOCATION_CAPACITY = int(os.environ.get('JWT_REVOCATION_CAPACITY', 100_000))
+JWT_REVOCATION_ERROR_RATE = 0.001
+JWT_REVOCATION_SYNC_SECONDS = 1
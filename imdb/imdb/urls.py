@@ -18,10 +18,12 @@ from django.contrib import admin
 from django.urls import path , include
 from watchlist_app.api import urls as watchlist_urls
 from account_app.api import urls as account_urls
+from imdb.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/watchlist/', include(watchlist_urls)),
     path('api/account/', include(account_urls)),
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape endpoint
     #path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
 ]
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import WatchList, StreamingPlatform, Review
+from .models import WatchList, StreamingPlatform, Review, Job
 
 # Register your models here.
 admin.site.register(WatchList)
 admin.site.register(StreamingPlatform)
-admin.site.register(Review)
\ No newline at end of file
+admin.site.register(Review)
+admin.site.register(Job)
@@ -0,0 +1,249 @@
+"""
+Atomic maintenance of the denormalized rating aggregates on WatchList.
+
+Each title keeps an exact `rating_sum` and `number_of_reviews`; `average_rating`
+is derived from them inside the same UPDATE statement. Every change is a single
+`UPDATE ... SET rating_sum = rating_sum + %s` so concurrent reviews never lose
+updates, only the aggregate columns are written, and the row lock on the title
+is held for exactly one statement at the end of the caller's transaction.
+
+`weighted_rating` is the IMDb formula (v/(v+m))·R + (m/(v+m))·C, where v is the
+number of reviews, R the title's average, C the mean rating of all reviews and
+m the number of reviews at which the title's own average counts as much as C.
+It is written as (rating_sum + m·C) / (v + m), so the same UPDATE derives it
+from the same deltas. C and m live in the single RatingPrior row; they move
+slowly, so `refresh_prior()` recomputes them periodically in one aggregate
+query and only then rewrites every title.
+
+The rating histogram (`ratings_1` ... `ratings_10`, the number of reviews with
+each rating) is shifted by the same UPDATE: a new review adds one to its
+rating's column, a re-rating moves one between columns, a deletion removes one.
+`reconcile_histograms()` repairs it from one grouped pass over the reviews.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+
+from watchlist_app.models import HISTOGRAM_FIELDS, RATINGS, RatingPrior, Review, WatchList, histogram_field
+
+
+def weighted_rating(rating_sum, count, has_reviews):
+    """
+    The weighted rating of a title with `count` reviews summing to `rating_sum`
+    (expressions), or 0 where `has_reviews` doesn't hold. C and m are read from
+    RatingPrior by primary key inside the same statement.
+    """
+    prior = RatingPrior.objects.filter(pk=RatingPrior.SINGLETON)
+    mean = Coalesce(Subquery(prior.values('mean')), Value(0.0))
+    min_reviews = Coalesce(Subquery(prior.values('min_reviews')), Value(0.0))
+    return Case(
+        When(
+            has_reviews,
+            then=Round((Cast(rating_sum, FloatField()) + min_reviews * mean) / (count + min_reviews), 4),
+        ),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def apply_delta(watchlist_id, sum_delta, count_delta, rating_deltas=None):
+    """
+    Shift the aggregates of one title by the given deltas in a single UPDATE;
+    `rating_deltas` maps ratings to changes of their histogram columns.
+    Returns the number of rows updated (0 if the title no longer exists).
+    """
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('number_of_reviews') + count_delta
+    has_reviews = Q(number_of_reviews__gt=-count_delta)
+    return WatchList.objects.filter(pk=watchlist_id).update(
+        rating_sum=new_sum,
+        number_of_reviews=new_count,
+        # Right-hand sides see the pre-update row, so derive the average from the
+        # same deltas; it is rounded to the column's one decimal place in SQL
+        average_rating=Case(
+            When(has_reviews, then=Round(Cast(new_sum, FloatField()) / new_count, 1)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        weighted_rating=weighted_rating(new_sum, new_count, has_reviews),
+        **{
+            histogram_field(rating): F(histogram_field(rating)) + delta
+            for rating, delta in (rating_deltas or {}).items()
+        },
+    )
+
+
+def review_created(watchlist_id, rating):
+    return apply_delta(watchlist_id, rating, 1, {rating: 1})
+
+
+def review_rating_changed(watchlist_id, old_rating, new_rating):
+    if old_rating == new_rating:
+        return 0
+    return apply_delta(watchlist_id, new_rating - old_rating, 0, {old_rating: -1, new_rating: 1})
+
+
+def review_deleted(watchlist_id, rating):
+    return apply_delta(watchlist_id, -rating, -1, {rating: -1})
+
+
+def recomputed_aggregates():
+    """
+    Expressions that recompute each title's aggregates from its reviews, usable
+    both in annotate() and in update().
+    """
+    reviews = Review.objects.filter(watchlist=OuterRef('pk')).order_by().values('watchlist')
+    count = Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), 0)
+    rating_sum = Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0)
+    return {
+        'number_of_reviews': count,
+        'rating_sum': rating_sum,
+        'average_rating': Coalesce(
+            Round(Subquery(reviews.annotate(a=Avg('rating')).values('a')), 1),
+            0.0,
+            output_field=FloatField(),
+        ),
+        'weighted_rating': weighted_rating(rating_sum, count, Q(Exists(reviews))),
+        **{
+            histogram_field(rating): Coalesce(
+                Subquery(reviews.filter(rating=rating).annotate(c=Count('pk')).values('c')), 0,
+            )
+            for rating in RATINGS
+        },
+    }
+
+
+def drifted(queryset=None):
+    """
+    Titles in `queryset` whose stored aggregates disagree with their reviews.
+    Histograms aren't compared; every review write also changes the count or
+    the sum, and `reconcile_histograms()` checks them in bulk.
+    """
+    if queryset is None:
+        queryset = WatchList.objects.all()
+    actual = recomputed_aggregates()
+    return queryset.annotate(
+        actual_count=actual['number_of_reviews'],
+        actual_sum=actual['rating_sum'],
+        actual_average=actual['average_rating'],
+    ).filter(
+        ~Q(number_of_reviews=F('actual_count'))
+        | ~Q(rating_sum=F('actual_sum'))
+        | ~Q(average_rating=F('actual_average'))
+    )
+
+
+def reconcile(queryset=None):
+    """
+    Rewrite the aggregates of every drifted title in `queryset` from its reviews
+    in one UPDATE. Returns the number of titles repaired.
+    """
+    return WatchList.objects.filter(pk__in=drifted(queryset).values('pk')).update(
+        **recomputed_aggregates()
+    )
+
+
+def current_prior():
+    """
+    C and m as computed from the stored aggregates now: one aggregate query over
+    the titles, never over the reviews. settings.WEIGHTED_RATING_MIN_REVIEWS
+    fixes m; otherwise it is the mean number of reviews per reviewed title.
+    """
+    totals = WatchList.objects.aggregate(
+        rating_sum=Sum('rating_sum'),
+        reviews=Sum('number_of_reviews'),
+        reviewed=Count('pk', filter=Q(number_of_reviews__gt=0)),
+    )
+    if not totals['reviews']:
+        return 0.0, 0.0
+    min_reviews = getattr(settings, 'WEIGHTED_RATING_MIN_REVIEWS', None)
+    if min_reviews is None:
+        min_reviews = totals['reviews'] / totals['reviewed']
+    return totals['rating_sum'] / totals['reviews'], float(min_reviews)
+
+
+def refresh_prior(batch_size=20000, force=False):
+    """
+    Store the current C and m and, if they changed (or `force`), rewrite every
+    title's weighted rating in primary key ranges of `batch_size`, one short
+    transaction each. Returns the prior and the number of titles rewritten.
+    """
+    mean, min_reviews = current_prior()
+    with transaction.atomic():
+        prior, created = RatingPrior.objects.select_for_update().get_or_create(pk=RatingPrior.SINGLETON)
+        changed = created or (prior.mean, prior.min_reviews) != (mean, min_reviews)
+        prior.mean, prior.min_reviews = mean, min_reviews
+        prior.save()
+    if not (changed or force):
+        return prior, 0
+
+    rewritten = 0
+    last = WatchList.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last + 1, batch_size):
+        rewritten += WatchList.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+            weighted_rating=weighted_rating(F('rating_sum'), F('number_of_reviews'), Q(number_of_reviews__gt=0)),
+        )
+    return prior, rewritten
+
+
+def histograms(reviews):
+    """
+    The rating histogram of every title with reviews in `reviews`, in title
+    order: one GROUP BY over the reviews.
+    """
+    return reviews.order_by('watchlist_id').values('watchlist_id').annotate(**{
+        histogram_field(rating): Count('pk', filter=Q(rating=rating)) for rating in RATINGS
+    })
+
+
+def drifted_histograms(queryset=None):
+    """
+    Ids of the titles in `queryset` whose stored histogram disagrees with their
+    reviews, found by merging the titles and one grouped pass over the reviews,
+    both streamed in title order.
+    """
+    reviews = Review.objects.all()
+    if queryset is None:
+        queryset = WatchList.objects.all()
+    else:
+        reviews = reviews.filter(watchlist__in=queryset.values('pk'))
+    titles = queryset.order_by('pk').values_list('pk', *HISTOGRAM_FIELDS).iterator(chunk_size=5000)
+    counted = histograms(reviews).iterator(chunk_size=5000)
+    empty = (0,) * len(HISTOGRAM_FIELDS)
+    group = next(counted, None)
+    for pk, *stored in titles:
+        actual = empty
+        # Titles added between the two queries have groups but no row here
+        while group is not None and group['watchlist_id'] < pk:
+            group = next(counted, None)
+        if group is not None and group['watchlist_id'] == pk:
+            actual = tuple(group[field] for field in HISTOGRAM_FIELDS)
+            group = next(counted, None)
+        if tuple(stored) != actual:
+            yield pk
+
+
+def reconcile_histograms(queryset=None, batch_size=2000, dry_run=False):
+    """
+    Rewrite the histogram of every drifted title in `queryset`. Each batch locks
+    its titles, then recounts their reviews, so a review written meanwhile is
+    either counted or applies its own delta after the lock is released.
+    Returns the number of titles found drifted.
+    """
+    drifted_ids = list(drifted_histograms(queryset))
+    if dry_run:
+        return len(drifted_ids)
+    for start in range(0, len(drifted_ids), batch_size):
+        batch = drifted_ids[start:start + batch_size]
+        with transaction.atomic():
+            list(WatchList.objects.select_for_update().filter(pk__in=batch).values_list('pk', flat=True))
+            counted = {
+                group.pop('watchlist_id'): group
+                for group in histograms(Review.objects.filter(watchlist_id__in=batch))
+            }
+            WatchList.objects.bulk_update(
+                [WatchList(pk=pk, **counted.get(pk, dict.fromkeys(HISTOGRAM_FIELDS, 0))) for pk in batch],
+                HISTOGRAM_FIELDS,
+            )
+    return len(drifted_ids)
@@ -0,0 +1,25 @@
+"""
+The routes of urls.py, with the read endpoints and the exports served by their
+async variants (see async_views.py). Used by the ASGI application through imdb/async_urls.py.
+"""
+from django.urls import path
+
+from . import async_views, urls
+
+ASYNC_VIEWS = {
+    'movie-list': async_views.AsyncWatchListView,
+    'movie-detail': async_views.AsyncWatchListDetailView,
+    'search-list': async_views.AsyncSearchWatchListView,
+    'streaming-platform-list': async_views.AsyncStreamingPlatformView,
+    'streaming-platform-detail': async_views.AsyncStreamingPlatformDetailView,
+    'review-list': async_views.AsyncReviewListView,
+    'user-reviews': async_views.AsyncUserReviewDetailView,
+    'movie-export': async_views.AsyncWatchListExportView,
+    'review-export': async_views.AsyncReviewExportView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,223 @@
+"""
+Async variants of the read endpoints, served by the ASGI application.
+
+Each view subclasses its synchronous counterpart in views.py and only replaces
+`get`, which reads through Django's async ORM (`async for`, `afirst`,
+`aexists`). Everything else is inherited unchanged: authentication, permission
+and throttle checks and the write methods run as they always have, in a worker
+thread, via `sync_to_async`. Each write therefore runs start to finish in one
+thread, with its transaction and connection, and cannot interleave with
+another request's.
+
+imdb/async_urls.py routes the read endpoints here under ASGI; WSGI keeps
+serving views.py.
+"""
+from itertools import islice
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from watchlist_app.api.cache import cache_response
+from watchlist_app.api.serializers import StreamingPlatformSerializer, WatchListDetailSerializer, WatchListSerializer
+from watchlist_app.api.views import (
+                                    ReviewExportView,
+                                    ReviewListView,
+                                    SearchWatchListView,
+                                    StreamingPlatformDetailView,
+                                    StreamingPlatformView,
+                                    UserReviewDetailView,
+                                    WatchListDetailView,
+                                    WatchListExportView,
+                                    WatchListView,
+                                )
+from watchlist_app.models import Review, StreamingPlatform, WatchList
+
+
+class AsyncDispatchMixin:
+    """
+    Make a DRF view async: coroutine handlers are awaited, sync handlers (the
+    write methods, OPTIONS) run in a worker thread.
+    """
+    # Django requires all handlers of a view to be either sync or async
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Same steps as APIView.dispatch
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication and throttling may hit the database or cache
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def fetch_page(paginator, queryset, request, view):
+    """
+    Async counterpart of `paginator.paginate_queryset`.
+    """
+    page = paginator.get_page_queryset(queryset, request, view=view)
+    return paginator.set_page([obj async for obj in page])
+
+
+class AsyncListMixin(AsyncDispatchMixin):
+    """
+    Async `get` for the generic list views. Filter backends may run SQL (the
+    SQLite title search does), so filtering happens in a worker thread.
+    """
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def get(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.filter_queryset)(await self.aget_queryset())
+        page = await fetch_page(self.paginator, queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+
+class AsyncWatchListView(AsyncDispatchMixin, WatchListView):
+    """
+    List all movies (async); creating a movie is unchanged.
+    """
+
+    @cache_response('watchlist', 'platform', 'review')
+    async def get(self, request):
+        paginator = self.pagination_class()
+        movies = self.get_sparse_queryset(WatchList.objects.all(), WatchListSerializer, paginator)
+        page = await fetch_page(paginator, movies, request, self)
+        serializer = WatchListSerializer(page, many=True, selection=self.get_selection())
+        return paginator.get_paginated_response(serializer.data)
+
+
+class AsyncWatchListDetailView(AsyncDispatchMixin, WatchListDetailView):
+    """
+    Retrieve a movie (async); updating and deleting are unchanged.
+    """
+
+    @cache_response('watchlist', 'platform', 'review')
+    async def get(self, request, pk):
+        queryset = self.get_sparse_queryset(WatchList.objects.all(), WatchListDetailSerializer)
+        movie = await queryset.filter(pk=pk).afirst()
+        if movie is None:
+            return Response({'error': 'Movie not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = WatchListDetailSerializer(movie, selection=self.get_selection())
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AsyncSearchWatchListView(AsyncListMixin, SearchWatchListView):
+    """
+    Search movies by title (async).
+    """
+
+
+class AsyncStreamingPlatformView(AsyncDispatchMixin, StreamingPlatformView):
+    """
+    List all streaming platforms (async); creating one is unchanged.
+    """
+
+    @cache_response('platform', 'watchlist', 'review')
+    async def get(self, request):
+        paginator = self.pagination_class()
+        platforms = self.get_sparse_queryset(
+            StreamingPlatform.objects.all(), StreamingPlatformSerializer, paginator
+        )
+        page = await fetch_page(paginator, platforms, request, self)
+        serializer = StreamingPlatformSerializer(page, many=True, selection=self.get_selection())
+        return paginator.get_paginated_response(serializer.data)
+
+
+class AsyncStreamingPlatformDetailView(AsyncDispatchMixin, StreamingPlatformDetailView):
+    """
+    Retrieve a streaming platform (async); updating and deleting are unchanged.
+    """
+
+    async def get(self, request, pk):
+        queryset = self.get_sparse_queryset(StreamingPlatform.objects.all(), StreamingPlatformSerializer)
+        platform = await queryset.filter(pk=pk).afirst()
+        if platform is None:
+            return Response({'error': 'Streaming Platform not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = StreamingPlatformSerializer(platform, selection=self.get_selection())
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AsyncReviewListView(AsyncListMixin, ReviewListView):
+    """
+    List the reviews of a movie (async).
+    """
+
+    @cache_response('review')
+    async def get(self, request, *args, **kwargs):
+        return await AsyncListMixin.get(self, request, *args, **kwargs)
+
+
+class AsyncUserReviewDetailView(AsyncListMixin, UserReviewDetailView):
+    """
+    List the reviews of a user (async).
+    """
+
+    async def aget_queryset(self):
+        username = self.request.query_params.get('username')
+        if not username:
+            raise ValidationError("Username parameter is required.")
+        query_set = self.get_sparse_queryset(Review.objects.filter(review_user__username=username))
+        if not await query_set.aexists():
+            raise NotFound(f"No reviews found for user '{username}'.")
+        return query_set
+
+
+async def iterate_chunks(rows, chunk_size):
+    """
+    Async iterator over the sync iterator `rows`, advancing it `chunk_size`
+    rows at a time in the ORM's worker thread. Like `QuerySet.aiterator()`,
+    which can't be used for values_list() querysets: their iterable runs the
+    query as soon as it is created, in the event loop.
+    """
+    while True:
+        chunk = await sync_to_async(list)(islice(rows, chunk_size))
+        if not chunk:
+            return
+        for row in chunk:
+            yield row
+
+
+class AsyncExportMixin(AsyncDispatchMixin):
+    """
+    Async `get` for the export views. Rows are read a chunk at a time and
+    rendered by an async generator, so the ASGI handler sends each chunk as it
+    is read; given a sync iterator, it would build the whole body first.
+    """
+
+    async def get(self, request):
+        # iterator() returns a generator, which runs no SQL until advanced
+        rows = iterate_chunks(self.get_rows().iterator(chunk_size=self.chunk_size), self.chunk_size)
+        return self.stream_response(request.accepted_renderer.astream(list(self.columns), rows))
+
+
+class AsyncWatchListExportView(AsyncExportMixin, WatchListExportView):
+    """
+    Stream the catalog as NDJSON or CSV (async).
+    """
+
+
+class AsyncReviewExportView(AsyncExportMixin, ReviewExportView):
+    """
+    Stream every review as NDJSON or CSV (async).
+    """
@@ -0,0 +1,326 @@
+"""
+Bulk create and upsert for titles, platforms and reviews.
+
+A payload (a JSON array, or NDJSON read lazily line by line) is processed in
+chunks of `BULK_CHUNK_SIZE` items. For each chunk:
+
+* related objects (a title's platform, a review's title) are loaded with one
+  query instead of one lookup per item, and every item is validated by a single
+  serializer instance rather than a fresh one per object;
+* existing rows are matched on the writer's upsert key with one query;
+* rows are written with `bulk_create` / `bulk_update` inside one transaction;
+* one job per title the chunk touched is queued to recount its review
+  aggregates and update the leaderboards (see watchlist_app.tasks).
+
+Invalid items never abort the rest of the payload: the response reports each
+one by its position in the input.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from rest_framework import serializers, status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+from rest_framework.views import APIView
+
+from watchlist_app import tasks
+from watchlist_app.api.cache import bump
+from watchlist_app.api.parsers import NDJSONParser
+from watchlist_app.api.serializers import (
+    BulkReviewSerializer,
+    StreamingPlatformSerializer,
+    WatchListSerializer,
+)
+from watchlist_app.models import Review, StreamingPlatform, WatchList
+
+CHUNK_SIZE = getattr(settings, 'BULK_CHUNK_SIZE', 1000)
+
+
+class PreloadedRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that resolves keys against the objects the writer
+    loaded for the whole chunk, instead of querying once per item.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        model = self.get_queryset().model
+        try:
+            pk = model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.context['preloaded'][model].get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class BulkWriter:
+    """
+    Validates and writes one model's bulk payload; subclasses name the model,
+    the serializer, the upsert key and the cached resources they affect.
+    """
+    model = None
+    serializer_class = None
+    resources = ()
+
+    def __init__(self, request, upsert=False, chunk_size=CHUNK_SIZE):
+        self.request = request
+        self.upsert = upsert
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.context = {'request': request, 'preloaded': {}}
+        self.serializer = self.get_serializer()
+
+    def get_serializer(self):
+        serializer = self.serializer_class(context=self.context)
+        for name, field in list(serializer.fields.items()):
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and not field.read_only:
+                serializer.fields[name] = PreloadedRelatedField(
+                    queryset=field.queryset, allow_null=field.allow_null, required=field.required,
+                )
+            else:
+                # Uniqueness is settled per chunk by matching the upsert key
+                field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+        serializer.validators = [
+            v for v in serializer.validators if not isinstance(v, UniqueTogetherValidator)
+        ]
+        return serializer
+
+    def get_key(self, item, attrs):
+        """
+        The upsert key of a validated item, or None if it can only be created.
+        """
+        raise NotImplementedError
+
+    def get_existing(self, keys):
+        """
+        Map each key in `keys` that already has a row to that row.
+        """
+        raise NotImplementedError
+
+    def build(self, attrs):
+        return self.model(**attrs)
+
+    def run(self, items):
+        items = iter(items)
+        offset = 0
+        while True:
+            chunk = list(islice(items, self.chunk_size))
+            if not chunk:
+                break
+            self.write_chunk(offset, chunk)
+            offset += len(chunk)
+        if self.created or self.updated:
+            # Bulk writes send no model signals; drop cached responses explicitly
+            for resource in self.resources:
+                bump(resource)
+        return offset
+
+    def preload(self, chunk):
+        for name, field in self.serializer.fields.items():
+            if not isinstance(field, PreloadedRelatedField):
+                continue
+            model = field.get_queryset().model
+            keys = set()
+            for item in chunk:
+                if isinstance(item, dict) and item.get(name) is not None:
+                    try:
+                        keys.add(model._meta.pk.to_python(item[name]))
+                    except (DjangoValidationError, TypeError):
+                        pass
+            self.context['preloaded'][model] = (
+                field.get_queryset().filter(pk__in=keys).only('pk').in_bulk()
+            )
+
+    def error(self, index, detail):
+        self.errors.append({'index': index, 'errors': detail})
+
+    def validate_chunk(self, offset, chunk):
+        self.preload(chunk)
+        valid = []
+        for index, item in enumerate(chunk, offset):
+            if isinstance(item, ParseError):
+                self.error(index, {'non_field_errors': [str(item.detail)]})
+                continue
+            if not isinstance(item, dict):
+                self.error(index, {'non_field_errors': ['Expected an object.']})
+                continue
+            try:
+                attrs = self.serializer.run_validation(item)
+            except serializers.ValidationError as exc:
+                self.error(index, exc.detail)
+                continue
+            valid.append((index, item, attrs))
+        return valid
+
+    def write_chunk(self, offset, chunk):
+        rows = {}
+        to_create = []
+        for index, item, attrs in self.validate_chunk(offset, chunk):
+            key = self.get_key(item, attrs)
+            if key is None:
+                to_create.append((index, attrs))
+            elif key in rows:
+                self.error(index, {'non_field_errors': [f'Duplicate of item {rows[key][0]}.']})
+            else:
+                rows[key] = (index, attrs)
+
+        to_update = []
+        try:
+            with transaction.atomic():
+                existing = self.get_existing(list(rows)) if rows else {}
+                for key, (index, attrs) in rows.items():
+                    instance = existing.get(key)
+                    if instance is not None and self.upsert:
+                        to_update.append((index, instance, attrs))
+                    elif instance is not None:
+                        self.error(index, {'non_field_errors': ['Already exists.']})
+                    elif self.can_create(key):
+                        to_create.append((index, attrs))
+                    else:
+                        self.error(index, {'non_field_errors': ['Not found.']})
+
+                if to_create:
+                    self.model.objects.bulk_create([self.build(attrs) for _, attrs in to_create])
+                if to_update:
+                    fields = set()
+                    for _, instance, attrs in to_update:
+                        for name, value in attrs.items():
+                            setattr(instance, name, value)
+                        fields.update(attrs)
+                    self.model.objects.bulk_update([instance for _, instance, _ in to_update], fields)
+                self.after_write(
+                    [attrs for _, attrs in to_create],
+                    [(instance, attrs) for _, instance, attrs in to_update],
+                )
+        except IntegrityError:
+            # A concurrent write took one of the keys after they were looked up;
+            # the chunk was rolled back as a whole
+            for index in [index for index, _ in to_create] + [index for index, _, _ in to_update]:
+                self.error(index, {'non_field_errors': ['Conflicted with a concurrent write; retry.']})
+            return
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+    def can_create(self, key):
+        return True
+
+    def after_write(self, created, updated):
+        pass
+
+    def report(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': len(self.errors),
+            'errors': sorted(self.errors, key=lambda error: error['index']),
+        }
+
+
+class WatchListBulkWriter(BulkWriter):
+    """
+    Titles are created, or with upsert updated when the item carries an `id`.
+    """
+    model = WatchList
+    serializer_class = WatchListSerializer
+    resources = ('watchlist',)
+
+    def get_key(self, item, attrs):
+        pk = item.get('id')
+        if pk is None:
+            return None
+        try:
+            return self.model._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            return None
+
+    def get_existing(self, keys):
+        return self.model.objects.select_for_update().in_bulk(keys)
+
+    def can_create(self, key):
+        # An explicit id that matches nothing is a mistake, not a new title
+        return False
+
+    def after_write(self, created, updated):
+        if updated:
+            # A platform, release date or active flag may have changed
+            tasks.defer_placement([instance.pk for instance, _ in updated])
+
+
+class StreamingPlatformBulkWriter(BulkWriter):
+    """
+    Platforms are matched on their unique name.
+    """
+    model = StreamingPlatform
+    serializer_class = StreamingPlatformSerializer
+    resources = ('platform', 'watchlist')
+
+    def get_key(self, item, attrs):
+        return attrs['name']
+
+    def get_existing(self, keys):
+        return self.model.objects.select_for_update().in_bulk(keys, field_name='name')
+
+
+class ReviewBulkWriter(BulkWriter):
+    """
+    Reviews are written as the requesting user, one per title: with upsert an
+    item for a title the user already reviewed replaces that review.
+    """
+    model = Review
+    serializer_class = BulkReviewSerializer
+    resources = ('review', 'watchlist')
+
+    def get_key(self, item, attrs):
+        return attrs['watchlist'].pk
+
+    def get_existing(self, keys):
+        reviews = self.model.objects.select_for_update().filter(
+            review_user=self.request.user, watchlist__in=keys
+        )
+        return {review.watchlist_id: review for review in reviews}
+
+    def build(self, attrs):
+        return self.model(review_user=self.request.user, **attrs)
+
+    def after_write(self, created, updated):
+        titles = {attrs['watchlist'].pk for attrs in created}
+        titles.update(instance.watchlist_id for instance, _ in updated)
+        if titles:
+            # A worker recounts every touched title once, however many reviews it got
+            tasks.defer_recompute(titles)
+
+
+class BulkWriteView(APIView):
+    """
+    POST creates every item; PUT upserts them. JSON arrays and NDJSON are accepted.
+    """
+    writer_class = None
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request):
+        return self.write(request, upsert=False)
+
+    def put(self, request):
+        return self.write(request, upsert=True)
+
+    def get_items(self, request):
+        items = request.data
+        if isinstance(items, dict) or not hasattr(items, '__iter__') or isinstance(items, str):
+            raise ParseError('Expected a JSON array or NDJSON of objects.')
+        return items
+
+    def write(self, request, upsert):
+        writer = self.writer_class(request, upsert=upsert)
+        total = writer.run(self.get_items(request))
+        report = writer.report()
+        failed_all = total and report['failed'] == total
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if failed_all else status.HTTP_200_OK)
@@ -0,0 +1,147 @@
+"""
+Versioned response cache for the read-heavy views.
+
+Every cached response is keyed by the current generation of each resource it
+depends on ('watchlist', 'review', 'platform'), so bumping a resource's
+generation (done by the signals in watchlist_app.signals) makes every stale
+entry unreachable at once without having to find and delete it. Cached bodies
+are stored already rendered together with a strong ETag; a matching
+`If-None-Match` is answered with 304 straight from the cache, without touching
+the ORM or the serializers.
+
+Generations live in the default cache, which must be shared between workers
+(e.g. Redis or Memcached) for invalidation to reach every process.
+
+With read replicas (see imdb.db_router) only responses read from the primary are
+stored: a replica may not have replayed the write that bumped the generation
+yet, and its stale body would be cached as current. Clients pinned to the
+primary after a write skip the cache altogether.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from imdb.db_router import reads_from_replica
+
+RESOURCES = ('watchlist', 'review', 'platform')
+
+
+def _generation_key(resource):
+    return f'resp:gen:{resource}'
+
+
+def _fresh_generation():
+    # Never restart at 1 after an eviction, or old entries would become reachable again
+    return time.time_ns()
+
+
+def get_generations(resources):
+    keys = [_generation_key(resource) for resource in resources]
+    found = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_generation(), None)
+            found[key] = cache.get(key)
+        generations.append(found[key])
+    return generations
+
+
+def bump(resource):
+    """
+    Invalidate every cached response that depends on `resource`.
+    """
+    key = _generation_key(resource)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), None)
+
+
+def response_key(request, resources):
+    generations = '.'.join(str(g) for g in get_generations(resources))
+    media_type = getattr(request, 'accepted_media_type', '')
+    # The host is part of the key because paginated bodies embed absolute links
+    raw = f'{media_type}|{request.get_host()}|{request.get_full_path()}'
+    digest = hashlib.sha256(raw.encode()).hexdigest()
+    return f"resp:{'.'.join(resources)}:{generations}:{digest}"
+
+
+def make_etag(content):
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+def cache_response(*resources, timeout=None):
+    """
+    Decorate a view's `get` (sync or async) to serve it from the versioned
+    response cache. `resources` lists every resource whose data appears in the
+    response.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def lookup(request):
+        key = response_key(request, resources)
+        if getattr(request, 'pinned_to_primary', False):
+            return key, None
+        cached = cache.get(key)
+        if cached is None:
+            return key, None
+        content, content_type, etag = cached
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        return key, response
+
+    def remember(request, key, response):
+        if response.status_code != 200 or reads_from_replica():
+            return response
+
+        def store(rendered):
+            etag = make_etag(rendered.content)
+            cache.set(key, (rendered.content, rendered['Content-Type'], etag), timeout)
+            rendered['ETag'] = etag
+            if etag_matches(request, etag):
+                not_modified = HttpResponseNotModified()
+                not_modified['ETag'] = etag
+                return not_modified
+            return None
+
+        response.add_post_render_callback(store)
+        return response
+
+    def decorator(handler):
+        if iscoroutinefunction(handler):
+            # Async views: cache round trips run in a worker thread
+            @wraps(handler)
+            async def async_wrapper(view, request, *args, **kwargs):
+                key, response = await sync_to_async(lookup)(request)
+                if response is not None:
+                    return response
+                return remember(request, key, await handler(view, request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key, response = lookup(request)
+            if response is not None:
+                return response
+            return remember(request, key, handler(view, request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+"""
+Streaming exports of the catalog and of reviews as NDJSON or CSV.
+
+Rows are read with `values_list(...).iterator(chunk_size=...)`, which uses a
+server-side cursor on PostgreSQL, and are rendered one at a time into a
+StreamingHttpResponse. No model instances are built and neither the queryset
+nor the body is held in memory, so a worker's memory stays flat however many
+rows are exported. Pick the format with `?format=ndjson|csv` or the Accept
+header.
+
+Under ASGI, Django would collect a sync iterator into a list before sending
+the first byte, so the ASGI application serves these routes with the async
+views in async_views.py, which feed it an async iterator instead.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from watchlist_app.api.renderers import CSVRenderer, NDJSONRenderer
+
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+class ExportView(APIView):
+    """
+    Stream every row of `get_queryset()` matching `filterset_class`, in primary
+    key order. `columns` maps each output column to a `values_list` path.
+    """
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    permission_classes = [IsAdminUser]
+    filterset_class = None
+    columns = {}
+    filename = 'export'
+    chunk_size = CHUNK_SIZE
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset):
+        filterset = self.filterset_class(self.request.query_params, queryset=queryset)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        return filterset.qs
+
+    def get_rows(self):
+        """
+        The filtered rows as a `values_list` queryset, in primary key order.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        return queryset.values_list(*self.columns.values())
+
+    def get(self, request):
+        rows = self.get_rows().iterator(chunk_size=self.chunk_size)
+        return self.stream_response(request.accepted_renderer.stream(list(self.columns), rows))
+
+    def stream_response(self, chunks):
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(chunks, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{renderer.format}"'
+        return response
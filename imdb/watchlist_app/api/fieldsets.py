@@ -0,0 +1,191 @@
+"""
+Sparse fieldsets (`?fields=`) and opt-in expansion (`?expand=`) of nested data.
+
+`?fields=id,title` limits a response to the listed fields; `?expand=reviews`
+embeds a relation that is left out (or rendered as a primary key) by default.
+Expansions nest with dots, e.g. `?expand=watchlist.reviews` on platforms.
+The queryset follows the selection: unselected columns are left out with
+`only()`, and relations are joined or prefetched only when they are expanded.
+A reverse relation may be capped to a preview of its first rows; the preview
+of a whole page is prefetched by one windowed query.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.relations import PrimaryKeyRelatedField
+
+
+def _split(value):
+    if value is None:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class FieldSelection:
+    """
+    The fields and expansions requested for one serializer level.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = set(fields) if fields is not None else None
+        self.expand = expand or {}
+
+    @classmethod
+    def from_request(cls, request, expand=None):
+        """
+        The selection of `request`; `expand` is used when it has no ?expand=.
+        """
+        params = request.query_params
+        tree = {}
+        for path in _split(params.get('expand', expand)) or ():
+            node = tree
+            for name in path.split('.'):
+                node = node.setdefault(name, {})
+        return cls._from_tree(tree, fields=_split(params.get('fields')))
+
+    @classmethod
+    def _from_tree(cls, tree, fields=None):
+        return cls(fields, {name: cls._from_tree(child) for name, child in tree.items()})
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        # Naming an expandable relation in ?fields= expands it as well
+        return name in self.expand or (self.fields is not None and name in self.fields)
+
+    def nested(self, name):
+        return self.expand.get(name) or FieldSelection()
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin that renders only the selected fields and builds nested
+    serializers for expanded relations.
+
+    `expandable_fields` maps a relation name to `(serializer class getter, kwargs)`;
+    `field_sources` lists the model columns read by non-model fields such as
+    SerializerMethodFields. `expansion_limits` maps an expandable reverse
+    relation to `(ordering, limit getter)`: only its first `limit` rows in that
+    order are embedded, read from the `<name>_preview` list they are
+    prefetched into.
+    """
+    expandable_fields = {}
+    field_sources = {}
+    expansion_limits = {}
+
+    def __init__(self, *args, selection=None, **kwargs):
+        self.selection = selection or FieldSelection()
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name, (get_serializer_class, kwargs) in self.expandable_fields.items():
+            # Unexpanded, a forward FK keeps its default (writable) key field
+            if self.selection.expands(name):
+                serializer_class = get_serializer_class()
+                if name in self.expansion_limits:
+                    kwargs = {**kwargs, 'source': preview_attr(name)}
+                fields[name] = serializer_class(
+                    selection=self.selection.nested(name), read_only=True, **kwargs
+                )
+        if self.selection.fields is not None:
+            for name in list(fields):
+                if not self.selection.includes(name) and name not in self.selection.expand:
+                    del fields[name]
+        return fields
+
+    @classmethod
+    def setup_queryset(cls, queryset, selection=None, keep=()):
+        """
+        Restrict `queryset` to the columns the selection renders and join or
+        prefetch only the expanded relations. `keep` names extra columns that
+        must be loaded, e.g. the pagination keyset.
+        """
+        selection = selection or FieldSelection()
+        opts = queryset.model._meta
+        columns = {opts.pk.name, *keep}
+        select_related = []
+        prefetches = []
+
+        for name, field in cls(selection=selection).fields.items():
+            if name in cls.expandable_fields and selection.expands(name):
+                relation = opts.get_field(name)
+                if relation.many_to_one:
+                    select_related.append(name)
+                else:
+                    # Reverse FK: the child rows need their FK column to be matched
+                    nested_class = cls.expandable_fields[name][0]()
+                    related_qs = nested_class.setup_queryset(
+                        relation.related_model._default_manager.all(),
+                        selection.nested(name),
+                        keep=(relation.field.name,),
+                    )
+                    if name in cls.expansion_limits:
+                        # Prefetching a slice ranks the rows with ROW_NUMBER() OVER
+                        # (PARTITION BY the FK) and keeps the first `limit` of each parent.
+                        # Django can only store a sliced prefetch in a to_attr list.
+                        ordering, get_limit = cls.expansion_limits[name]
+                        related_qs = related_qs.order_by(*ordering)[:get_limit()]
+                        prefetches.append(Prefetch(name, queryset=related_qs, to_attr=preview_attr(name)))
+                    else:
+                        prefetches.append(Prefetch(name, queryset=related_qs))
+                continue
+            for source in cls.field_sources.get(name, (field.source,)):
+                column = source.split('.')[0]
+                if not _is_concrete(opts, column):
+                    continue
+                # A relation rendered as anything but its key needs the related row
+                related_row = '.' in source or not isinstance(field, PrimaryKeyRelatedField)
+                if opts.get_field(column).many_to_one and related_row:
+                    select_related.append(column)
+                else:
+                    columns.add(column)
+
+        for name in select_related:
+            related_opts = opts.get_field(name).related_model._meta
+            columns.add(name)
+            columns.update(f'{name}__{f.name}' for f in related_opts.concrete_fields)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset.only(*columns)
+
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin that passes the request's FieldSelection to the serializer and
+    shapes querysets to it.
+    """
+
+    def get_selection(self):
+        if not hasattr(self, '_selection'):
+            self._selection = FieldSelection.from_request(self.request)
+        return self._selection
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('selection', self.get_selection())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_sparse_queryset(self, queryset, serializer_class=None, paginator=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        paginator = paginator or getattr(self, 'paginator', None)
+        keep = ()
+        if paginator is not None and hasattr(paginator, 'get_ordering'):
+            model = queryset.model._meta
+            ordering = paginator.get_ordering(self.request, queryset, self)
+            keep = [name for name in (f.lstrip('-') for f in ordering)
+                    if name != 'pk' and _is_concrete(model, name)]
+        return serializer_class.setup_queryset(queryset, self.get_selection(), keep=keep)
+
+
+def preview_attr(name):
+    return f'{name}_preview'
+
+
+def _is_concrete(opts, name):
+    try:
+        return opts.get_field(name).concrete
+    except FieldDoesNotExist:
+        return False
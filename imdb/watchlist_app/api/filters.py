@@ -0,0 +1,82 @@
+from django.db.models import Q
+from django_filters import rest_framework as django_filters
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.settings import api_settings
+
+from watchlist_app.api.pagination import KeysetCursorPagination
+
+from watchlist_app.models import StreamingPlatform
+from watchlist_app.search import search_titles
+
+
+class TitleSearchFilter(filters.BaseFilterBackend):
+    """
+    Indexed, relevance-ranked title search (see watchlist_app.search).
+    A term equal to a platform name also matches that platform's titles.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+        # Match platforms by id rather than through a join, so each side of the OR
+        # can use its own index
+        platforms = StreamingPlatform.objects.filter(name__iexact=term).values('pk')
+        after, reverse = self.get_rank_cursor(request, queryset, view)
+        return search_titles(queryset, term, extra=Q(platform__in=platforms), after=after, reverse=reverse)
+
+    def get_rank_cursor(self, request, queryset, view):
+        """
+        Return the `(rank, id)` the requested page of a relevance-ordered search
+        starts after, and whether it pages backwards; `(None, False)` for the
+        first page or any other ordering.
+        """
+        paginator = getattr(view, 'paginator', None)
+        if not isinstance(paginator, KeysetCursorPagination):
+            return None, False
+        ordering = paginator.get_ordering(request, queryset, view)
+        if ordering != ('-rank', '-id'):
+            return None, False
+        # The paginator decodes the same cursor again when it slices the page
+        paginator.ordering, paginator.model = ordering, queryset.model
+        cursor = paginator.decode_cursor(request)
+        if cursor is None:
+            return None, False
+        rank, pk = cursor['values']
+        if not isinstance(rank, (int, float)) or isinstance(rank, bool):
+            raise NotFound(paginator.invalid_cursor_message)
+        return (rank, pk), cursor['reverse']
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text and fuzzy search over titles, ranked by relevance.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class WatchListExportFilter(django_filters.FilterSet):
+    """
+    Filters for the catalog export: platform id, active flag and a created_at range.
+    """
+    platform = django_filters.NumberFilter(field_name='platform')
+    active = django_filters.BooleanFilter(field_name='active')
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+
+class ReviewExportFilter(django_filters.FilterSet):
+    """
+    Filters for the review export; platform and active apply to the reviewed title.
+    """
+    platform = django_filters.NumberFilter(field_name='watchlist__platform')
+    active = django_filters.BooleanFilter(field_name='watchlist__active')
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
@@ -0,0 +1,201 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a unique, composite ordering.
+
+    The cursor stores the ordering values of the last row on the page, and the
+    next page is fetched with `WHERE (created_at, id) < (:created_at, :id)`
+    instead of an OFFSET, so page 1000 costs the same as page one. No COUNT(*)
+    is ever issued, and rows inserted while a client is paging never shift the
+    pages that follow.
+
+    Views can set `cursor_ordering` or define `get_cursor_ordering()`; the last
+    field must be unique.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Return the sliced queryset for the requested page without evaluating it,
+        so async views can iterate it with `async for`.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor['reverse'])
+
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(self.cursor['values'], self.reverse))
+        order = [self._invert(field) for field in self.ordering] if self.reverse else self.ordering
+        # Fetch one extra row to learn whether another page follows
+        return queryset.order_by(*order)[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_previous = self.cursor is not None
+            self.has_next = has_more
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Use the view's OrderingFilter choice when there is one, always ending on
+        the primary key so the keyset is unique.
+        """
+        if hasattr(view, 'get_cursor_ordering'):
+            ordering = view.get_cursor_ordering()
+        else:
+            ordering = getattr(view, 'cursor_ordering', self.ordering)
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter):
+                requested = backend().get_ordering(request, queryset, view)
+                if requested:
+                    ordering = tuple(requested)
+                break
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering = tuple(ordering) + ('-id' if ordering[0].startswith('-') else 'id',)
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_seek_filter(self, values, reverse):
+        """
+        Build the lexicographic "row comes after the cursor" condition:
+        (a < x) OR (a = x AND b < y) OR ...
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, obj, reverse):
+        values = [self._to_json(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        payload = json.dumps({'v': values, 'r': int(reverse)})
+        encoded = b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii')).decode('ascii'))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [self._to_python(field, value) for field, value in zip(self.ordering, values)]
+            return {'values': values, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _to_python(self, field, value):
+        name = field.lstrip('-')
+        try:
+            model_field = self.model._meta.get_field('id' if name == 'pk' else name)
+        except FieldDoesNotExist:
+            # Annotations (e.g. a search rank) round-trip through JSON as-is
+            return value
+        return model_field.to_python(value)
+
+    @staticmethod
+    def _to_json(value):
+        # Keep full microsecond precision; DjangoJSONEncoder truncates to milliseconds
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class PlatformCursorPagination(KeysetCursorPagination):
+    """
+    Platforms have no creation timestamp; page them by primary key.
+    """
+    ordering = ('id',)
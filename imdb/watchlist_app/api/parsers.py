@@ -0,0 +1,34 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one object per line) for the bulk endpoints.
+
+    Lines are decoded lazily as the body is read, so a large upload is never
+    held in memory as a single string. A line that is not valid JSON yields a
+    `ParseError` in its place, so it can be reported against its position
+    without rejecting the rest of the payload. Blank lines are skipped.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self._lines(stream, encoding)
+
+    def _lines(self, stream, encoding):
+        if stream is None:
+            return
+        for number, raw in enumerate(stream, 1):
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode(encoding))
+            except ValueError as exc:
+                yield ParseError(f'Line {number}: {exc}')
@@ -0,0 +1,124 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer
+
+
+def _to_json(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+# Leading characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _to_cell(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Titles and reviews are user input; a leading quote keeps them text
+        return "'" + value
+    return value
+
+
+def _to_text(value):
+    """
+    Flatten an error detail (a string, or lists and dicts of them) into one cell.
+    """
+    if isinstance(value, dict):
+        return '; '.join(f'{key}: {_to_text(item)}' for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return '; '.join(_to_text(item) for item in value)
+    return str(value)
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the formatted line straight back, so a
+    csv.writer can format rows one at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer for the export endpoints. `stream()` turns an iterable of row tuples
+    into an iterator of text chunks for a StreamingHttpResponse, and `astream()`
+    does the same for an async iterable; `render()` only handles ordinary (e.g.
+    error) responses. Subclasses format the `header()` and each `line()`.
+    """
+    charset = 'utf-8'
+    # Lines joined into each chunk of astream(); every chunk is one ASGI message
+    lines_per_chunk = 100
+
+    def header(self, columns):
+        return ''
+
+    def line(self, columns, row):
+        raise NotImplementedError
+
+    def stream(self, columns, rows):
+        header = self.header(columns)
+        if header:
+            yield header
+        for row in rows:
+            yield self.line(columns, row)
+
+    async def astream(self, columns, rows):
+        lines = [self.header(columns)]
+        async for row in rows:
+            lines.append(self.line(columns, row))
+            if len(lines) >= self.lines_per_chunk:
+                yield ''.join(lines)
+                lines = []
+        if any(lines):
+            yield ''.join(lines)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """
+    One JSON object per line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, default=_to_json) + '\n').encode(self.charset)
+
+    def line(self, columns, row):
+        return json.dumps(dict(zip(columns, row)), default=_to_json) + '\n'
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    A header line with the column names, then one line per row.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(_Echo())
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        row = [_to_text(value) for value in data.values()]
+        return ''.join(self.stream(list(data), [row])).encode(self.charset)
+
+    def header(self, columns):
+        return self.writer.writerow(columns)
+
+    def line(self, columns, row):
+        return self.writer.writerow([_to_cell(value) for value in row])
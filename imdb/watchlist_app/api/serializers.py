@@ -1,8 +1,12 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from watchlist_app.models import WatchList, StreamingPlatform, Review
+from watchlist_app.models import WatchList, StreamingPlatform, Review, LeaderboardEntry
+from watchlist_app.models import HISTOGRAM_FIELDS, RATINGS, histogram_field
+from watchlist_app.api.fieldsets import DynamicFieldsMixin
 from datetime import date
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     review_user = serializers.StringRelatedField(read_only=True)
     """
     Serializer for the Review model.
@@ -23,24 +27,57 @@ class ReviewSerializer(serializers.ModelSerializer):
         if value < 1 or value > 10:
             raise serializers.ValidationError("Rating must be between 1 and 10.")
         return value
+
+
+class BulkReviewSerializer(ReviewSerializer):
+    """
+    Review serializer for the bulk endpoint, where each review names its title.
+    """
+    class Meta:
+        model = Review
+        fields = ('__all__')
+        read_only_fields = ('id', 'created_at')
     
-class WatchListSerializer(serializers.ModelSerializer):
-    reviews= ReviewSerializer(many=True, read_only=True)
-    platform = serializers.CharField(source='platform.name', read_only=True)
+def review_preview_size():
+    return getattr(settings, 'REVIEW_PREVIEW_SIZE', 5)
+
+
+class WatchListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     len_title = serializers.SerializerMethodField()
+    reviews_url = serializers.SerializerMethodField()
     """
     Serializer for the Movie model.
+    `platform` is the platform id unless expanded; `reviews` only appear when expanded,
+    and then as the REVIEW_PREVIEW_SIZE latest ones. `reviews_url` pages through all of them.
     """
+    expandable_fields = {
+        'reviews': (lambda: ReviewSerializer, {'many': True}),
+        'platform': (lambda: StreamingPlatformSerializer, {}),
+    }
+    # Newest first, like ReviewListView
+    expansion_limits = {'reviews': (('-created_at', '-id'), review_preview_size)}
+    field_sources = {'len_title': ('title',), 'reviews_url': ()}
+
     class Meta:
         model = WatchList
-        fields = ('__all__')
-        read_only_fields = ('id', 'created_at')
+        # The histogram columns are rendered as one `rating_histogram` on the detail view
+        exclude = HISTOGRAM_FIELDS
+        # Rating aggregates are maintained by watchlist_app.aggregates only
+        read_only_fields = ('id', 'created_at', 'number_of_reviews', 'rating_sum', 'average_rating', 'weighted_rating')
     
     def get_len_title(self, obj):
         """
         Returns the length of the movie title.
         """
         return len(obj.title)
+
+    def get_reviews_url(self, obj):
+        """
+        The movie's ReviewListView, absolute when the request is in the context.
+        """
+        url = reverse('review-list', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
     
     def validate(self, attrs):
         if not attrs.get('title'):
@@ -85,11 +122,14 @@ class WatchListSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Active must be a boolean value.")
         return value
 
-class StreamingPlatformSerializer(serializers.ModelSerializer):
+class StreamingPlatformSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the StreamingPlatform model.
+    The platform's titles (`watchlist`) only appear when expanded.
     """
-    watchlist = WatchListSerializer(many=True, read_only=True)
+    expandable_fields = {
+        'watchlist': (lambda: WatchListSerializer, {'many': True}),
+    }
     
     class Meta:
         model = StreamingPlatform
@@ -108,6 +148,59 @@ class StreamingPlatformSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Website must start with 'http' or 'https'.")
         return value
     
+def rating_histogram(movie):
+    """
+    {"1": reviews rated 1, ..., "10": reviews rated 10} from the stored columns.
+    """
+    return {str(rating): getattr(movie, histogram_field(rating)) for rating in RATINGS}
+
+
+class WatchListDetailSerializer(WatchListSerializer):
+    """
+    A single movie, with the distribution of its review ratings.
+    """
+    rating_histogram = serializers.SerializerMethodField()
+    field_sources = {**WatchListSerializer.field_sources, 'rating_histogram': HISTOGRAM_FIELDS}
+
+    def get_rating_histogram(self, obj):
+        return rating_histogram(obj)
+
+
+class RatingHistogramSerializer(serializers.ModelSerializer):
+    """
+    The rating aggregates of a movie, without the movie.
+    """
+    histogram = serializers.SerializerMethodField()
+    # Columns to load
+    columns = ('number_of_reviews', 'average_rating', 'weighted_rating', *HISTOGRAM_FIELDS)
+
+    class Meta:
+        model = WatchList
+        fields = ('id', 'number_of_reviews', 'average_rating', 'weighted_rating', 'histogram')
+
+    def get_histogram(self, obj):
+        return rating_histogram(obj)
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """
+    A title on a leaderboard; the view numbers the entries with their rank.
+    """
+    id = serializers.IntegerField(source='watchlist_id')
+    title = serializers.CharField(source='watchlist.title')
+    platform = serializers.IntegerField(source='watchlist.platform_id', allow_null=True)
+    release_date = serializers.DateField(source='watchlist.release_date')
+    # Columns to load: the entry's and the joined title's
+    columns = (
+        'average_rating', 'weighted_rating', 'number_of_reviews', 'watchlist_id',
+        'watchlist__title', 'watchlist__platform_id', 'watchlist__release_date',
+    )
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ('id', 'title', 'platform', 'release_date', 'average_rating', 'weighted_rating', 'number_of_reviews')
+
+
 """ class MovieSerializer(serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     title = serializers.CharField()
@@ -0,0 +1,186 @@
+"""
+Shared, atomic rate-limit state for the throttles in watchlist_app.api.throttling.
+
+Limits are enforced with GCRA (the generic cell rate algorithm, equivalent to a
+token bucket): a rate of N requests per period admits one request every
+`period / N` seconds, with bursts of up to N. The whole state of a key is a
+single number, its theoretical arrival time (TAT), and each check is one atomic
+read-modify-write of that number in a store every worker process shares:
+
+* `SQLiteThrottleStore` keeps the TATs in an on-disk SQLite database (WAL mode),
+  for single-host deployments. Put the file on tmpfs (e.g. /dev/shm) to keep it
+  in shared memory.
+* `RedisThrottleStore` runs the check as a Lua script on a Redis-protocol
+  server, for clusters. It needs the optional `redis` package.
+
+Stores are configured in `settings.THROTTLE_STORES`, in the same shape as
+CACHES; LOCATION is the database path or the server URL:
+
+    THROTTLE_STORES = {
+        'default': {
+            'BACKEND': 'watchlist_app.api.throttle_stores.RedisThrottleStore',
+            'LOCATION': 'redis://cache.internal:6379/1',
+        },
+    }
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+DEFAULT_STORES = {
+    'default': {
+        'BACKEND': 'watchlist_app.api.throttle_stores.SQLiteThrottleStore',
+        'LOCATION': os.path.join(settings.BASE_DIR, 'throttle.sqlite3'),
+    },
+}
+
+
+class BaseThrottleStore:
+    """
+    `acquire()` atomically checks and records `cost` requests for `key` against a
+    rate of one request per `interval` seconds with bursts up to `capacity`
+    seconds' worth of requests. It returns `(allowed, wait)`, where `wait` is the
+    number of seconds until the request would be allowed.
+    """
+
+    def acquire(self, key, interval, capacity, cost=1):
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Forget the state of every key.
+        """
+        raise NotImplementedError
+
+
+class SQLiteThrottleStore(BaseThrottleStore):
+    """
+    GCRA state in a SQLite table, shared by every process on the host.
+
+    An allowed request is a single `INSERT ... ON CONFLICT DO UPDATE ... WHERE`
+    statement, so two processes can never both spend the last slot of a key.
+    """
+    # Delete keys whose TAT has passed (their state equals no state) every N checks
+    PRUNE_EVERY = 1000
+
+    def __init__(self, location, timeout=5.0):
+        self.path = str(location)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._checks = 0
+
+    def _connection(self):
+        # One connection per thread; a forked worker opens its own
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat REAL NOT NULL)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def acquire(self, key, interval, capacity, cost=1):
+        increment = cost * interval
+        if increment > capacity:
+            # More than a full burst can never be admitted
+            return False, None
+        now = time.time()
+        connection = self._connection()
+        params = {'key': key, 'now': now, 'increment': increment, 'capacity': capacity}
+        allowed = connection.execute(
+            'INSERT INTO throttle (key, tat) VALUES (:key, :now + :increment) '
+            'ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :increment '
+            'WHERE max(tat, :now) + :increment - :now <= :capacity '
+            'RETURNING tat',
+            params,
+        ).fetchone()
+
+        self._checks += 1
+        if self._checks % self.PRUNE_EVERY == 0:
+            connection.execute('DELETE FROM throttle WHERE tat < ?', (now,))
+
+        if allowed is not None:
+            return True, 0.0
+        row = connection.execute('SELECT tat FROM throttle WHERE key = ?', (key,)).fetchone()
+        tat = row[0] if row else now
+        return False, max(0.0, max(tat, now) + increment - capacity - now)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle')
+
+
+class RedisThrottleStore(BaseThrottleStore):
+    """
+    GCRA state in Redis (or any server speaking its protocol), shared by every
+    host. The check runs as one Lua script, so it is atomic, and uses the
+    server's clock so hosts with skewed clocks agree. Keys expire on their own
+    once their TAT has passed.
+    """
+    SCRIPT = """
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local increment = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local tat = tonumber(redis.call('GET', KEYS[1])) or now
+        if tat < now then tat = now end
+        local new_tat = tat + increment
+        if new_tat - now > capacity then
+            return {0, tostring(new_tat - capacity - now)}
+        end
+        redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+        return {1, '0'}
+    """
+
+    def __init__(self, location, prefix='throttle:'):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                'RedisThrottleStore requires the "redis" package (pip install redis).'
+            ) from exc
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(location)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def acquire(self, key, interval, capacity, cost=1):
+        increment = cost * interval
+        if increment > capacity:
+            return False, None
+        allowed, wait = self.script(keys=[self.prefix + key], args=[increment, capacity])
+        return bool(allowed), float(wait)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(alias='default'):
+    """
+    The configured store for `alias`, created once per process.
+    """
+    store = _stores.get(alias)
+    if store is not None:
+        return store
+    with _stores_lock:
+        if alias not in _stores:
+            config = getattr(settings, 'THROTTLE_STORES', DEFAULT_STORES)
+            try:
+                options = config[alias]
+            except KeyError:
+                raise ImproperlyConfigured(f'THROTTLE_STORES has no store named {alias!r}.')
+            backend = import_string(options['BACKEND'])
+            _stores[alias] = backend(options['LOCATION'], **options.get('OPTIONS', {}))
+        return _stores[alias]
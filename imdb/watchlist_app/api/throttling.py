@@ -1,6 +1,89 @@
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
 
-class ReviewCreateThrottle(UserRateThrottle):
+from watchlist_app.api.throttle_stores import get_store
+
+
+class SharedThrottleMixin:
+    """
+    Mixin for DRF's rate throttles that keeps their state in a shared throttle
+    store (see watchlist_app.api.throttle_stores) instead of a per-process cache.
+    A rate of N/period admits bursts of up to N requests and then one request
+    every period/N seconds; each check is O(1) and atomic across workers.
+
+    `throttle_store` selects the store alias from settings.THROTTLE_STORES.
+    A view can make one request count as several by defining
+    `get_throttle_cost(request)`, e.g. a batch endpoint charging one request
+    per item; a cost above the burst size is never admitted.
+    """
+    throttle_store = 'default'
+
+    def get_cost(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        return get_throttle_cost(request) if get_throttle_cost is not None else 1
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        interval = self.duration / self.num_requests
+        allowed, self.wait_seconds = get_store(self.throttle_store).acquire(
+            self.key, interval, self.duration, cost=self.get_cost(request, view)
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+    def get_burst(self, request, view):
+        """
+        The most requests admitted at once, or None if this throttle doesn't
+        apply to `request`.
+        """
+        if self.rate is None or self.get_cache_key(request, view) is None:
+            return None
+        return self.num_requests
+
+
+class SharedAnonRateThrottle(SharedThrottleMixin, AnonRateThrottle):
+    """
+    AnonRateThrottle ('anon' rate) backed by the shared throttle store.
+    """
+
+
+class SharedUserRateThrottle(SharedThrottleMixin, UserRateThrottle):
+    """
+    UserRateThrottle ('user' rate) backed by the shared throttle store.
+    """
+
+
+class SharedScopedRateThrottle(SharedThrottleMixin, ScopedRateThrottle):
+    """
+    ScopedRateThrottle (the view's `throttle_scope` rate) backed by the shared throttle store.
+    """
+
+    def allow_request(self, request, view):
+        if not self.set_scope(view):
+            return True
+        return super().allow_request(request, view)
+
+    def get_burst(self, request, view):
+        if not self.set_scope(view):
+            return None
+        return super().get_burst(request, view)
+
+    def set_scope(self, view):
+        # The scope, and so the rate, is only known once the view is
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return False
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return True
+
+
+class ReviewCreateThrottle(SharedThrottleMixin, UserRateThrottle):
     """
     Custom throttle class to limit the number of review creation requests.
     This allows a user to create a maximum of 5 reviews per day.
@@ -9,9 +92,9 @@ class ReviewCreateThrottle(UserRateThrottle):
 
     def get_rate(self):
         return '5/day'  # Limit to 5 review creations per day
-    
 
-class ReviewListThrottle(UserRateThrottle):
+
+class ReviewListThrottle(SharedThrottleMixin, UserRateThrottle):
     """
     Custom throttle class to limit the number of review listing requests.
     This allows a user to list reviews a maximum of 10 times per day.
@@ -19,4 +102,17 @@ class ReviewListThrottle(UserRateThrottle):
     scope = 'review_list'
 
     def get_rate(self):
-        return '10/day'  # Limit to 10 review listings per day
\ No newline at end of file
+        return '10/day'  # Limit to 10 review listings per day
+
+
+def throttle_burst(view, request):
+    """
+    The most requests the throttles of `view` that apply to `request` admit at
+    once, or None if none does. A request costing more is never admitted, so
+    views charging per item cap their items at this.
+    """
+    bursts = [
+        throttle.get_burst(request, view)
+        for throttle in view.get_throttles() if isinstance(throttle, SharedThrottleMixin)
+    ]
+    return min((burst for burst in bursts if burst is not None), default=None)
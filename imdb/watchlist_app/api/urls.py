@@ -5,12 +5,22 @@ urlpatterns = [
     path('', views.WatchListView.as_view(), name='movie-list'),
     path('<int:pk>/', views.WatchListDetailView.as_view(), name='movie-detail'),
     path('search/', views.SearchWatchListView.as_view(), name='search-list'),
+    path('bulk/', views.WatchListBulkView.as_view(), name='movie-bulk'),
+    path('batch/', views.WatchListBatchView.as_view(), name='movie-batch'),
+    path('export/', views.WatchListExportView.as_view(), name='movie-export'),
+    path('top-rated/', views.LeaderboardView.as_view(), name='top-rated'),
+    path('top-rated/platforms/<int:platform>/', views.LeaderboardView.as_view(), name='top-rated-platform'),
+    path('top-rated/years/<int:year>/', views.LeaderboardView.as_view(), name='top-rated-year'),
     
     path('streaming-platforms/', views.StreamingPlatformView.as_view(), name='streaming-platform-list'),
     path('streaming-platforms/<int:pk>/', views.StreamingPlatformDetailView.as_view(), name='streaming-platform-detail'),
+    path('streaming-platforms/bulk/', views.StreamingPlatformBulkView.as_view(), name='streaming-platform-bulk'),
     
     path('<int:pk>/reviews-create/', views.ReviewCreateView.as_view(), name='review-create'),
     path('<int:pk>/reviews/', views.ReviewListView.as_view(), name='review-list'),
+    path('<int:pk>/ratings/', views.RatingHistogramView.as_view(), name='rating-histogram'),
     path('reviews/<int:pk>/', views.ReviewDetailView.as_view(), name='review-detail'),
     path('reviews/user/', views.UserReviewDetailView.as_view(), name='user-reviews'),
+    path('reviews/bulk/', views.ReviewBulkView.as_view(), name='review-bulk'),
+    path('reviews/export/', views.ReviewExportView.as_view(), name='review-export'),
     ]
\ No newline at end of file
@@ -1,8 +1,19 @@
 # views.py
 
 # --- Imports ---
+import json
+from itertools import islice
+
 # Models for Movies (WatchList), StreamingPlatform, and Review entities
-from watchlist_app.models import WatchList, StreamingPlatform, Review
+from watchlist_app.models import WatchList, StreamingPlatform, Review, LeaderboardEntry
+# Atomic, single-statement maintenance of the rating aggregates
+from watchlist_app import aggregates
+# Incrementally maintained top-rated boards
+from watchlist_app import leaderboards
+from watchlist_app import tasks
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.shortcuts import get_object_or_404
 
 # DRF utilities for raising validation errors and building class-based views
 from rest_framework.exceptions import ValidationError, NotFound
@@ -12,8 +23,11 @@ from rest_framework.response import Response
 # Serializers to convert model instances to/from JSON
 from watchlist_app.api.serializers import (
                                             WatchListSerializer,
+                                            WatchListDetailSerializer,
+                                            RatingHistogramSerializer,
                                             StreamingPlatformSerializer,
                                             ReviewSerializer,
+                                            LeaderboardEntrySerializer,
                                         )
 
 # DRF status codes, generic views, and mixins
@@ -22,62 +36,102 @@ from rest_framework import status, generics, mixins,filters
 # Custom permission to allow only review owners to modify, others read-only
 from watchlist_app.api.permissions import ReviewUserorReadOnly, IsAdminOrReadOnly
 # Authentication permission to restrict review creation to logged-in users
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle, ScopedRateThrottle
-from watchlist_app.api.throttling import ReviewCreateThrottle, ReviewListThrottle
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from account_app.api.authentication import CachedTokenAuthentication, JWTAuthentication
+# Throttles keep their state in the shared, atomic throttle store
+from watchlist_app.api.throttling import (
+                                            ReviewCreateThrottle,
+                                            ReviewListThrottle,
+                                            SharedAnonRateThrottle,
+                                            SharedScopedRateThrottle,
+                                            SharedUserRateThrottle,
+                                            throttle_burst,
+                                        )
+from watchlist_app.api.pagination import KeysetCursorPagination, PlatformCursorPagination
+from watchlist_app.api.filters import TitleSearchFilter
+# Versioned response cache with ETag/304 support
+from watchlist_app.api.cache import cache_response
+# ?fields= / ?expand= support, with querysets shaped to the selection
+from watchlist_app.api.fieldsets import FieldSelection, SparseFieldsetViewMixin
+# Chunked bulk create/upsert with a per-item error report
+from watchlist_app.api.bulk import (
+                                    BulkWriteView,
+                                    ReviewBulkWriter,
+                                    StreamingPlatformBulkWriter,
+                                    WatchListBulkWriter,
+                                )
+# Streaming NDJSON/CSV exports
+from watchlist_app.api.exports import ExportView
+from watchlist_app.api.filters import WatchListExportFilter, ReviewExportFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
 
 
 
-class SearchWatchListView(generics.ListAPIView):
+class SearchWatchListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     List all movies with optional search by title.
+    Matches are ranked by relevance unless an explicit ordering is requested.
     """
-    queryset = WatchList.objects.all()  # Fetch all movies
     serializer_class = WatchListSerializer
-    throttle_classes = [AnonRateThrottle]  # Limit requests to prevent abuse
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]  # Enable filtering on this view
-    search_fields = ['title','=platform__name']  # Allow searching by movie title
-    ordering_fields = ['average_rating']  # Allow ordering by title or release date
+    throttle_classes = [SharedAnonRateThrottle]  # Limit requests to prevent abuse
+    filter_backends = [TitleSearchFilter, filters.OrderingFilter]  # Indexed full-text/fuzzy search
+    ordering_fields = ['average_rating', 'weighted_rating']  # Allow ordering by plain or weighted rating
+    pagination_class = KeysetCursorPagination  # Seek on (<rating>, id) when ordered, else (created_at, id)
+
+    def get_cursor_ordering(self):
+        # Searches page through results by relevance, best match first
+        if TitleSearchFilter().get_search_term(self.request):
+            return ('-rank', '-id')
+        return KeysetCursorPagination.ordering
+
+    def get_queryset(self):
+        # Load only the selected columns; join/prefetch only expanded relations
+        return self.get_sparse_queryset(WatchList.objects.all())
 
 
 
 
 # This class is a Django API view that lists user reviews filtered by the username provided in the
 # URL.
-class UserReviewDetailView(generics.ListAPIView):
+class UserReviewDetailView(SparseFieldsetViewMixin, generics.ListAPIView):
     """List reviews created by a specific user.
     """
     serializer_class = ReviewSerializer
-    throttle_classes = [UserRateThrottle]  # Custom throttle to limit review listing
+    throttle_classes = [SharedUserRateThrottle]  # Custom throttle to limit review listing
     #permission_classes = [IsAuthenticated]  # Only authenticated users can access
-    authentication_classes = [TokenAuthentication]  # Use token authentication
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]  # Use token or JWT authentication
+    pagination_class = KeysetCursorPagination  # Page newest-first on (created_at, id)
 
     def get_queryset(self):
         username = self.request.query_params.get('username')
         if not username:
             raise ValidationError("Username parameter is required.")
-        query_set = Review.objects.filter(review_user__username=username)
+        query_set = self.get_sparse_queryset(Review.objects.filter(review_user__username=username))
         if not query_set.exists():
             raise NotFound(f"No reviews found for user '{username}'.")
         return query_set
         
-class WatchListView(APIView):
+class WatchListView(SparseFieldsetViewMixin, APIView):
     """ 
     List all movies or create a new movie.
     """
     permission_classes = [IsAdminOrReadOnly]# Restrict access to authenticated users
-    throttle_classes = [UserRateThrottle]  # Limit requests to prevent abuse
-    authentication_classes = [TokenAuthentication]  # Use default authentication (e.g., Token, Session)
+    throttle_classes = [SharedUserRateThrottle]  # Limit requests to prevent abuse
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]  # Use default authentication (e.g., Token, Session)
+    pagination_class = KeysetCursorPagination  # Page newest-first on (created_at, id)
+
+    @cache_response('watchlist', 'platform', 'review')
     def get(self, request):
-        # Fetch all WatchList records
-        movies = WatchList.objects.all()
-        # Serialize the queryset into JSON-friendly data
-        serializer = WatchListSerializer(movies, many=True)
-        # Return serialized list with HTTP 200 OK
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = self.pagination_class()
+        # Fetch WatchList records with only the requested fields and expansions
+        movies = self.get_sparse_queryset(WatchList.objects.all(), WatchListSerializer, paginator)
+        # Only the requested page is fetched; prefetches run for that page alone
+        page = paginator.paginate_queryset(movies, request, view=self)
+        # Serialize the page into JSON-friendly data
+        serializer = WatchListSerializer(page, many=True, selection=self.get_selection())
+        # Return serialized page with next/previous cursors
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         # Deserialize incoming JSON to a WatchList instance (not yet saved)
@@ -91,27 +145,30 @@ class WatchListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class WatchListDetailView(APIView):
+class WatchListDetailView(SparseFieldsetViewMixin, APIView):
     """ 
     Retrieve, update or delete a movie instance.
     """
-    throttle_classes = [AnonRateThrottle]  # Limit requests to prevent abuse
-    def get_object(self, pk):
+    throttle_classes = [SharedAnonRateThrottle]  # Limit requests to prevent abuse
+    def get_object(self, pk, queryset=None):
         # Helper to safely fetch a movie by primary key
+        if queryset is None:
+            queryset = WatchList.objects.all()
         try:
-            return WatchList.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except WatchList.DoesNotExist:
             # Return None so callers can handle 404 uniformly
             return None
 
+    @cache_response('watchlist', 'platform', 'review')
     def get(self, request, pk):
-        # Retrieve a single movie
-        movie = self.get_object(pk)
+        # Retrieve a single movie with only the requested fields and expansions
+        movie = self.get_object(pk, self.get_sparse_queryset(WatchList.objects.all(), WatchListDetailSerializer))
         if movie is None:
             # If not found, respond with 404
             return Response({'error': 'Movie not found'}, status=status.HTTP_404_NOT_FOUND)
-        # Serialize and return the movie
-        serializer = WatchListSerializer(movie)
+        # Serialize and return the movie, with its rating histogram
+        serializer = WatchListDetailSerializer(movie, selection=self.get_selection())
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def put(self, request, pk):
@@ -123,8 +180,12 @@ class WatchListDetailView(APIView):
         # Bind incoming data to the existing instance
         serializer = WatchListSerializer(movie, data=request.data)
         if serializer.is_valid():
+            boards = (movie.active, movie.platform_id, movie.release_date)
             # Save changes if valid
             serializer.save()
+            if boards != (movie.active, movie.platform_id, movie.release_date):
+                # The title may belong on other leaderboards now; a worker moves it
+                tasks.defer_placement([movie.pk])
             return Response(serializer.data, status=status.HTTP_200_OK)
         # Return validation errors if any
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -134,8 +195,11 @@ class WatchListDetailView(APIView):
         movie = self.get_object(pk)
         if movie is None:
             return Response({'error': 'Movie not found'}, status=status.HTTP_404_NOT_FOUND)
+        boards = leaderboards.boards_of([movie.pk])
         # Remove from database
         movie.delete()
+        # Have a worker fill the places it leaves on the leaderboards
+        tasks.defer_refill(boards)
         # No content on successful deletion
         return Response(status=status.HTTP_204_NO_CONTENT)
     
@@ -147,9 +211,9 @@ class ReviewCreateView(generics.CreateAPIView):
     """
     # This view only needs the serializer class; queryset is derived per-movie
     serializer_class = ReviewSerializer
-    throttle_classes = [ReviewCreateThrottle, UserRateThrottle]  # Custom throttle to limit review creation
+    throttle_classes = [ReviewCreateThrottle, SharedUserRateThrottle]  # Custom throttle to limit review creation
     permission_classes = [IsAuthenticated] # Custom permission to restrict access
-    authentication_classes = [TokenAuthentication]  # Use default authentication (e.g., Token, Session)
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]  # Use default authentication (e.g., Token, Session)
     
     def get_queryset(self):
         # Limit queryset to reviews for the given WatchList (movie) id from URL
@@ -159,37 +223,37 @@ class ReviewCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         # Extract the movie (WatchList) we are reviewing from the URL kwarg
         watchlist_id = self.kwargs.get('pk')
-        watchlist = WatchList.objects.get(pk=watchlist_id)
+        watchlist = get_object_or_404(WatchList.objects.only('pk'), pk=watchlist_id)
         # The user creating the review is the authenticated request user
         review_user = self.request.user
 
-        # Check if this user already reviewed the movie
-        if Review.objects.filter(review_user=review_user, watchlist=watchlist).exists():
-            # Enforce one-review-per-user-per-movie rule
+        try:
+            with transaction.atomic():
+                # Save the new Review, linking it to the watchlist and the user
+                review = serializer.save(watchlist=watchlist, review_user=review_user)
+                # Queue the leaderboard update; reviews of this title made before a
+                # worker gets to it share the job
+                tasks.defer_placement([watchlist.pk])
+                # Bump the sum/count/average in one UPDATE, last, so the title row is
+                # locked only until commit
+                aggregates.review_created(watchlist.pk, review.rating)
+        except IntegrityError as exc:
+            # The unique_review_per_user constraint enforces one review per user per movie;
+            # any other integrity error is a bug, not the user's doing
+            if not self.is_duplicate(exc):
+                raise
             raise ValidationError("You have already reviewed this movie.")
-        
-        # Update average rating (running average formula)
-        if watchlist.number_of_reviews == 0:
-            # First review sets the average
-            watchlist.average_rating = serializer.validated_data['rating']
-        else:
-            # Recompute average as (sum + new) / (count + 1)
-            watchlist.average_rating = (
-                watchlist.average_rating * watchlist.number_of_reviews 
-                + serializer.validated_data['rating']
-            ) / (watchlist.number_of_reviews + 1)
-        
-        # Increment review count
-        watchlist.number_of_reviews += 1
-        
-        # Persist the updated WatchList aggregate fields
-        watchlist.save()
-        
-        # Save the new Review, linking it to the watchlist and the user
-        serializer.save(watchlist=watchlist, review_user=review_user)
+
+    @staticmethod
+    def is_duplicate(exc):
+        # PostgreSQL names the constraint, SQLite lists its columns
+        diag = getattr(exc.__cause__, 'diag', None)
+        message = f"{exc} {getattr(diag, 'constraint_name', None) or ''}"
+        return ('unique_review_per_user' in message
+                or 'watchlist_app_review.review_user_id, watchlist_app_review.watchlist_id' in message)
 
 
-class ReviewListView(generics.ListAPIView):
+class ReviewListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     List all reviews.
     """
@@ -198,12 +262,17 @@ class ReviewListView(generics.ListAPIView):
     throttle_classes = [ReviewListThrottle]  # Custom throttle to limit review listing
     filter_backends = [DjangoFilterBackend]  # Enable filtering on this view
     filterset_fields = ['review_user__username', 'watchlist__title']  # Allow filtering by username and movie title
+    pagination_class = KeysetCursorPagination  # Page newest-first on (created_at, id)
     
     
+    @cache_response('review')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Return all reviews for a given watchlist (movie) id from URL
         review_id = self.kwargs.get('pk')
-        return Review.objects.filter(watchlist=review_id)
+        return self.get_sparse_queryset(Review.objects.filter(watchlist=review_id))
         
     
 class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -211,11 +280,34 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     Retrieve, update or delete a review instance.
     """
     # Base queryset for retrieve/update/delete
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related('review_user')
     serializer_class = ReviewSerializer
     # Only review owners can modify; others have read-only access
     permission_classes = [ReviewUserorReadOnly]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Re-read the stored rating under a row lock so concurrent edits of the
+            # same review apply their deltas one after another
+            old_rating = Review.objects.select_for_update().values_list('rating', flat=True).get(
+                pk=serializer.instance.pk
+            )
+            review = serializer.save()
+            if aggregates.review_rating_changed(review.watchlist_id, old_rating, review.rating):
+                tasks.defer_placement([review.watchlist_id])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Lock and read the stored rating; only the request that actually
+            # deletes the row adjusts the aggregate
+            rating = Review.objects.select_for_update().values_list('rating', flat=True).filter(
+                pk=instance.pk
+            ).first()
+            if rating is not None:
+                instance.delete()
+                aggregates.review_deleted(instance.watchlist_id, rating)
+                tasks.defer_placement([instance.watchlist_id])
 
 """
 # Alternative implementation using mixins (commented out but kept for reference)
@@ -251,18 +343,26 @@ class ReviewDetailView(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixin
 """
 
 
-class StreamingPlatformView(APIView):
+class StreamingPlatformView(SparseFieldsetViewMixin, APIView):
     """
     List all streaming platforms or create a new one.
     """
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = PlatformCursorPagination  # Page on id; platforms have no timestamp
+
+    @cache_response('platform', 'watchlist', 'review')
     def get(self, request):
-        # Fetch all StreamingPlatform records
-        platforms = StreamingPlatform.objects.all()
+        paginator = self.pagination_class()
+        # Fetch platforms; titles and reviews are prefetched only when expanded
+        platforms = self.get_sparse_queryset(
+            StreamingPlatform.objects.all(), StreamingPlatformSerializer, paginator
+        )
+        # Only the requested page is fetched
+        page = paginator.paginate_queryset(platforms, request, view=self)
         # Serialize to JSON-friendly list
-        serializer = StreamingPlatformSerializer(platforms, many=True)
-        # Return the list with HTTP 200 OK
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = StreamingPlatformSerializer(page, many=True, selection=self.get_selection())
+        # Return the page with next/previous cursors
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         # Deserialize incoming platform payload
@@ -276,30 +376,34 @@ class StreamingPlatformView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
-class StreamingPlatformDetailView(APIView):
+class StreamingPlatformDetailView(SparseFieldsetViewMixin, APIView):
     """
     Retrieve, update or delete a streaming platform instance.
     """
     permission_classes = [IsAdminOrReadOnly]
-    throttle_classes = [ScopedRateThrottle]  # Limit requests to prevent abuse
+    throttle_classes = [SharedScopedRateThrottle]  # Limit requests to prevent abuse
     throttle_scope = 'streaming_platforms'  # Custom scope for throttling
     
     
     
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=None):
         # Helper to get a platform by id or None
+        if queryset is None:
+            queryset = StreamingPlatform.objects.all()
         try:
-            return StreamingPlatform.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except StreamingPlatform.DoesNotExist:
             return None
 
     def get(self, request, pk):
-        # Retrieve a single streaming platform
-        platform = self.get_object(pk)
+        # Retrieve a single streaming platform with only the requested fields and expansions
+        platform = self.get_object(
+            pk, self.get_sparse_queryset(StreamingPlatform.objects.all(), StreamingPlatformSerializer)
+        )
         if platform is None:
             return Response({'error': 'Streaming Platform not found'}, status=status.HTTP_404_NOT_FOUND)
         # Serialize and return
-        serializer = StreamingPlatformSerializer(platform)
+        serializer = StreamingPlatformSerializer(platform, selection=self.get_selection())
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def put(self, request, pk):
@@ -321,12 +425,240 @@ class StreamingPlatformDetailView(APIView):
         platform = self.get_object(pk)
         if platform is None:
             return Response({'error': 'Streaming Platform not found'}, status=status.HTTP_404_NOT_FOUND)
-        # Remove from database
+        boards = leaderboards.boards_of(WatchList.objects.filter(platform=platform).values('pk'))
+        # Remove from database (its titles go with it)
         platform.delete()
+        tasks.defer_refill(boards - {f'platform:{pk}'})
         # Respond with HTTP 204 No Content
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class LeaderboardView(APIView):
+    """
+    The top-rated titles overall, on one platform or from one release year.
+    Boards are kept ranked as reviews are written (watchlist_app.leaderboards),
+    so a request reads at most ?limit= rows in rank order and sorts nothing.
+    """
+    throttle_classes = [SharedAnonRateThrottle]  # Limit requests to prevent abuse
+
+    @cache_response('watchlist', 'review')
+    def get(self, request, platform=None, year=None):
+        if platform is not None:
+            board = f'platform:{platform}'
+        elif year is not None:
+            board = f'year:{year}'
+        else:
+            board = 'all'
+        size = settings.LEADERBOARD_SIZE
+        try:
+            limit = int(request.query_params.get('limit', min(20, size)))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        if not 1 <= limit <= size:
+            raise ValidationError({'limit': f'Must be between 1 and {size}.'})
+        # Walks the board's rank index; the titles are joined by primary key
+        entries = (
+            LeaderboardEntry.objects.filter(board=board)
+            .select_related('watchlist')
+            .only(*LeaderboardEntrySerializer.columns)
+            .order_by(*leaderboards.ENTRY_RANKING)[:limit]
+        )
+        serializer = LeaderboardEntrySerializer(entries, many=True)
+        results = [{'rank': rank, **item} for rank, item in enumerate(serializer.data, 1)]
+        return Response({'board': board, 'results': results}, status=status.HTTP_200_OK)
+
+
+class WatchListBatchView(SparseFieldsetViewMixin, APIView):
+    """
+    Look up many movies in one request: GET ?ids=1,2,3, or POST {"ids": [...]}
+    for long lists. Results are keyed by id in request order, with null for ids
+    that match no movie. Platforms and review previews are embedded unless
+    ?fields= or ?expand= say otherwise.
+    """
+    throttle_classes = [SharedScopedRateThrottle]  # Charged once per id, see get_throttle_cost
+    throttle_scope = 'batch'  # Its own rate, with a burst that covers a full batch
+    default_expand = 'platform,reviews'
+    max_id = 2 ** 63 - 1  # Largest value of the (BigAutoField) id column
+
+    def get_selection(self):
+        if not hasattr(self, '_selection'):
+            params = self.request.query_params
+            if 'fields' in params or 'expand' in params:
+                return super().get_selection()
+            self._selection = FieldSelection.from_request(self.request, expand=self.default_expand)
+        return self._selection
+
+    def get_ids(self, request):
+        # Parsed once; the throttle needs the count before the handler runs
+        if not hasattr(self, '_ids'):
+            if request.method == 'GET':
+                raw = [part.strip() for part in request.query_params.get('ids', '').split(',') if part.strip()]
+            else:
+                raw = request.data.get('ids') if isinstance(request.data, dict) else None
+                if not isinstance(raw, list):
+                    raise ValidationError({'ids': 'Must be a list of movie ids.'})
+            # Repeated ids are looked up once
+            ids = list(dict.fromkeys(self.parse_id(value) for value in raw))
+            limit = self.get_max_ids(request)
+            if not 1 <= len(ids) <= limit:
+                raise ValidationError({'ids': f'Give between 1 and {limit} ids.'})
+            self._ids = ids
+        return self._ids
+
+    def parse_id(self, value):
+        """
+        A positive integer id that fits the id column, from a query string part
+        or a JSON number; booleans and fractions are refused.
+        """
+        try:
+            if isinstance(value, str) and value.lstrip('+').isdigit():
+                pk = int(value)
+            elif isinstance(value, int) and not isinstance(value, bool):
+                pk = value
+            else:
+                raise ValueError
+            if not 1 <= pk <= self.max_id:
+                raise ValueError
+        except ValueError:
+            shown = value if isinstance(value, str) else json.dumps(value)
+            raise ValidationError({'ids': f'{shown} is not a movie id.'})
+        return pk
+
+    def get_max_ids(self, request):
+        """
+        BATCH_LOOKUP_MAX_IDS, lowered to the burst of any throttle that applies
+        to the request: a batch costing more than a burst is never admitted,
+        however long the client waits.
+        """
+        limit = settings.BATCH_LOOKUP_MAX_IDS
+        burst = throttle_burst(self, request)
+        return limit if burst is None else min(limit, burst)
+
+    def get_throttle_cost(self, request):
+        return len(self.get_ids(request))
+
+    @cache_response('watchlist', 'platform', 'review')
+    def get(self, request):
+        return self.lookup(request)
+
+    def post(self, request):
+        # Not cached: the ids are in the body
+        return self.lookup(request)
+
+    def lookup(self, request):
+        ids = self.get_ids(request)
+        # One id__in query, plus one per prefetched relation for the whole batch
+        queryset = self.get_sparse_queryset(WatchList.objects.filter(pk__in=ids), WatchListDetailSerializer)
+        movies = {movie.pk: movie for movie in queryset}
+        found = [movies[pk] for pk in ids if pk in movies]
+        data = WatchListDetailSerializer(found, many=True, selection=self.get_selection()).data
+        results = dict.fromkeys((str(pk) for pk in ids), None)
+        results.update((str(movie.pk), item) for movie, item in zip(found, data))
+        return Response(
+            {'results': results, 'not_found': [pk for pk in ids if pk not in movies]},
+            status=status.HTTP_200_OK,
+        )
+
+
+class RatingHistogramView(APIView):
+    """
+    How many reviews of a movie gave each rating from 1 to 10.
+    The counts are kept on the movie's row as reviews are written, so this
+    reads one row however many reviews the movie has.
+    """
+    throttle_classes = [SharedAnonRateThrottle]  # Limit requests to prevent abuse
+
+    @cache_response('watchlist', 'review')
+    def get(self, request, pk):
+        movie = WatchList.objects.only(*RatingHistogramSerializer.columns).filter(pk=pk).first()
+        if movie is None:
+            return Response({'error': 'Movie not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = RatingHistogramSerializer(movie)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class WatchListBulkView(BulkWriteView):
+    """
+    Create (POST) or upsert by id (PUT) many movies at once.
+    """
+    permission_classes = [IsAdminUser]  # Catalog sync runs as an admin
+    writer_class = WatchListBulkWriter
+
+
+class StreamingPlatformBulkView(BulkWriteView):
+    """
+    Create (POST) or upsert by name (PUT) many streaming platforms at once.
+    """
+    permission_classes = [IsAdminUser]
+    writer_class = StreamingPlatformBulkWriter
+
+
+class ReviewBulkView(BulkWriteView):
+    """
+    Create (POST) or upsert (PUT) the requesting user's reviews of many movies at once.
+    """
+    permission_classes = [IsAuthenticated]  # Reviews are written as the logged-in user
+    throttle_classes = [ReviewCreateThrottle, SharedUserRateThrottle]  # Charged once per item, see get_throttle_cost
+    writer_class = ReviewBulkWriter
+
+    def get_items(self, request):
+        # Read once; the throttles need the count before the handler runs. Only
+        # as many items as they admit at once are read before refusing the rest.
+        if not hasattr(self, '_items'):
+            limit = throttle_burst(self, request)
+            items = super().get_items(request)
+            self._items = list(items if limit is None else islice(items, limit + 1))
+            if limit is not None and len(self._items) > limit:
+                raise ValidationError(f'At most {limit} reviews can be written at once.')
+        return self._items
+
+    def get_throttle_cost(self, request):
+        return max(1, len(self.get_items(request)))
+
+
+class WatchListExportView(ExportView):
+    """
+    Stream the whole catalog (optionally filtered) as NDJSON or CSV.
+    """
+    filterset_class = WatchListExportFilter  # ?platform=, ?active=, ?created_after=, ?created_before=
+    filename = 'watchlist'
+    columns = {
+        'id': 'id',
+        'title': 'title',
+        'description': 'description',
+        'platform': 'platform_id',
+        'platform_name': 'platform__name',
+        'release_date': 'release_date',
+        'active': 'active',
+        'number_of_reviews': 'number_of_reviews',
+        'average_rating': 'average_rating',
+        'weighted_rating': 'weighted_rating',
+        'created_at': 'created_at',
+    }
+
+    def get_queryset(self):
+        return WatchList.objects.all()
+
+
+class ReviewExportView(ExportView):
+    """
+    Stream every review (optionally filtered) as NDJSON or CSV.
+    """
+    filterset_class = ReviewExportFilter  # platform/active apply to the reviewed movie
+    filename = 'reviews'
+    columns = {
+        'id': 'id',
+        'watchlist': 'watchlist_id',
+        'review_user': 'review_user__username',
+        'rating': 'rating',
+        'review_text': 'review_text',
+        'created_at': 'created_at',
+    }
+
+    def get_queryset(self):
+        return Review.objects.all()
+
+
 """
 # Function-based views kept for historical reference (commented out)
 
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class WatchlistAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'watchlist_app'
+
+    def ready(self):
+        # Connect the cache invalidation signal handlers
+        from watchlist_app import signals  # noqa: F401
+        # Register the deferred jobs and the queue metrics
+        from watchlist_app import tasks  # noqa: F401
+        from watchlist_app.jobs import job_metrics
+        from imdb.metrics import registry
+        # Wrap every database connection from the start, so requests count their
+        # queries in any thread (see imdb/middleware.py)
+        from imdb import middleware  # noqa: F401
+        registry.register_collector(job_metrics)
@@ -0,0 +1,71 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database(keepdb=False, verbosity=0):
+    """
+    Run the block against a freshly migrated test database (as the test runner
+    would) so benchmarks never seed or measure the real one.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity, keepdb=keepdb)
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a non-empty list of samples.
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        'runs': len(samples_ms),
+        'mean_ms': round(statistics.fmean(samples_ms), 3),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+    }
+
+
+class QueryTimer:
+    """
+    Database execute wrapper that counts queries and sums their wall time:
+
+        with connection.execute_wrapper(timer):
+            ...
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def timed(fn, *args, **kwargs):
+    """
+    Call fn and return (result, elapsed milliseconds).
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
@@ -0,0 +1,239 @@
+"""
+A job queue in the database, for work that doesn't have to finish inside the
+request that causes it.
+
+`enqueue()` inserts a Job row in the caller's transaction, so a job exists if
+and only if the write that needs it was committed. `manage.py run_jobs` runs
+the registered function of each due job (see `task()`), in a pool of threads
+or processes:
+
+* Claiming: on PostgreSQL a worker locks a batch of due jobs with
+  SELECT ... FOR UPDATE SKIP LOCKED, so workers never wait on each other's
+  batches. SQLite has no row locks; there one UPDATE marks a batch as claimed,
+  and SQLite's single writer keeps two claims from taking the same job.
+* Deduplication: a job enqueued with a `dedup_key` is dropped while a job with
+  that key is still queued (a partial unique index), so fifty reviews of a
+  title before the worker gets to it cost one recompute. A running job does
+  not absorb new ones: writes made after it started get a run of their own.
+* Retries: a job that raises is retried after JOB_RETRY_BACKOFF * 2**(n - 1)
+  seconds for its n-th attempt, and marked failed after JOB_MAX_ATTEMPTS.
+  A job still running after JOB_TIMEOUT seconds is assumed lost with its
+  worker and queued again.
+
+Jobs may run more than once, so they must be idempotent. With JOBS_EAGER,
+enqueue() runs the job at once in the caller's transaction instead, for
+development without a worker.
+"""
+import logging
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from imdb.metrics import registry
+from watchlist_app.models import Job
+
+logger = logging.getLogger('imdb.jobs')
+
+# Job name -> function, filled in by @task as modules are imported
+TASKS = {}
+
+job_wait = registry.histogram(
+    'job_wait_seconds', 'Time from a job becoming due to a worker starting it.', ('name',),
+    (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+job_duration = registry.histogram('job_duration_seconds', 'Time spent running jobs.', ('name', 'outcome'))
+
+
+def task(name):
+    """
+    Register the decorated function as the job `name`. It is called with the
+    job's kwargs, which must be JSON-serializable.
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def eager():
+    return getattr(settings, 'JOBS_EAGER', False)
+
+
+def max_attempts():
+    return getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+
+
+def enqueue(name, kwargs=None, dedup_key=None, delay=0):
+    """
+    Queue the job `name`; see enqueue_many().
+    """
+    enqueue_many(name, [(kwargs or {}, dedup_key)], delay=delay)
+
+
+def enqueue_many(name, items, delay=0):
+    """
+    Queue one `name` job per `(kwargs, dedup_key)` item in one INSERT, skipping
+    those whose key is already queued.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Unknown job {name!r}')
+    if eager():
+        for kwargs, _ in items:
+            TASKS[name](**kwargs)
+        return
+    run_after = timezone.now() + timedelta(seconds=delay)
+    # Keys repeated within the batch would be dropped by the index anyway
+    jobs = {}
+    for kwargs, dedup_key in items:
+        jobs[dedup_key if dedup_key is not None else object()] = Job(
+            name=name, kwargs=kwargs, dedup_key=dedup_key, run_after=run_after,
+        )
+    Job.objects.bulk_create(jobs.values(), ignore_conflicts=True, batch_size=500)
+
+
+def claim(limit):
+    """
+    Mark up to `limit` due jobs as running under a new claim and return them.
+    """
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+    running = {'status': Job.RUNNING, 'claim': token, 'started_at': now, 'attempts': F('attempts') + 1}
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**running)
+        else:
+            # The status check keeps a job claimed meanwhile from being claimed twice
+            Job.objects.filter(pk__in=due.values('pk')[:limit], status=Job.QUEUED).update(**running)
+        return list(Job.objects.filter(claim=token, status=Job.RUNNING).order_by('run_after', 'pk'))
+
+
+def execute(job):
+    """
+    Run a claimed job in a transaction of its own, then delete it, or schedule
+    its retry if it raised. Returns whether it succeeded.
+    """
+    job_wait.observe(max(0.0, (job.started_at - job.run_after).total_seconds()), job.name)
+    started = time.perf_counter()
+    try:
+        func = TASKS[job.name]
+        with transaction.atomic():
+            func(**job.kwargs)
+    except Exception:
+        job_duration.observe(time.perf_counter() - started, job.name, 'error')
+        logger.exception('Job %s (%s) failed, attempt %s', job.pk, job.name, job.attempts)
+        retry(job, traceback.format_exc())
+        return False
+    job_duration.observe(time.perf_counter() - started, job.name, 'ok')
+    Job.objects.filter(pk=job.pk, claim=job.claim).delete()
+    return True
+
+
+def retry(job, error):
+    if job.attempts >= max_attempts():
+        Job.objects.filter(pk=job.pk, claim=job.claim).update(status=Job.FAILED, last_error=error)
+        return
+    backoff = getattr(settings, 'JOB_RETRY_BACKOFF', 5) * 2 ** (job.attempts - 1)
+    requeue(Job.objects.filter(pk=job.pk, claim=job.claim), timezone.now() + timedelta(seconds=backoff), error)
+
+
+def requeue(jobs, run_after, error=''):
+    """
+    Queue running `jobs` again. One whose dedup key was queued again meanwhile
+    is dropped instead: the queued job will do its work.
+    """
+    with transaction.atomic():
+        jobs = jobs.filter(status=Job.RUNNING)
+        queued_keys = Job.objects.filter(status=Job.QUEUED, dedup_key__isnull=False).values('dedup_key')
+        jobs.filter(dedup_key__in=queued_keys).delete()
+        try:
+            with transaction.atomic():
+                return jobs.update(status=Job.QUEUED, claim='', run_after=run_after, last_error=error)
+        except IntegrityError:
+            # The key was queued between the two statements; the next pass settles it
+            return 0
+
+
+def requeue_lost():
+    """
+    Queue again the jobs that have run for longer than JOB_TIMEOUT seconds.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_TIMEOUT', 600))
+    return requeue(Job.objects.filter(started_at__lt=cutoff), timezone.now(), 'Timed out.')
+
+
+def run_pending(batch_size=10):
+    """
+    Run due jobs in this thread until none are left. Returns the number run.
+    """
+    total = 0
+    while True:
+        jobs = claim(batch_size)
+        if not jobs:
+            return total
+        for job in jobs:
+            execute(job)
+        total += len(jobs)
+
+
+class Worker:
+    """
+    Claims and runs jobs until stopped; `run_jobs` runs one per thread or process.
+    """
+
+    def __init__(self, batch_size=10, poll_interval=1.0, stop=None):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stop = stop or threading.Event()
+
+    def run(self, drain=False):
+        """
+        Work until stopped, or with `drain` until no job is due.
+        """
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    requeue_lost()
+                    jobs = claim(self.batch_size)
+                except DatabaseError:
+                    # E.g. the database restarting; claimed jobs are recovered by requeue_lost()
+                    logger.exception('Claiming jobs failed')
+                    connection.close()
+                    self.stop.wait(self.poll_interval)
+                    continue
+                for job in jobs:
+                    execute(job)
+                if not jobs:
+                    if drain:
+                        break
+                    self.stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+
+def job_metrics():
+    """
+    Collector exposing the queue depth by status and the age of the oldest due
+    job on /metrics (see imdb.metrics). These read the Job table, so every
+    process reports the same values.
+    """
+    depth = dict.fromkeys((status for status, _ in Job.STATUSES), 0)
+    depth.update(Job.objects.values_list('status').annotate(n=Count('pk')).order_by())
+    oldest = Job.objects.filter(status=Job.QUEUED, run_after__lte=timezone.now()).aggregate(
+        oldest=Min('run_after')
+    )['oldest']
+    age = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+    return [
+        ('job_queue_depth', 'gauge', 'Jobs in the queue by status.',
+         {(('status', status),): count for status, count in depth.items()}),
+        ('job_queue_oldest_due_seconds', 'gauge', 'Age of the oldest job waiting for a worker.', {(): age}),
+    ]
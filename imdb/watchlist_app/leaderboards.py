@@ -0,0 +1,192 @@
+"""
+Top-rated leaderboards, maintained incrementally.
+
+Each board holds the settings.LEADERBOARD_SIZE best active, reviewed titles of
+its scope, ranked by weighted rating (see aggregates.py), then number of
+reviews, then id:
+
+* 'all': the whole catalog;
+* 'platform:<id>': the titles of one streaming platform;
+* 'year:<year>': the titles released in one year.
+
+Boards are stored as LeaderboardEntry rows, so serving one is an index range
+scan of at most LEADERBOARD_SIZE rows instead of sorting the catalog.
+
+Whenever a title's aggregates, platform, release date or active flag change,
+the writer queues a job (see tasks.py) that calls `titles_changed()`, so
+boards trail writes by the job queue's latency. The title's entry
+on each of its boards is upserted (it may join, move or leave a board), a board
+it fell on or left is offered the best title not on it, and entries beyond
+LEADERBOARD_SIZE are trimmed. No board is ever re-sorted. Writes that bypass
+the API (the admin, raw SQL, seed_data) are picked up by
+`manage.py rebuild_leaderboards`; refreshing the weighted rating prior moves
+every title at once, so `manage.py refresh_rating_prior` rebuilds the boards.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import ExtractYear, RowNumber
+
+from watchlist_app.models import LeaderboardEntry, WatchList
+
+# Best first; entries and titles are ranked the same way
+ENTRY_RANKING = ('-weighted_rating', '-number_of_reviews', 'watchlist_id')
+TITLE_RANKING = ('-weighted_rating', '-number_of_reviews', 'pk')
+
+TITLE_FIELDS = (
+    'pk', 'active', 'average_rating', 'weighted_rating', 'number_of_reviews', 'platform_id', 'release_date',
+)
+
+
+def size():
+    return getattr(settings, 'LEADERBOARD_SIZE', 100)
+
+
+def board_keys(platform_id, release_date):
+    keys = ['all', f'year:{release_date.year}']
+    if platform_id is not None:
+        keys.append(f'platform:{platform_id}')
+    return keys
+
+
+def eligible(board=None):
+    """
+    Titles that may appear on `board` (on any board if None).
+    """
+    titles = WatchList.objects.filter(active=True, number_of_reviews__gt=0)
+    scope, _, value = (board or 'all').partition(':')
+    if scope == 'platform':
+        titles = titles.filter(platform_id=int(value))
+    elif scope == 'year':
+        titles = titles.filter(release_date__year=int(value))
+    return titles
+
+
+def entry(board, title):
+    return LeaderboardEntry(
+        board=board,
+        watchlist_id=title['pk'],
+        average_rating=title['average_rating'],
+        weighted_rating=title['weighted_rating'],
+        number_of_reviews=title['number_of_reviews'],
+    )
+
+
+def score(member):
+    # Higher is better; the id that settles ties never changes
+    return (member.weighted_rating, member.number_of_reviews)
+
+
+def upsert(entries):
+    if entries:
+        LeaderboardEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['watchlist', 'board'],
+            update_fields=['average_rating', 'weighted_rating', 'number_of_reviews'],
+        )
+
+
+def trim(boards):
+    """
+    Delete the entries ranked below LEADERBOARD_SIZE on the given boards.
+    """
+    ranked = LeaderboardEntry.objects.filter(board__in=boards).annotate(
+        rank=Window(RowNumber(), partition_by=[F('board')], order_by=ENTRY_RANKING),
+    )
+    LeaderboardEntry.objects.filter(pk__in=ranked.filter(rank__gt=size()).values('pk')).delete()
+
+
+def refill(boards):
+    """
+    Offer each board the best titles not on it: enough to fill its free places,
+    plus one in case a member fell below a title that isn't on the board. The
+    surplus is trimmed again.
+    """
+    offers = []
+    for board in boards:
+        members = LeaderboardEntry.objects.filter(board=board)
+        vacancies = size() - members.count()
+        outsiders = eligible(board).exclude(pk__in=members.values('watchlist_id'))
+        for title in outsiders.order_by(*TITLE_RANKING).values(*TITLE_FIELDS)[:max(vacancies, 0) + 1]:
+            offers.append(entry(board, title))
+    if offers:
+        upsert(offers)
+        trim({offer.board for offer in offers})
+
+
+@transaction.atomic(savepoint=False)
+def titles_changed(watchlist_ids):
+    """
+    Bring the boards of these titles up to date with their current rows.
+    """
+    titles = WatchList.objects.filter(pk__in=watchlist_ids).values(*TITLE_FIELDS)
+    current = {
+        (member.board, member.watchlist_id): member
+        for member in LeaderboardEntry.objects.filter(watchlist_id__in=watchlist_ids)
+    }
+    wanted = {}
+    for title in titles:
+        if title['active'] and title['number_of_reviews']:
+            for board in board_keys(title['platform_id'], title['release_date']):
+                wanted[(board, title['pk'])] = entry(board, title)
+
+    # Boards a title left, or moved down on, may now have a better title outside
+    weakened = {board for board, pk in current.keys() - wanted.keys()}
+    joined = set()
+    changed = []
+    for key, new in wanted.items():
+        old = current.get(key)
+        if old is None:
+            joined.add(new.board)
+        elif score(new) == score(old):
+            continue
+        elif score(new) < score(old):
+            weakened.add(new.board)
+        changed.append(new)
+
+    stale = [current[key].pk for key in current.keys() - wanted.keys()]
+    if stale:
+        LeaderboardEntry.objects.filter(pk__in=stale).delete()
+    upsert(changed)
+    if joined:
+        trim(joined)
+    if weakened:
+        refill(weakened)
+
+
+def boards_of(watchlist_ids):
+    """
+    The boards the given titles are on; call before deleting them, then
+    `refill()` these boards.
+    """
+    return set(
+        LeaderboardEntry.objects.filter(watchlist_id__in=watchlist_ids)
+        .values_list('board', flat=True).distinct()
+    )
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute every board from the catalog, e.g. on a cold start. Returns the
+    number of entries written.
+    """
+    LeaderboardEntry.objects.all().delete()
+    titles = eligible()
+    entries = [entry('all', title) for title in titles.order_by(*TITLE_RANKING).values(*TITLE_FIELDS)[:size()]]
+    # One query per kind of board, ranking titles within each platform or year
+    kinds = (
+        ('platform', titles.filter(platform__isnull=False), 'platform_id'),
+        ('year', titles.annotate(year=ExtractYear('release_date')), 'year'),
+    )
+    for prefix, scope, column in kinds:
+        ranked = scope.annotate(
+            rank=Window(RowNumber(), partition_by=[F(column)], order_by=TITLE_RANKING),
+        ).filter(rank__lte=size()).order_by()
+        entries.extend(
+            entry(f'{prefix}:{title[column]}', title)
+            for title in ranked.values(*dict.fromkeys(TITLE_FIELDS + (column,)))
+        )
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=5000)
+    return len(entries)
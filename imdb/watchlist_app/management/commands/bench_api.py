@@ -0,0 +1,346 @@
+import json
+import random
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account_app.api import urls as account_urls
+from watchlist_app import aggregates
+from watchlist_app.api import urls as watchlist_urls
+from watchlist_app.benchmarks import QueryTimer, scratch_database, summarize, timed
+from watchlist_app.models import Review, StreamingPlatform, WatchList
+from watchlist_app.seeding import USER_PREFIX, seed_catalog
+
+DESCRIPTION = 'Created by the API benchmark.'
+
+
+class Case:
+    """
+    One benchmarked request. `prepare(i)` runs untimed before the i-th request
+    (it may create the rows the request needs) and returns (url, data, token).
+    Expensive cases run `runs // scale` times.
+    """
+
+    def __init__(self, route, method, prepare, variant='', scale=1):
+        self.route = route
+        self.method = method
+        self.prepare = prepare
+        self.name = f'{route} {method.upper()}' + (f' {variant}' if variant else '')
+        self.scale = scale
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and time every API route through the test client, "
+        "reporting p50/p95/p99 latency, query count, DB time and response size per "
+        "endpoint. Compare against a saved JSON baseline to catch regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--platforms', type=int, default=50)
+        parser.add_argument('--titles', type=int, default=200_000)
+        parser.add_argument('--reviews', type=int, default=5_000_000)
+        parser.add_argument('--users', type=int, default=10_000, help='Reviewers; caps reviews per title.')
+        parser.add_argument('--runs', type=int, default=50, help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the response cache between requests (default: measure misses).')
+        parser.add_argument('--only', action='append', default=[], help='Only run endpoints containing this text.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the seeded scratch database.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='Compare against a report saved with --output.')
+        parser.add_argument('--max-latency-regression', type=float, default=20.0,
+                            help='Allowed p50/p95 growth over the baseline, in percent.')
+        parser.add_argument('--latency-floor-ms', type=float, default=1.0,
+                            help='Ignore latency changes smaller than this many milliseconds.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        setup_test_environment()
+        try:
+            with scratch_database(keepdb=options['keepdb']):
+                seed_catalog(
+                    options['platforms'], options['titles'], options['reviews'], options['users'],
+                    seed=options['seed'],
+                )
+                self.setup_fixtures()
+                cases = [
+                    case for case in self.cases()
+                    if not options['only'] or any(text in case.name for text in options['only'])
+                ]
+                # Throttles would turn the benchmark into a 429 benchmark
+                with mock.patch.object(APIView, 'check_throttles', lambda self, request: None):
+                    endpoints = {case.name: self.run(case, options) for case in cases}
+                report = {
+                    'dataset': {
+                        'vendor': connection.vendor,
+                        'platforms': StreamingPlatform.objects.count(),
+                        'titles': WatchList.objects.count(),
+                        'reviews': Review.objects.count(),
+                        'users': User.objects.count(),
+                    },
+                    'runs': options['runs'],
+                    'warm_cache': options['warm_cache'],
+                    'endpoints': endpoints,
+                    'unbenchmarked': self.unbenchmarked(cases) if not options['only'] else [],
+                }
+        finally:
+            teardown_test_environment()
+
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                report['regressions'] = compare(
+                    report, json.load(fh), options['max_latency_regression'], options['latency_floor_ms']
+                )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(report)
+        if report.get('regressions'):
+            raise CommandError(f"{len(report['regressions'])} regression(s) against {options['baseline']}")
+
+    # --- Fixtures and cases -------------------------------------------------
+
+    def setup_fixtures(self):
+        self.counter = 0
+        self.admin, _ = User.objects.get_or_create(
+            username='bench-admin', defaults={'is_staff': True, 'email': 'bench-admin@example.com'}
+        )
+        self.admin.set_password('benchpassword')
+        self.admin.save()
+        self.reviewer, _ = User.objects.get_or_create(
+            username='bench-reviewer', defaults={'email': 'bench-reviewer@example.com'}
+        )
+        self.reviewer.set_password('benchpassword')
+        self.reviewer.save()
+        self.admin_token = Token.objects.get_or_create(user=self.admin)[0].key
+        self.reviewer_token = Token.objects.get_or_create(user=self.reviewer)[0].key
+
+        # The most reviewed title and a platform with titles, as the hot read paths
+        self.title = WatchList.objects.order_by('-number_of_reviews', 'pk').first() or self.new_title()
+        self.platform = self.title.platform or StreamingPlatform.objects.create(name='Bench platform')
+        # A fixed sample (for a given --seed) of titles to read and search for
+        ids = list(WatchList.objects.order_by('pk').values_list('pk', flat=True))
+        self.title_ids = self.rng.sample(ids, min(1000, len(ids)))
+        self.search_terms = [
+            title.split()[0]
+            for title in WatchList.objects.filter(pk__in=self.title_ids[:100]).values_list('title', flat=True)
+        ]
+        self.review = Review.objects.filter(watchlist=self.title).first() or self.new_review()
+        self.reviewer_review = self.new_review()
+        self.seed_username = f'{USER_PREFIX}0'
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix} {self.rng.getrandbits(32):08x}-{self.counter}'
+
+    def new_title(self):
+        return WatchList.objects.create(
+            title=self.unique('Bench'), description=DESCRIPTION,
+            platform=StreamingPlatform.objects.first(), release_date=date(2020, 1, 1),
+        )
+
+    def new_review(self):
+        title = self.new_title()
+        review = Review.objects.create(
+            review_user=self.reviewer, watchlist=title, review_text='Bench review.', rating=6
+        )
+        aggregates.review_created(title.pk, review.rating)
+        return review
+
+    def title_data(self, **extra):
+        return {
+            'title': self.unique('Bench'),
+            'description': DESCRIPTION,
+            'release_date': '2020-01-01',
+            'platform': self.platform.pk,
+            **extra,
+        }
+
+    def cases(self):
+        admin, reviewer = self.admin_token, self.reviewer_token
+        pick = lambda i: self.title_ids[i % len(self.title_ids)] if self.title_ids else self.title.pk
+        return [
+            # Titles
+            Case('movie-list', 'get', lambda i: (reverse('movie-list'), None, None)),
+            Case('movie-list', 'get', lambda i: (reverse('movie-list') + '?expand=platform,reviews', None, None),
+                 variant='expanded'),
+            Case('movie-list', 'post', lambda i: (reverse('movie-list'), self.title_data(), admin)),
+            Case('movie-detail', 'get', lambda i: (reverse('movie-detail', args=[pick(i)]), None, None)),
+            Case('movie-detail', 'get',
+                 lambda i: (reverse('movie-detail', args=[self.title.pk]) + '?expand=reviews', None, None),
+                 variant='most-reviewed expanded'),
+            Case('movie-detail', 'put', lambda i: (reverse('movie-detail', args=[pick(i)]), self.title_data(), admin)),
+            Case('movie-detail', 'delete',
+                 lambda i: (reverse('movie-detail', args=[self.new_title().pk]), None, admin)),
+            Case('search-list', 'get', lambda i: (
+                reverse('search-list') + f'?search={self.search_terms[i % len(self.search_terms)]}'
+                if self.search_terms else reverse('search-list'), None, None)),
+            Case('search-list', 'get',
+                 lambda i: (reverse('search-list') + '?ordering=-average_rating', None, None), variant='top-rated'),
+            Case('movie-bulk', 'post',
+                 lambda i: (reverse('movie-bulk'), [self.title_data() for _ in range(100)], admin),
+                 variant='100 items', scale=5),
+            Case('movie-export', 'get',
+                 lambda i: (reverse('movie-export') + f'?platform={self.platform.pk}', None, admin),
+                 variant='one platform', scale=10),
+            # Platforms
+            Case('streaming-platform-list', 'get', lambda i: (reverse('streaming-platform-list'), None, None)),
+            Case('streaming-platform-list', 'post', lambda i: (
+                reverse('streaming-platform-list'), {'name': self.unique('P'), 'website': 'https://example.com'},
+                admin)),
+            Case('streaming-platform-detail', 'get',
+                 lambda i: (reverse('streaming-platform-detail', args=[self.platform.pk]), None, None)),
+            Case('streaming-platform-detail', 'put', lambda i: (
+                reverse('streaming-platform-detail', args=[self.platform.pk]),
+                {'name': self.unique('P'), 'website': 'https://example.com'}, admin)),
+            Case('streaming-platform-detail', 'delete', lambda i: (
+                reverse('streaming-platform-detail',
+                        args=[StreamingPlatform.objects.create(name=self.unique('P')).pk]),
+                None, admin)),
+            Case('streaming-platform-bulk', 'put', lambda i: (
+                reverse('streaming-platform-bulk'),
+                [{'name': self.unique('P'), 'website': 'https://example.com'} for _ in range(10)], admin),
+                variant='10 items'),
+            # Reviews
+            Case('review-create', 'post', lambda i: (
+                reverse('review-create', args=[self.new_title().pk]),
+                {'review_text': 'Bench review.', 'rating': 7}, reviewer)),
+            Case('review-list', 'get', lambda i: (reverse('review-list', args=[self.title.pk]), None, None)),
+            Case('review-detail', 'get', lambda i: (reverse('review-detail', args=[self.review.pk]), None, None)),
+            Case('review-detail', 'put', lambda i: (
+                reverse('review-detail', args=[self.reviewer_review.pk]),
+                {'review_text': 'Bench update.', 'rating': i % 10 + 1}, reviewer)),
+            Case('review-detail', 'delete',
+                 lambda i: (reverse('review-detail', args=[self.new_review().pk]), None, reviewer)),
+            Case('user-reviews', 'get',
+                 lambda i: (reverse('user-reviews') + f'?username={self.seed_username}', None, None)),
+            Case('review-bulk', 'post', lambda i: (
+                reverse('review-bulk'),
+                [{'watchlist': self.new_title().pk, 'review_text': 'Bench review.', 'rating': 5}
+                 for _ in range(50)], reviewer),
+                variant='50 items', scale=5),
+            Case('review-export', 'get',
+                 lambda i: (reverse('review-export') + f'?platform={self.platform.pk}', None, admin),
+                 variant='one platform', scale=10),
+            # Accounts
+            Case('api-register', 'post', lambda i: (reverse('api-register'), self.registration(), None)),
+            Case('api-login', 'post', lambda i: (
+                reverse('api-login'), {'username': 'bench-reviewer', 'password': 'benchpassword'}, None)),
+            Case('api-logout', 'post',
+                 lambda i: (reverse('api-logout'), None, self.throwaway_token())),
+            Case('token-obtain-pair', 'post', lambda i: (
+                reverse('token-obtain-pair'), {'username': 'bench-reviewer', 'password': 'benchpassword'}, None)),
+            Case('token-refresh', 'post', lambda i: (
+                reverse('token-refresh'), {'refresh': str(RefreshToken.for_user(self.reviewer))}, None)),
+        ]
+
+    def registration(self):
+        name = self.unique('bench-user').replace(' ', '-')
+        return {'username': name, 'email': f'{name}@example.com', 'password': 'pw', 'password2': 'pw'}
+
+    def throwaway_token(self):
+        user = User.objects.create_user(self.unique('bench-logout').replace(' ', '-'))
+        return Token.objects.create(user=user).key
+
+    def unbenchmarked(self, cases):
+        covered = {case.route for case in cases}
+        routes = [p.name for p in watchlist_urls.urlpatterns + account_urls.urlpatterns if p.name]
+        return sorted(set(routes) - covered)
+
+    # --- Measurement ------------------------------------------------------
+
+    def run(self, case, options):
+        client = APIClient()
+        runs = max(1, options['runs'] // case.scale)
+        samples, queries, db_ms, sizes, statuses = [], [], [], [], {}
+        for i in range(options['warmup'] + runs):
+            url, data, token = case.prepare(i)
+            if not options['warm_cache']:
+                cache.clear()
+            client.credentials(**({'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}))
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                size, elapsed = timed(self.send, client, case.method, url, data, statuses)
+            if i < options['warmup']:
+                continue
+            samples.append(elapsed)
+            queries.append(timer.count)
+            db_ms.append(timer.seconds * 1000)
+            sizes.append(size)
+        return {
+            **summarize(samples),
+            'queries': max(queries),
+            'db_ms': round(sum(db_ms) / len(db_ms), 3),
+            'bytes': round(sum(sizes) / len(sizes)),
+            'status': statuses,
+        }
+
+    @staticmethod
+    def send(client, method, url, data, statuses):
+        response = getattr(client, method)(url, data, format='json')
+        # Streaming bodies are produced (and queried) while being consumed
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        return size
+
+    def print_table(self, report):
+        dataset = report['dataset']
+        self.stdout.write(
+            f"{dataset['vendor']}: {dataset['platforms']} platforms, {dataset['titles']} titles, "
+            f"{dataset['reviews']} reviews, {dataset['users']} users; {report['runs']} runs per endpoint"
+        )
+        self.stdout.write(
+            f"{'endpoint':48} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'db ms':>8} {'bytes':>9}  status"
+        )
+        for name, stats in report['endpoints'].items():
+            status = ','.join(f'{code}x{count}' for code, count in sorted(stats['status'].items()))
+            self.stdout.write(
+                f"{name:48} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} "
+                f"{stats['queries']:8d} {stats['db_ms']:8.2f} {stats['bytes']:9d}  {status}"
+            )
+        if report['unbenchmarked']:
+            self.stdout.write(self.style.WARNING(f"Not benchmarked: {', '.join(report['unbenchmarked'])}"))
+        for regression in report.get('regressions', []):
+            self.stdout.write(self.style.ERROR(regression))
+
+
+def compare(report, baseline, max_latency_regression, latency_floor_ms):
+    """
+    Describe every endpoint that got slower than the baseline by more than the
+    allowed percentage (and the noise floor) or that now runs more queries.
+    """
+    regressions = []
+    for name, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = previous[metric] * (1 + max_latency_regression / 100)
+            if current[metric] > limit and current[metric] - previous[metric] > latency_floor_ms:
+                regressions.append(
+                    f'{name}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f} '
+                    f'(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)'
+                )
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
@@ -0,0 +1,221 @@
+import asyncio
+import io
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends import utils as backend_utils
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework.views import APIView
+
+from watchlist_app.api import cache as response_cache
+from watchlist_app.benchmarks import scratch_database, summarize
+from watchlist_app.models import StreamingPlatform, WatchList
+from watchlist_app.seeding import seed_catalog
+
+HOST = 'testserver'  # Allowed by setup_test_environment()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second of the read endpoints under the ASGI application "
+        "(async views) and the WSGI application (sync views) with many concurrent "
+        "clients. Both applications are driven in-process, without an HTTP server, on "
+        "a seeded scratch database; --db-latency-ms adds a simulated network round trip "
+        "to every query, as with a remote database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per application.')
+        parser.add_argument('--wsgi-threads', type=int,
+                            help='WSGI worker threads (default: one per client, like a threaded server).')
+        parser.add_argument('--db-latency-ms', type=float, default=5.0,
+                            help='Simulated round-trip time added to every SQL query.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Serve repeated requests from the response cache (default: always miss).')
+        parser.add_argument('--platforms', type=int, default=20)
+        parser.add_argument('--titles', type=int, default=5000)
+        parser.add_argument('--reviews', type=int, default=50_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the seeded scratch database.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        # Imported here: both modules build their application at import time
+        from imdb.asgi import application as asgi_application
+        from imdb.wsgi import application as wsgi_application
+
+        setup_test_environment()
+        try:
+            with scratch_database(keepdb=options['keepdb']):
+                seed_catalog(
+                    options['platforms'], options['titles'], options['reviews'], options['users'],
+                    seed=options['seed'],
+                )
+                urls = self.urls(random.Random(options['seed']), options['requests'])
+                with self.patches(options):
+                    report = {
+                        'clients': options['clients'],
+                        'requests': options['requests'],
+                        'db_latency_ms': options['db_latency_ms'],
+                        'warm_cache': options['warm_cache'],
+                        'wsgi': self.run_wsgi(wsgi_application, urls, options),
+                        'asgi': asyncio.run(self.run_asgi(asgi_application, urls, options['clients'])),
+                    }
+                for connection in connections.all():
+                    connection.close()
+        finally:
+            teardown_test_environment()
+
+        report['asgi_speedup'] = round(report['asgi']['rps'] / max(report['wsgi']['rps'], 1e-9), 2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{report['requests']} requests, {report['clients']} clients, "
+            f"{report['db_latency_ms']} ms simulated DB round trip"
+        )
+        for name in ('wsgi', 'asgi'):
+            stats = report[name]
+            self.stdout.write(
+                f"{name.upper():5} {stats['rps']:9.1f} req/s  p50 {stats['p50_ms']:8.2f} ms  "
+                f"p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  errors {stats['errors']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"ASGI/WSGI throughput: {report['asgi_speedup']}x"))
+
+    def urls(self, rng, count):
+        """
+        A fixed (for a given --seed) mix of reads over the async endpoints.
+        """
+        titles = list(WatchList.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+        platforms = list(StreamingPlatform.objects.order_by('pk').values_list('pk', flat=True))
+        usernames = ['seed0', 'seed1', 'seed2']
+        makers = [
+            lambda: reverse('movie-list'),
+            lambda: reverse('movie-list') + '?expand=platform',
+            lambda: reverse('movie-detail', args=[rng.choice(titles)]),
+            lambda: reverse('review-list', args=[rng.choice(titles)]),
+            lambda: reverse('search-list') + '?search=' + rng.choice('aeiou') + 'r',
+            lambda: reverse('streaming-platform-list'),
+            lambda: reverse('streaming-platform-detail', args=[rng.choice(platforms)]),
+            lambda: reverse('user-reviews') + '?username=' + rng.choice(usernames),
+        ]
+        return [rng.choice(makers)() for _ in range(count)]
+
+    def patches(self, options):
+        stack = ExitStack()
+        # Throttles would turn the benchmark into a 429 benchmark
+        stack.enter_context(mock.patch.object(APIView, 'check_throttles', lambda self, request: None))
+        # Every request is "slow" at this concurrency; logging each would be the bottleneck
+        stack.enter_context(override_settings(SLOW_REQUEST_MS=float('inf')))
+        latency = options['db_latency_ms'] / 1000
+        if latency:
+            execute = backend_utils.CursorWrapper._execute
+
+            def slow_execute(self, sql, params, *ignored_wrapper_args):
+                time.sleep(latency)  # Blocks the calling thread, like waiting on the network
+                return execute(self, sql, params, *ignored_wrapper_args)
+
+            stack.enter_context(mock.patch.object(backend_utils.CursorWrapper, '_execute', slow_execute))
+        if not options['warm_cache']:
+            stack.enter_context(mock.patch.object(
+                response_cache, 'response_key', lambda request, resources: f'bench:{uuid4().hex}'
+            ))
+        return stack
+
+    # --- WSGI ---------------------------------------------------------------
+
+    def run_wsgi(self, application, urls, options):
+        # Clients queue for one of the server's worker threads; the wait counts as latency
+        workers = threading.BoundedSemaphore(options['wsgi_threads'] or options['clients'])
+
+        def call(url):
+            parts = urlsplit(url)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query,
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+                'wsgi.version': (1, 0),
+            }
+            status = []
+            start = time.perf_counter()
+            with workers:
+                body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+                try:
+                    for _ in body:
+                        pass
+                finally:
+                    body.close()
+            return (time.perf_counter() - start) * 1000, status[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            results = list(pool.map(call, urls))
+        return self.summary(results, time.perf_counter() - started)
+
+    # --- ASGI ---------------------------------------------------------------
+
+    async def run_asgi(self, application, urls, clients):
+        queue = iter(urls)
+        results = []
+
+        async def call(url):
+            parts = urlsplit(url)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': parts.path, 'raw_path': parts.path.encode(),
+                'query_string': parts.query.encode(), 'root_path': '',
+                'headers': [(b'host', HOST.encode())], 'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+            }
+            request_sent = False
+            disconnected = asyncio.Event()
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client stays connected until the response is complete
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            status = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            disconnected.set()
+            return (time.perf_counter() - start) * 1000, status[0] == 200
+
+        async def client():
+            for url in queue:
+                results.append(await call(url))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return self.summary(results, time.perf_counter() - started)
+
+    @staticmethod
+    def summary(results, seconds):
+        return {
+            'rps': round(len(results) / seconds, 1),
+            'errors': sum(1 for _, ok in results if not ok),
+            **summarize([ms for ms, _ in results]),
+        }
+
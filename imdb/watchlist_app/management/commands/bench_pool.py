@@ -0,0 +1,110 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from imdb.db_pool import ConnectionPool
+from watchlist_app.benchmarks import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare connecting to the database for every request (CONN_MAX_AGE=0 without "
+        "a pool) with checking connections out of an imdb.db_pool pool. Each simulated "
+        "request gets a connection, runs --queries queries and closes or returns it. "
+        "--connect-latency-ms adds the setup cost of a remote server (TCP, TLS and "
+        "authentication round trips) when benchmarking against a local database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to connect to.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode.')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent requests.')
+        parser.add_argument('--pool-size', type=int, default=4, help='Pool MAX_SIZE (per worker process).')
+        parser.add_argument('--queries', type=int, default=3, help='Queries per request.')
+        parser.add_argument('--connect-latency-ms', type=float, default=0.0,
+                            help='Simulated extra time to open a connection.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        wrapper = connections[options['database']]
+        params = wrapper.get_connection_params()
+        latency = options['connect_latency_ms'] / 1000
+
+        def connect():
+            time.sleep(latency)
+            return wrapper.Database.connect(**params)
+
+        pool = ConnectionPool(connect, max_size=options['pool_size'], name=options['database'])
+
+        def per_request_connect():
+            connection = connect()
+            try:
+                self.queries(connection, options['queries'])
+            finally:
+                connection.close()
+
+        def pooled():
+            connection = pool.getconn()
+            try:
+                self.queries(connection, options['queries'])
+            finally:
+                pool.putconn(connection)
+
+        report = {
+            'vendor': wrapper.vendor,
+            'requests': options['requests'],
+            'threads': options['threads'],
+            'queries_per_request': options['queries'],
+            'connect_latency_ms': options['connect_latency_ms'],
+            'connect_per_request': self.run(per_request_connect, options),
+            'pooled': self.run(pooled, options),
+            'pool': pool.snapshot(),
+        }
+        pool.close()
+
+        report['speedup_p50'] = round(
+            report['connect_per_request']['p50_ms'] / max(report['pooled']['p50_ms'], 1e-6), 2
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{report['vendor']}: {report['requests']} requests, {report['threads']} threads, "
+            f"{report['queries_per_request']} queries each, "
+            f"{report['connect_latency_ms']} ms simulated connect latency"
+        )
+        for name in ('connect_per_request', 'pooled'):
+            stats = report[name]
+            self.stdout.write(
+                f"{name:20} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                f"p99 {stats['p99_ms']:8.2f} ms"
+            )
+        stats = report['pool']
+        self.stdout.write(
+            f"pool: {stats['opened']} connections opened, {stats['waits']} waits "
+            f"({stats['wait_seconds'] * 1000:.1f} ms), {stats['timeouts']} timeouts"
+        )
+        self.stdout.write(self.style.SUCCESS(f"p50 speedup: {report['speedup_p50']}x"))
+
+    @staticmethod
+    def queries(connection, count):
+        cursor = connection.cursor()
+        try:
+            for _ in range(count):
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def run(request, options):
+        def timed_request(_):
+            start = time.perf_counter()
+            request()
+            return (time.perf_counter() - start) * 1000
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            return summarize(list(executor.map(timed_request, range(options['requests']))))
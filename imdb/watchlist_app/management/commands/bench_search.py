@@ -0,0 +1,104 @@
+import json
+import random
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from watchlist_app.api.filters import TitleSearchFilter
+from watchlist_app.benchmarks import scratch_database, summarize, timed
+from watchlist_app.models import WatchList
+from watchlist_app.seeding import vocabulary
+
+
+class LegacySearchView:
+    # What SearchWatchListView used before: ILIKE '%term%' on the title
+    search_fields = ['title', '=platform__name']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the indexed title search with the previous DRF SearchFilter "
+        "(ILIKE '%term%') on a scratch database seeded with N titles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=1_000_000, help='Number of titles to seed.')
+        parser.add_argument('--queries', type=int, default=50, help='Search terms to run per backend.')
+        parser.add_argument('--page-size', type=int, default=20, help='Rows fetched per search, like one API page.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for titles and terms.')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the scratch database between runs.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.words = vocabulary(rng)
+        # Word i is drawn with weight 1/(i+1), so a few words are very common
+        self.weights = [1 / (i + 1) for i in range(len(self.words))]
+        with scratch_database(keepdb=options['keepdb']):
+            self.seed(rng, options['titles'])
+            terms = self.terms(rng, options['queries'])
+            report = {
+                'titles': WatchList.objects.count(),
+                'legacy_search_filter': self.run(terms, self.legacy, options['page_size']),
+                'indexed_search': self.run(terms, self.indexed, options['page_size']),
+            }
+
+        legacy, indexed = report['legacy_search_filter'], report['indexed_search']
+        report['speedup_p50'] = round(legacy['p50_ms'] / max(indexed['p50_ms'], 1e-6), 2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['titles']} titles, {len(terms)} queries")
+        for name in ('legacy_search_filter', 'indexed_search'):
+            stats = report[name]
+            self.stdout.write(
+                f"{name:22} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  "
+                f"p99 {stats['p99_ms']:9.2f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS(f"p50 speedup: {report['speedup_p50']}x"))
+
+    def seed(self, rng, count, batch_size=5000):
+        existing = WatchList.objects.count()
+        for start in range(existing, count, batch_size):
+            WatchList.objects.bulk_create([
+                WatchList(
+                    title=' '.join(rng.choices(self.words, self.weights, k=rng.randint(1, 4))).title(),
+                    description='Seeded for the search benchmark.',
+                    release_date=date(1950 + rng.randrange(75), 1, 1),
+                )
+                for _ in range(min(batch_size, count - start))
+            ])
+
+    def terms(self, rng, count):
+        terms = []
+        for _ in range(count):
+            word = rng.choices(self.words, self.weights)[0]
+            if len(word) > 4 and rng.random() < 0.3:
+                # Drop a letter to simulate a typo
+                cut = rng.randrange(1, len(word) - 1)
+                word = word[:cut] + word[cut + 1:]
+            terms.append(word)
+        return terms
+
+    def request(self, term):
+        return Request(APIRequestFactory().get('/', {'search': term}))
+
+    def legacy(self, term):
+        return filters.SearchFilter().filter_queryset(
+            self.request(term), WatchList.objects.all(), LegacySearchView()
+        ).order_by('-created_at', '-id')
+
+    def indexed(self, term):
+        return TitleSearchFilter().filter_queryset(
+            self.request(term), WatchList.objects.all(), None
+        ).order_by('-rank', '-id')
+
+    def run(self, terms, build, page_size):
+        samples = []
+        for term in terms:
+            _, elapsed = timed(lambda: list(build(term)[:page_size]))
+            samples.append(elapsed)
+        return summarize(samples)
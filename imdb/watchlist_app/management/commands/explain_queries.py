@@ -0,0 +1,93 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.settings import api_settings
+
+from watchlist_app.api.pagination import KeysetCursorPagination
+from watchlist_app.models import Review, StreamingPlatform, WatchList
+
+# A full scan of a table, as opposed to an index lookup or an ordered index scan
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+
+def scanned_tables(pattern, queryset, plan):
+    tables = sorted(set(pattern.findall(plan)))
+    query = queryset.query
+    if (connection.vendor == 'sqlite' and query.high_mark is not None and not query.where
+            and 'USE TEMP B-TREE' not in plan):
+        # SQLite shows a walk in rowid order as SCAN; without a filter or a sort
+        # the LIMIT stops it after one page
+        return []
+    return tables
+
+
+def endpoint_queries():
+    """
+    The main query of each hot endpoint, as the views build it, bound to a real
+    title and user when the tables have any.
+    """
+    page = (api_settings.PAGE_SIZE or 20) + 1
+    newest_first = KeysetCursorPagination.ordering
+    title = WatchList.objects.values_list('pk', flat=True).first() or 1
+    user_id, username = User.objects.values_list('pk', 'username').first() or (1, 'admin')
+    return {
+        'movie-list': WatchList.objects.order_by(*newest_first)[:page],
+        'movie-detail': WatchList.objects.filter(pk=title),
+        'search-list ?ordering=-average_rating': WatchList.objects.order_by('-average_rating', '-id')[:page],
+        'search-list ?ordering=-weighted_rating': WatchList.objects.order_by('-weighted_rating', '-id')[:page],
+        'movie-export ?active=true': WatchList.objects.filter(active=True).order_by('pk')[:page],
+        'review-list': Review.objects.filter(watchlist=title).order_by(*newest_first)[:page],
+        'review-bulk existing reviews': Review.objects.filter(review_user=user_id, watchlist__in=[title]),
+        'user-reviews': Review.objects.filter(review_user__username=username).order_by(*newest_first)[:page],
+        'streaming-platform-list': StreamingPlatform.objects.order_by('id')[:page],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN for the main query of each hot endpoint and flag every "
+        "sequential (full table) scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='PostgreSQL only: discourage sequential scans (SET enable_seqscan = off) so '
+                 'a query that still scans has no usable index, however small the tables are.',
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only flagged ones.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any scan is flagged.')
+
+    def handle(self, *args, no_seqscan, verbose_plans, fail, **options):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            self.stdout.write(self.style.WARNING(
+                f'No sequential-scan detection for {connection.vendor}; plans are printed as-is.'
+            ))
+            verbose_plans = True
+
+        flagged = []
+        with transaction.atomic():
+            if no_seqscan and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in endpoint_queries().items():
+                plan = queryset.explain()
+                tables = scanned_tables(pattern, queryset, plan) if pattern else []
+                if tables:
+                    flagged.append(name)
+                    self.stdout.write(self.style.ERROR(f"SEQ SCAN  {name}: {', '.join(tables)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'OK        {name}'))
+                if tables or verbose_plans:
+                    self.stdout.write(f'    {queryset.query}')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+
+        if flagged and fail:
+            raise CommandError(f'{len(flagged)} endpoint quer(ies) scan a whole table.')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from watchlist_app import leaderboards
+from watchlist_app.api.cache import bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every top-rated leaderboard (overall, per platform and per release "
+        "year) from the catalog. Run it on a cold start, or after writes that bypass "
+        "the API such as seed_data or edits in the admin."
+    )
+
+    def handle(self, *args, **options):
+        entries = leaderboards.rebuild()
+        # bulk_create sends no signals; drop cached responses explicitly
+        bump('watchlist')
+        self.stdout.write(self.style.SUCCESS(f'{entries} leaderboard entries written.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from watchlist_app import aggregates
+from watchlist_app.api.cache import bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the rating histogram (reviews per rating, 1 to 10) of every title from "
+        "one grouped pass over the Review table, and rewrite the titles whose stored "
+        "histogram has drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of drifted titles repaired per transaction.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many titles have drifted.',
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+        total = aggregates.reconcile_histograms(batch_size=batch_size, dry_run=dry_run)
+
+        if total and not dry_run:
+            # Bulk UPDATEs send no signals; drop cached responses explicitly
+            bump('watchlist')
+
+        verb = 'have drifted' if dry_run else 'reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{total} histogram(s) {verb}.'))
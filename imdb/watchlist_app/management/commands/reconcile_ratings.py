@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from watchlist_app import aggregates
+from watchlist_app.api.cache import bump
+from watchlist_app.models import WatchList
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute number_of_reviews, rating_sum and average_rating from the Review "
+        "table for every title whose stored aggregates have drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Number of titles (by id range) repaired per UPDATE statement.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many titles have drifted.',
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        last_id = WatchList.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        total = 0
+        # Walk the table in id ranges so each UPDATE locks a bounded set of rows
+        for start in range(0, last_id, batch_size):
+            titles = WatchList.objects.filter(pk__gt=start, pk__lte=start + batch_size)
+            if dry_run:
+                total += aggregates.drifted(titles).count()
+                continue
+            with transaction.atomic():
+                total += aggregates.reconcile(titles)
+
+        if total and not dry_run:
+            # Bulk UPDATEs send no signals; drop cached responses explicitly
+            bump('watchlist')
+
+        verb = 'have drifted' if dry_run else 'reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{total} title(s) {verb}.'))
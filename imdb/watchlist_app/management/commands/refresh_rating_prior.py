@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from watchlist_app import aggregates, leaderboards
+from watchlist_app.api.cache import bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the prior of the weighted rating (C, the mean rating of all reviews, "
+        "and m, see WEIGHTED_RATING_MIN_REVIEWS) from the stored aggregates. If it moved, "
+        "rewrite every title's weighted rating in batches and rebuild the leaderboards, "
+        "which rank by it. Review writes keep weighted ratings current against the stored "
+        "prior, so this only needs to run periodically, e.g. nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20_000, help='Titles rewritten per statement.')
+        parser.add_argument('--force', action='store_true', help='Rewrite every title even if the prior is unchanged.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        prior, rewritten = aggregates.refresh_prior(options['batch_size'], force=options['force'])
+        self.stdout.write(f'Prior: {prior}')
+        if not rewritten:
+            self.stdout.write(self.style.SUCCESS('Prior unchanged; no titles rewritten.'))
+            return
+        entries = leaderboards.rebuild()
+        # Bulk updates send no signals; drop cached responses explicitly
+        bump('watchlist')
+        self.stdout.write(self.style.SUCCESS(
+            f'{rewritten} weighted ratings rewritten, {entries} leaderboard entries rebuilt.'
+        ))
@@ -0,0 +1,73 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from watchlist_app.jobs import Worker
+
+
+def work(options, stop, drain):
+    Worker(options['batch_size'], options['poll_interval'], stop).run(drain=drain)
+
+
+def work_in_process(options, drain):
+    # A forked child gets its own connections and handles SIGTERM by finishing its batch
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    work(options, stop, drain)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued jobs (see watchlist_app/jobs.py) in a pool of worker threads or "
+        "processes until interrupted. Threads suit jobs that mostly wait on the database; "
+        "processes sidestep the GIL for CPU-bound ones. SIGTERM or Ctrl-C lets every "
+        "worker finish its current batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of workers.')
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread', help='Kind of worker.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed by a worker at once.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds an idle worker waits before looking for jobs again.')
+        parser.add_argument('--drain', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive.')
+        drain = options['drain']
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+
+        if options['pool'] == 'process':
+            # Children must not inherit the parent's open connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            workers = [
+                context.Process(target=work_in_process, args=(options, drain), daemon=True)
+                for _ in range(options['workers'])
+            ]
+        else:
+            workers = [
+                threading.Thread(target=work, args=(options, stop, drain), daemon=True)
+                for _ in range(options['workers'])
+            ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} {options['pool']} worker(s) running.")
+
+        while any(worker.is_alive() for worker in workers):
+            if stop.wait(0.5):
+                break
+        if options['pool'] == 'process':
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()  # SIGTERM: finish the batch, then exit
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from watchlist_app.seeding import PASSWORD, USER_PREFIX, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with synthetic users, platforms, titles and "
+        "reviews: popular titles with many reviews, a long tail with few, and ratings "
+        "leaning towards good. Output is deterministic for a given --seed, and rows "
+        "already there count towards the totals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--platforms', type=int, default=20, help='Number of streaming platforms.')
+        parser.add_argument('--titles', type=int, default=100_000, help='Number of titles.')
+        parser.add_argument('--reviews', type=int, default=1_000_000, help='Number of reviews.')
+        parser.add_argument(
+            '--users', type=int, default=50_000,
+            help='Number of reviewers; also the most reviews a single title can get.',
+        )
+        parser.add_argument('--tokens', type=int, default=0, help='Give the first N seeded users an auth token.')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of reviews per title: 0 spreads them evenly, higher '
+                 'concentrates them on the most popular titles.',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+        parser.add_argument('--batch-size', type=int, default=20_000, help='Rows written per statement.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['skew'] < 0:
+            raise CommandError('--skew must not be negative.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        started = time.perf_counter()
+        written = seed_catalog(
+            options['platforms'], options['titles'], options['reviews'], options['users'],
+            seed=options['seed'], batch_size=options['batch_size'], skew=options['skew'],
+            tokens=options['tokens'],
+        )
+        seconds = time.perf_counter() - started
+        report = {
+            'written': written,
+            'seconds': round(seconds, 2),
+            'reviews_per_minute': round(written['reviews'] * 60 / max(seconds, 1e-6)),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for table, count in written.items():
+            self.stdout.write(f'{table:10} {count:>10}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {report['seconds']} s ({report['reviews_per_minute']} reviews per minute). "
+            f"Seeded users are {USER_PREFIX}0, {USER_PREFIX}1, ... with password '{PASSWORD}'."
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:56
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+
+def populate_rating_sum(apps, schema_editor):
+    WatchList = apps.get_model('watchlist_app', 'WatchList')
+    Review = apps.get_model('watchlist_app', 'Review')
+    reviews = Review.objects.filter(watchlist=OuterRef('pk')).order_by().values('watchlist')
+    WatchList.objects.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0),
+        number_of_reviews=Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), 0),
+        # The old code rounded at every step and missed edits and deletes
+        average_rating=Coalesce(
+            Round(Subquery(reviews.annotate(a=Avg('rating')).values('a')), 1), 0.0, output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist_app', '0007_watchlist_average_rating_watchlist_number_of_reviews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchlist',
+            name='rating_sum',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_sum, migrations.RunPython.noop),
+    ]
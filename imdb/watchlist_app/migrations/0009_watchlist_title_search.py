@@ -0,0 +1,73 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+FTS_TABLE = 'watchlist_app_watchlist_fts'
+TITLE_SEARCH_INDEX = 'watchlist_title_search_idx'
+TITLE_TRGM_INDEX = 'watchlist_title_trgm_idx'
+
+# SQLite fallback: an external-content FTS5 table over WatchList.title, kept
+# current by triggers on every insert, update and delete.
+SQLITE_FORWARDS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"title, content='watchlist_app_watchlist', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON watchlist_app_watchlist BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON watchlist_app_watchlist BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title ON watchlist_app_watchlist BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_BACKWARDS = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def search_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        # Must match watchlist_app.search.title_vector() for the planner to use it
+        GinIndex(SearchVector('title', config='english'), name=TITLE_SEARCH_INDEX),
+        GinIndex(fields=['title'], name=TITLE_TRGM_INDEX, opclasses=['gin_trgm_ops']),
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        WatchList = apps.get_model('watchlist_app', 'WatchList')
+        for index in search_indexes():
+            schema_editor.add_index(WatchList, index)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FORWARDS:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        WatchList = apps.get_model('watchlist_app', 'WatchList')
+        for index in search_indexes():
+            schema_editor.remove_index(WatchList, index)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_BACKWARDS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist_app', '0008_watchlist_rating_sum'),
+    ]
+
+    operations = [
+        # A no-op on databases other than PostgreSQL
+        TrigramExtension(),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+
+def remove_duplicate_reviews(apps, schema_editor):
+    """
+    Keep only each user's newest review of a title, so the unique constraint can
+    be added, and recompute the aggregates of the titles that lost reviews.
+    """
+    WatchList = apps.get_model('watchlist_app', 'WatchList')
+    Review = apps.get_model('watchlist_app', 'Review')
+    duplicates = (
+        Review.objects.filter(review_user__isnull=False)
+        .values('review_user', 'watchlist')
+        .annotate(count=Count('pk'), keep=Max('pk'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    titles = set()
+    for group in duplicates.iterator():
+        Review.objects.filter(
+            review_user=group['review_user'], watchlist=group['watchlist']
+        ).exclude(pk=group['keep']).delete()
+        titles.add(group['watchlist'])
+    if not titles:
+        return
+
+    reviews = Review.objects.filter(watchlist=OuterRef('pk')).order_by().values('watchlist')
+    WatchList.objects.filter(pk__in=titles).update(
+        number_of_reviews=Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0),
+        average_rating=Coalesce(
+            Round(Subquery(reviews.annotate(a=Avg('rating')).values('a')), 1),
+            0.0,
+            output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist_app', '0009_watchlist_title_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['watchlist', '-created_at', '-id'], name='review_watchlist_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['review_user', '-created_at', '-id'], name='review_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['-created_at', '-id'], name='watchlist_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['-average_rating', '-id'], name='watchlist_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(condition=models.Q(('active', True)), fields=['id'], name='watchlist_active_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_reviews, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(condition=models.Q(('review_user__isnull', False)), fields=('review_user', 'watchlist'), name='unique_review_per_user'),
+        ),
+    ]
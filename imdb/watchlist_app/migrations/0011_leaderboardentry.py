@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist_app', '0010_indexes_and_unique_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=32)),
+                ('average_rating', models.DecimalField(decimal_places=1, max_digits=3)),
+                ('number_of_reviews', models.PositiveIntegerField()),
+                ('watchlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='watchlist_app.watchlist')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', '-average_rating', '-number_of_reviews', 'watchlist'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('watchlist', 'board'), name='unique_leaderboard_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:07
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Round
+
+
+def populate_weighted_rating(apps, schema_editor):
+    # The same prior and formula as watchlist_app.aggregates, frozen here;
+    # WEIGHTED_RATING_MIN_REVIEWS fixes m there, so it does here too
+    WatchList = apps.get_model('watchlist_app', 'WatchList')
+    RatingPrior = apps.get_model('watchlist_app', 'RatingPrior')
+    LeaderboardEntry = apps.get_model('watchlist_app', 'LeaderboardEntry')
+    totals = WatchList.objects.aggregate(
+        rating_sum=Sum('rating_sum'),
+        reviews=Sum('number_of_reviews'),
+        reviewed=Count('pk', filter=Q(number_of_reviews__gt=0)),
+    )
+    if not totals['reviews']:
+        mean = min_reviews = 0.0
+    else:
+        mean = totals['rating_sum'] / totals['reviews']
+        min_reviews = getattr(settings, 'WEIGHTED_RATING_MIN_REVIEWS', None)
+        if min_reviews is None:
+            min_reviews = totals['reviews'] / totals['reviewed']
+        min_reviews = float(min_reviews)
+    RatingPrior.objects.update_or_create(pk=1, defaults={'mean': mean, 'min_reviews': min_reviews})
+    WatchList.objects.update(weighted_rating=Case(
+        When(number_of_reviews__gt=0, then=Round(
+            (Cast('rating_sum', FloatField()) + min_reviews * mean) / (F('number_of_reviews') + min_reviews), 4,
+        )),
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+    # Boards keep their members until the next rebuild_leaderboards
+    LeaderboardEntry.objects.update(weighted_rating=Subquery(
+        WatchList.objects.filter(pk=OuterRef('watchlist_id')).values('weighted_rating')
+    ))
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite adds a NOT NULL column by rebuilding the table, which drops the
+    # title search triggers of 0009; recreate them and resync the FTS table
+    if schema_editor.connection.vendor == 'sqlite':
+        title_search = import_module('watchlist_app.migrations.0009_watchlist_title_search')
+        for statement in title_search.SQLITE_BACKWARDS[:-1] + title_search.SQLITE_FORWARDS[1:]:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist_app', '0011_leaderboardentry'),
+    ]
+
+    operations = [
+        # Unapplying, the columns are removed by rebuilding the table too
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.CreateModel(
+            name='RatingPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(default=0.0)),
+                ('min_reviews', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='leaderboardentry',
+            name='leaderboard_rank_idx',
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='weighted_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='weighted_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['board', '-weighted_rating', '-number_of_reviews', 'watchlist'], name='leaderboard_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['-weighted_rating', '-id'], name='watchlist_weighted_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(populate_weighted_rating, migrations.RunPython.noop),
+    ]
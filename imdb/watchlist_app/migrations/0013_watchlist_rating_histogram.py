@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:11
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+weighted_rating = import_module('watchlist_app.migrations.0012_weighted_rating')
+
+
+def populate_histograms(apps, schema_editor):
+    WatchList = apps.get_model('watchlist_app', 'WatchList')
+    Review = apps.get_model('watchlist_app', 'Review')
+    reviews = Review.objects.filter(watchlist=OuterRef('pk')).order_by().values('watchlist')
+    WatchList.objects.update(**{
+        f'ratings_{rating}': Coalesce(
+            Subquery(reviews.filter(rating=rating).annotate(c=Count('pk')).values('c')), 0,
+        )
+        for rating in range(1, 11)
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist_app', '0012_weighted_rating'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, weighted_rating.restore_search_triggers),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_10',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_6',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_7',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_8',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='ratings_9',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(weighted_rating.restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(populate_histograms, migrations.RunPython.noop),
+    ]
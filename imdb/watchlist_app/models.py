@@ -2,6 +2,16 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 
+# Review ratings, and the WatchList columns counting the reviews with each one
+RATINGS = range(1, 11)
+
+
+def histogram_field(rating):
+    return f'ratings_{rating}'
+
+
+HISTOGRAM_FIELDS = tuple(histogram_field(rating) for rating in RATINGS)
+
 # Create your models here.
 class StreamingPlatform(models.Model):
     """
@@ -21,7 +31,20 @@ class WatchList(models.Model):
     release_date = models.DateField()
     active = models.BooleanField(default=True)
     number_of_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveBigIntegerField(default=0)  # Exact sum of review ratings; see aggregates.py
     average_rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    weighted_rating = models.FloatField(default=0.0)  # Average pulled towards RatingPrior; see aggregates.py
+    # Rating histogram: reviews rated 1, 2, ... 10; see aggregates.py
+    ratings_1 = models.PositiveIntegerField(default=0)
+    ratings_2 = models.PositiveIntegerField(default=0)
+    ratings_3 = models.PositiveIntegerField(default=0)
+    ratings_4 = models.PositiveIntegerField(default=0)
+    ratings_5 = models.PositiveIntegerField(default=0)
+    ratings_6 = models.PositiveIntegerField(default=0)
+    ratings_7 = models.PositiveIntegerField(default=0)
+    ratings_8 = models.PositiveIntegerField(default=0)
+    ratings_9 = models.PositiveIntegerField(default=0)
+    ratings_10 = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -29,7 +52,33 @@ class WatchList(models.Model):
 
     class Meta:
         ordering = ['-created_at']  # Order by creation date, newest first
-        
+        indexes = [
+            # Default listing and keyset pagination: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='watchlist_created_idx'),
+            # ?ordering=-average_rating on the search endpoint
+            models.Index(fields=['-average_rating', '-id'], name='watchlist_rating_idx'),
+            # ?ordering=-weighted_rating on the search endpoint
+            models.Index(fields=['-weighted_rating', '-id'], name='watchlist_weighted_idx'),
+            # Exports of active titles (?active=true), read in id order
+            models.Index(fields=['id'], condition=models.Q(active=True), name='watchlist_active_idx'),
+        ]
+
+
+class RatingPrior(models.Model):
+    """
+    The prior of the weighted rating: C, the mean rating of all reviews, and m,
+    the number of reviews at which a title's own average counts as much as C.
+    A single row, refreshed by `manage.py refresh_rating_prior`.
+    """
+    SINGLETON = 1
+
+    mean = models.FloatField(default=0.0)
+    min_reviews = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'C={self.mean:.3f}, m={self.min_reviews:.1f}'
+
 
 class Review(models.Model):
     """
@@ -42,4 +91,88 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'Review for {self.watchlist.title} - Rating: {self.rating}'
\ No newline at end of file
+        return f'Review for {self.watchlist.title} - Rating: {self.rating}'
+
+    class Meta:
+        indexes = [
+            # Reviews of a title, newest first (review list, recent-review prefetches)
+            models.Index(fields=['watchlist', '-created_at', '-id'], name='review_watchlist_created_idx'),
+            # Reviews by a user, newest first (?username= lookups)
+            models.Index(fields=['review_user', '-created_at', '-id'], name='review_user_created_idx'),
+        ]
+        constraints = [
+            # One review per user per title. Partial so that SQLite can add it
+            # without rebuilding the table; NULL users never conflict anyway.
+            models.UniqueConstraint(
+                fields=['review_user', 'watchlist'],
+                condition=models.Q(review_user__isnull=False),
+                name='unique_review_per_user',
+            ),
+        ]
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A title's place on one top-rated leaderboard, maintained by leaderboards.py.
+    `board` is 'all', 'platform:<id>' or 'year:<year>'; the rating columns are
+    copies of the title's aggregates, so a board is read without the catalog.
+    """
+    board = models.CharField(max_length=32)
+    watchlist = models.ForeignKey(WatchList, related_name='leaderboard_entries', on_delete=models.CASCADE)
+    average_rating = models.DecimalField(max_digits=3, decimal_places=1)
+    weighted_rating = models.FloatField(default=0.0)
+    number_of_reviews = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'{self.board}: {self.watchlist_id}'
+
+    class Meta:
+        indexes = [
+            # A board in rank order: the leaderboard endpoint and trimming
+            models.Index(
+                fields=['board', '-weighted_rating', '-number_of_reviews', 'watchlist'],
+                name='leaderboard_rank_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['watchlist', 'board'], name='unique_leaderboard_entry'),
+        ]
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, queued by jobs.enqueue() and run by
+    `manage.py run_jobs`. Finished jobs are deleted; failed ones are kept with
+    their last traceback.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    # Queued jobs with the same key collapse into one
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # The claim that is running the job (see jobs.claim)
+    claim = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+    class Meta:
+        indexes = [
+            # Due jobs in the order workers claim them
+            models.Index(fields=['run_after', 'id'], condition=models.Q(status='queued'), name='job_due_idx'),
+            # Running jobs, for claims and lost-worker recovery
+            models.Index(fields=['claim'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedup_key'], condition=models.Q(status='queued'), name='job_queued_dedup_uniq'),
+        ]
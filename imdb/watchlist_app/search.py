@@ -0,0 +1,141 @@
+"""
+Indexed, relevance-ranked title search.
+
+On PostgreSQL titles are matched with a full-text `SearchVector` (backed by a
+GIN expression index) OR'ed with trigram similarity (backed by a `gin_trgm_ops`
+index), so typos still find their title. Elsewhere, SQLite's FTS5 virtual table
+with the trigram tokenizer is used: its rows are kept current by triggers,
+words are matched as indexed substrings, and a term with no match is retried
+as an OR of its trigrams ranked by bm25, which approximates trigram similarity.
+Both paths annotate each matching title with a `rank` where higher is more
+relevant, as a double so that a cursor holding it matches the row it came from.
+
+The indexes, the FTS table and its triggers are created by migration 0009.
+"""
+import json
+
+from django.db import connection
+from django.db.models import CharField, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, Concat
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'watchlist_app_watchlist_fts'
+# SQLite fallback: how many rows of the FTS index to consider per page; must
+# exceed the largest page size
+FTS_MAX_CANDIDATES = 200
+
+
+def search_titles(queryset, term, extra=None, after=None, reverse=False):
+    """
+    Filter `queryset` to titles matching `term` and annotate their `rank`.
+    `extra` is an optional Q that also counts as a match (with rank 0).
+
+    `after` is the `(rank, id)` a page ordered by ('-rank', '-id') starts after
+    (before, with `reverse`). The SQLite path only reads the FTS rows that
+    follow it, so pages go on past FTS_MAX_CANDIDATES matches.
+    """
+    term = term.strip()
+    if not term:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(queryset, term, extra)
+    return _search_fts5(queryset, term, extra, after, reverse)
+
+
+def title_vector():
+    # Must stay identical to the indexed expression in migration 0009
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('title', config=SEARCH_CONFIG)
+
+
+def _search_postgresql(queryset, term, extra):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+    vector = title_vector()
+    matches = Q(title_search=query) | Q(title__trigram_similar=term)
+    if extra is not None:
+        matches |= extra
+    return queryset.annotate(
+        title_search=vector,
+        # Both functions return real; as float4 the rank would never equal the
+        # double a cursor stores, and pages would repeat or skip their boundary row
+        rank=Cast(SearchRank(vector, query) + TrigramSimilarity('title', term), FloatField()),
+    ).filter(matches)
+
+
+def _fts5_queries(term):
+    """
+    Return the strict FTS5 query (every word as a substring) and the fuzzy one
+    (any trigram of the term), where titles sharing more trigrams with the term,
+    misspellings included, rank higher.
+    """
+    words = term.lower().split()
+    text = ' '.join(words)
+    trigrams = dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2))
+    quote = '"{}"'.format
+    strict = ' AND '.join(quote(word.replace('"', '""')) for word in words)
+    fuzzy = ' OR '.join(quote(t.replace('"', '""')) for t in trigrams)
+    return strict, fuzzy
+
+
+def _fts5_matches(query):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT 1', [query])
+        return cursor.fetchone() is not None
+
+
+def _fts5_ranked(query, after=None, reverse=False):
+    """
+    Return up to FTS_MAX_CANDIDATES `(rowid, score)` matches of `query` in the
+    order a search pages through them, starting after the `(score, rowid)` in
+    `after`, or before it with `reverse`.
+    """
+    seek, params = '', [query]
+    if after is not None:
+        seek = 'WHERE score {0} %s OR (score = %s AND rowid {0} %s)'.format('>' if reverse else '<')
+        params += [after[0], after[0], after[1]]
+    order = 'ASC' if reverse else 'DESC'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, score FROM ('
+            f'SELECT rowid, -bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+            f') {seek} ORDER BY score {order}, rowid {order} LIMIT %s',
+            params + [FTS_MAX_CANDIDATES],
+        )
+        return cursor.fetchall()
+
+
+def _search_fts5(queryset, term, extra, after=None, reverse=False):
+    strict, fuzzy = _fts5_queries(term)
+    if not fuzzy or any(len(word) < 3 for word in term.split()):
+        # Words shorter than one trigram cannot be looked up in the index
+        matches = Q(title__icontains=term)
+        if extra is not None:
+            matches |= extra
+        return queryset.filter(matches).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    # Exact substring matches first; only a term with no hits is treated as a typo
+    query = strict if _fts5_matches(strict) else fuzzy
+    ranked = _fts5_ranked(query, after, reverse)
+
+    matches = Q(pk__in=[pk for pk, _ in ranked])
+    if extra is not None:
+        # Titles the index matches take their score from it, on the page it falls on
+        indexed = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query])
+        matches |= extra & ~Q(pk__in=indexed)
+    # Look each row's score up in a JSON object of {id: score} passed as a single
+    # parameter, rather than compiling a CASE branch per candidate
+    scores = json.dumps({str(pk): score for pk, score in ranked})
+    return queryset.filter(matches).annotate(
+        rank=Coalesce(
+            Func(
+                Value(scores),
+                Concat(Value('$."'), Cast('pk', CharField()), Value('"')),
+                function='json_extract',
+                output_field=FloatField(),
+            ),
+            Value(0.0),
+        )
+    )
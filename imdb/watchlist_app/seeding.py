@@ -0,0 +1,288 @@
+"""
+Synthetic platforms, titles, users and reviews for benchmarks and local data.
+
+The distributions are skewed the way real catalogs are:
+
+* title words come from a made-up vocabulary with a Zipf-like skew, so title
+  search behaves like it does on real catalogs;
+* reviews per title follow a Zipf law (exponent `skew`) over a shuffled
+  popularity order: a few titles get most of the reviews, most get a handful;
+* each title has a quality drawn from a beta distribution leaning towards good,
+  and its ratings scatter around it, so averages cluster around 7 with a long
+  tail of poorly rated titles.
+
+Every value comes from random generators seeded with `seed`, and timestamps
+are spread over a fixed window, so the same arguments write the same rows.
+
+Titles and reviews skip model instances: rows are built as tuples with their ids
+assigned up front (reserved from the sequence on PostgreSQL) and written with
+COPY on PostgreSQL and a batched executemany elsewhere. Each title's reviews are
+generated together with the title, which lets its `number_of_reviews`,
+`rating_sum`, `average_rating` and rating histogram be written in the same pass. Weighted ratings
+depend on the whole catalog, so they are filled in by `refresh_prior()` once
+the titles are written.
+"""
+import io
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+from rest_framework.authtoken.models import Token
+
+from watchlist_app import aggregates
+from watchlist_app.models import HISTOGRAM_FIELDS, RATINGS, Review, StreamingPlatform, WatchList
+
+SYLLABLES = (
+    'ka ri to na me so lu vi de ra mo ne ta shi zu ro ga be li an el or '
+    'ix on ar us et im ul ov ad'
+).split()
+
+USER_PREFIX = 'seed'
+PASSWORD = 'seedpassword'
+
+# Titles are created evenly over this window, reviews between their title and its end
+EPOCH = datetime(2015, 1, 1, tzinfo=timezone.utc)
+WINDOW = timedelta(days=10 * 365)
+
+REVIEW_TEXT = (
+    None,
+    'Unwatchable.', 'Awful.', 'Very weak.', 'Not for me.', 'Mixed feelings.',
+    'Decent enough.', 'Good fun.', 'Really good.', 'Excellent.', 'A masterpiece.',
+)
+
+TITLE_COLUMNS = (
+    'id', 'title', 'description', 'platform_id', 'release_date', 'active',
+    'number_of_reviews', 'rating_sum', 'average_rating', 'weighted_rating', *HISTOGRAM_FIELDS, 'created_at',
+)
+REVIEW_COLUMNS = ('review_user_id', 'watchlist_id', 'review_text', 'rating', 'created_at')
+USER_COLUMNS = (
+    'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email',
+    'is_staff', 'is_active', 'date_joined',
+)
+
+
+def vocabulary(rng, size=20000):
+    """
+    Pronounceable made-up words; titles draw from them with a Zipf-like skew.
+    """
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def average(rating_sum, count):
+    # Same rounding as the SQL in watchlist_app.aggregates (half away from zero)
+    if not count:
+        return Decimal('0.0')
+    return (Decimal(rating_sum) / count).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+
+
+def review_counts(rng, titles, reviews, cap, skew=1.0):
+    """
+    Split `reviews` over `titles` in proportion to 1/rank**skew, ranks being a
+    random permutation, with no title above `cap` (one review per user).
+    A skew of 0 spreads the reviews evenly.
+    """
+    by_popularity = list(range(titles))
+    rng.shuffle(by_popularity)
+    weights = [1 / (rank + 1) ** skew for rank in range(titles)]
+    remaining, remaining_weight = min(reviews, titles * cap), sum(weights)
+    counts = [0] * titles
+    # Most popular first: a capped title hands its excess to the ones after it
+    for rank, title in enumerate(by_popularity):
+        share = remaining if rank == titles - 1 else round(remaining * weights[rank] / remaining_weight)
+        counts[title] = min(cap, share, remaining)
+        remaining -= counts[title]
+        remaining_weight -= weights[rank]
+    return counts
+
+
+def seed_catalog(platforms, titles, reviews, users, seed=0, batch_size=20000, skew=1.0, tokens=0):
+    """
+    Add up to the given numbers of rows, skipping tables that already have
+    enough (so a kept scratch database is reused), and give the first `tokens`
+    seeded users an auth token. Returns the number of rows written per table.
+    """
+    written = dict.fromkeys(('users', 'tokens', 'platforms', 'titles', 'reviews'), 0)
+    to_datetime = datetime_converter()
+    existing_users = User.objects.filter(username__startswith=USER_PREFIX).count()
+    if existing_users < users:
+        password, joined = make_password(PASSWORD), to_datetime(EPOCH.timestamp())
+        rows = [
+            (user_id, password, False, f'{USER_PREFIX}{i}', '', '', f'{USER_PREFIX}{i}@example.com',
+             False, True, joined)
+            for i, user_id in zip(range(existing_users, users), reserve_ids(User, users - existing_users))
+        ]
+        for start in range(0, len(rows), batch_size):
+            with transaction.atomic():
+                write_rows(User, USER_COLUMNS, rows[start:start + batch_size])
+        written['users'] = len(rows)
+    user_ids = list(
+        User.objects.filter(username__startswith=USER_PREFIX).order_by('pk').values_list('pk', flat=True)
+    )
+    written['tokens'] = seed_tokens(random.Random(f'{seed}:tokens'), user_ids[:tokens])
+
+    written['platforms'] = len(StreamingPlatform.objects.bulk_create([
+        StreamingPlatform(name=f'Platform {i}', website=f'https://platform{i}.example.com')
+        for i in range(StreamingPlatform.objects.count(), platforms)
+    ]))
+    platform_ids = list(StreamingPlatform.objects.order_by('pk').values_list('pk', flat=True))
+
+    existing_titles = WatchList.objects.count()
+    if existing_titles < titles and user_ids:
+        with large_page_cache():
+            written['titles'], written['reviews'] = seed_titles(
+                random.Random(f'{seed}:catalog'), existing_titles, titles, reviews, user_ids, platform_ids,
+                batch_size, skew, to_datetime,
+            )
+        aggregates.refresh_prior(batch_size, force=True)
+    return written
+
+
+def seed_titles(rng, existing_titles, titles, reviews, user_ids, platform_ids, batch_size, skew, to_datetime):
+    """
+    Write titles `existing_titles` to `titles` of the catalog together with
+    their reviews. Returns the numbers of titles and reviews written.
+    """
+    words = vocabulary(rng)
+    cum_weights = list(accumulate(1 / (i + 1) for i in range(len(words))))
+    counts = review_counts(rng, titles, reviews, len(user_ids), skew)
+    start_seconds, span = EPOCH.timestamp(), WINDOW.total_seconds()
+    end_seconds = start_seconds + span
+    title_ids = iter(reserve_ids(WatchList, titles - existing_titles))
+
+    written_titles = written_reviews = 0
+    batch, batch_reviews = [], []
+    for n in range(existing_titles, titles):
+        count = counts[n]
+        title_id = next(title_ids)
+        created = start_seconds + span * (n + rng.random()) / titles
+        # Quality leans towards good, with a long tail of bad titles
+        quality = 1 + 9 * rng.betavariate(5, 2)
+        ratings = [min(10, max(1, round(rng.gauss(quality, 1.5)))) for _ in range(count)]
+        for user_id, rating in zip(rng.sample(user_ids, count), ratings):
+            batch_reviews.append((
+                user_id, title_id, REVIEW_TEXT[rating], rating,
+                to_datetime(created + (end_seconds - created) * rng.random()),
+            ))
+        rating_sum = sum(ratings)
+        batch.append((
+            title_id,
+            ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))).title(),
+            'Seeded for benchmarks.',
+            rng.choice(platform_ids) if platform_ids else None,
+            date(1950 + rng.randrange(75), rng.randint(1, 12), 1).isoformat(),
+            rng.random() < 0.95,
+            count,
+            rating_sum,
+            str(average(rating_sum, count)),
+            0.0,
+            *(ratings.count(rating) for rating in RATINGS),
+            to_datetime(created),
+        ))
+        if len(batch) >= batch_size or len(batch_reviews) >= batch_size or n == titles - 1:
+            # A title and its reviews land together, so aggregates never drift
+            with transaction.atomic():
+                write_rows(WatchList, TITLE_COLUMNS, batch)
+                write_rows(Review, REVIEW_COLUMNS, batch_reviews)
+            written_titles += len(batch)
+            written_reviews += len(batch_reviews)
+            batch, batch_reviews = [], []
+    return written_titles, written_reviews
+
+
+def seed_tokens(rng, user_ids):
+    """
+    Give each of the users that has none an auth token, with keys drawn from `rng`.
+    """
+    with_token = set(Token.objects.filter(user__in=user_ids).values_list('user_id', flat=True))
+    return len(Token.objects.bulk_create([
+        Token(key='%040x' % rng.getrandbits(160), user_id=user_id)
+        for user_id in user_ids if user_id not in with_token
+    ]))
+
+
+@contextmanager
+def large_page_cache(kib=256 * 1024):
+    """
+    On SQLite, give the connection a large page cache while loading, so the
+    reviewer indexes, updated in random order, stay in memory.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA cache_size')
+        previous = cursor.fetchone()[0]
+        cursor.execute(f'PRAGMA cache_size = -{int(kib)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = {int(previous)}')
+
+
+def datetime_converter():
+    """
+    A function turning a UTC timestamp into the value the backend stores: what
+    connection.ops.adapt_datetimefield_value returns, without its per-call cost.
+    """
+    if connection.features.supports_timezones:
+        return lambda seconds: datetime.fromtimestamp(seconds, timezone.utc)
+    # Naive UTC text, like Django writes with USE_TZ = True
+    return lambda seconds: str(datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None))
+
+
+def reserve_ids(model, count):
+    """
+    Primary keys for `count` new rows: taken from the sequence on PostgreSQL,
+    following the current maximum elsewhere.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [model._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    start = (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+    return range(start, start + count)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def write_rows(model, columns, rows):
+    """
+    Insert `rows` (tuples in `columns` order) into the model's table: COPY on
+    PostgreSQL, one executemany elsewhere.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    names = ', '.join(quote(column) for column in columns)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sql = f'COPY {table} ({names}) FROM STDIN'
+            data = ''.join('\t'.join(map(_copy_value, row)) + '\n' for row in rows)
+            if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+                cursor.copy_expert(sql, io.StringIO(data))
+            else:  # psycopg 3
+                with cursor.copy(sql) as copy:
+                    copy.write(data)
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({placeholders})', rows)
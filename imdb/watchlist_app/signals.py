@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from watchlist_app.api.cache import bump
+from watchlist_app.models import Review, StreamingPlatform, WatchList
+
+CACHED_RESOURCES = {
+    WatchList: 'watchlist',
+    Review: 'review',
+    StreamingPlatform: 'platform',
+}
+
+
+@receiver(post_save, sender=WatchList)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=StreamingPlatform)
+@receiver(post_delete, sender=WatchList)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=StreamingPlatform)
+def invalidate_cached_responses(sender, **kwargs):
+    """
+    Bump the resource's cache generation so no stale response is served.
+    """
+    resource = CACHED_RESOURCES[sender]
+    bump(resource)
+    # Bump again once the write is visible: a response cached between the two
+    # bumps may have read the old rows
+    transaction.on_commit(lambda: bump(resource), using=kwargs.get('using'))
@@ -0,0 +1,56 @@
+"""
+Work deferred from the request to the job queue (see jobs.py), and the helpers
+views call to queue it. Each job is per title or per board, with a dedup key,
+so a burst of writes to one title is caught up with by a single run.
+"""
+from django.db import transaction
+
+from watchlist_app import aggregates, jobs, leaderboards
+from watchlist_app.api.cache import bump
+from watchlist_app.models import WatchList
+
+
+def refreshed_titles():
+    # Job writes are bulk UPDATEs that send no signals
+    transaction.on_commit(lambda: bump('watchlist'))
+
+
+@jobs.task('titles.recompute')
+def recompute_titles(watchlist_ids):
+    """
+    Recount the rating aggregates of these titles from their reviews, then
+    re-place them on the leaderboards.
+    """
+    aggregates.reconcile(WatchList.objects.filter(pk__in=watchlist_ids))
+    leaderboards.titles_changed(watchlist_ids)
+    refreshed_titles()
+
+
+@jobs.task('leaderboards.titles_changed')
+def place_titles(watchlist_ids):
+    leaderboards.titles_changed(watchlist_ids)
+    refreshed_titles()
+
+
+@jobs.task('leaderboards.refill')
+def refill_boards(boards):
+    leaderboards.refill(boards)
+    refreshed_titles()
+
+
+def defer_recompute(watchlist_ids):
+    jobs.enqueue_many('titles.recompute', [
+        ({'watchlist_ids': [pk]}, f'titles.recompute:{pk}') for pk in sorted(watchlist_ids)
+    ])
+
+
+def defer_placement(watchlist_ids):
+    jobs.enqueue_many('leaderboards.titles_changed', [
+        ({'watchlist_ids': [pk]}, f'leaderboards.titles_changed:{pk}') for pk in sorted(watchlist_ids)
+    ])
+
+
+def defer_refill(boards):
+    jobs.enqueue_many('leaderboards.refill', [
+        ({'boards': [board]}, f'leaderboards.refill:{board}') for board in sorted(boards)
+    ])
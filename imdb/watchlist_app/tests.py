@@ -1,7 +1,1541 @@
-from django.test import TestCase
+import csv
+import json
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from django.test import TransactionTestCase
+from rest_framework.views import APIView
+
+from imdb import metrics
+from imdb.db_pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+from imdb.db_router import ReplicaSelector, selector
+from watchlist_app import aggregates, jobs, leaderboards
+from watchlist_app.api import cache as response_cache
+from watchlist_app.api.throttle_stores import SQLiteThrottleStore, get_store
+from watchlist_app.api.throttling import SharedScopedRateThrottle
+from watchlist_app.management.commands.bench_api import compare
+from watchlist_app.models import Job, LeaderboardEntry, RatingPrior, Review, StreamingPlatform, WatchList
+from watchlist_app.seeding import seed_catalog
 
 # Create your tests here.
 
 
+class QueryBudgetTestCase(APITestCase):
+    """
+    Base class that builds a small catalog and measures the SQL issued per request.
+    """
+
+    def setUp(self):
+        # Start every test with empty response caches and throttle state
+        cache.clear()
+        get_store().clear()
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'adminpassword', is_staff=True)
+        self.admin_token = Token.objects.create(user=self.admin)
+        self.users = [
+            User.objects.create_user(f'user{i}', f'user{i}@example.com', 'userpassword')
+            for i in range(3)
+        ]
+        self.user_token = Token.objects.create(user=self.users[0])
+
+    def make_catalog(self, platforms=2, titles_per_platform=2, reviews_per_title=2):
+        # One review per user per title, so make sure there are enough reviewers
+        while len(self.users) < reviews_per_title:
+            i = len(self.users)
+            self.users.append(User.objects.create_user(f'user{i}', f'user{i}@example.com', 'userpassword'))
+        for p in range(StreamingPlatform.objects.count(), StreamingPlatform.objects.count() + platforms):
+            platform = StreamingPlatform.objects.create(name=f'Platform {p}', website='https://example.com')
+            for t in range(titles_per_platform):
+                movie = WatchList.objects.create(
+                    title=f'Title {p}-{t}',
+                    description='A description long enough to validate.',
+                    platform=platform,
+                    release_date=date(2020, 1, 1),
+                )
+                for r in range(reviews_per_title):
+                    Review.objects.create(
+                        review_user=self.users[r % len(self.users)],
+                        watchlist=movie,
+                        review_text='Worth watching.',
+                        rating=7,
+                    )
+        # Reviews were inserted directly; bring the denormalized aggregates in line
+        aggregates.reconcile()
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def request(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, len(ctx.captured_queries)
+
+    def assertQueryBudget(self, budget, method, url, data=None):
+        response, queries = self.request(method, url, data)
+        self.assertLessEqual(
+            queries, budget,
+            f'{method.upper()} {url} ran {queries} queries, budget is {budget}',
+        )
+        return response
+
+    def assertConstantQueries(self, method, url, budget):
+        """
+        The query count must stay within budget and must not grow with catalog size.
+        """
+        self.make_catalog()
+        response, small = self.request(method, url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.make_catalog(platforms=3, titles_per_platform=4, reviews_per_title=3)
+        cache.clear()
+        response, large = self.request(method, url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(large, budget, f'GET {url} ran {large} queries, budget is {budget}')
+        self.assertEqual(small, large, f'GET {url} query count grows with catalog size')
+        return response
+
+
+class WatchListQueryBudgetTests(QueryBudgetTestCase):
+    def test_movie_list(self):
+        response = self.assertConstantQueries('get', reverse('movie-list'), budget=2)
+        self.assertEqual(len(response.data['results']), WatchList.objects.count())
+
+    def test_movie_create(self):
+        self.authenticate(self.admin_token)
+        data = {
+            'title': 'New Title',
+            'description': 'A description long enough to validate.',
+            'release_date': '2020-01-01',
+            'active': True,
+        }
+        response = self.assertQueryBudget(3, 'post', reverse('movie-list'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_movie_detail(self):
+        self.make_catalog(reviews_per_title=5)
+        movie = WatchList.objects.first()
+        url = reverse('movie-detail', args=[movie.pk]) + '?expand=reviews'
+        response = self.assertQueryBudget(2, 'get', url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['reviews']), 5)
+
+    def test_movie_update(self):
+        self.make_catalog()
+        movie = WatchList.objects.first()
+        data = {
+            'title': 'Renamed',
+            'description': 'A description long enough to validate.',
+            'release_date': '2020-01-01',
+            'active': False,
+        }
+        # Deactivating the title also takes it off the leaderboards (2 queries)
+        response = self.assertQueryBudget(5, 'put', reverse('movie-detail', args=[movie.pk]), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_movie_delete(self):
+        self.make_catalog()
+        movie = WatchList.objects.first()
+        response = self.assertQueryBudget(6, 'delete', reverse('movie-detail', args=[movie.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_search(self):
+        # On SQLite the FTS5 lookup is one extra query
+        self.assertConstantQueries('get', reverse('search-list') + '?search=Title', budget=3)
+
+
+class StreamingPlatformQueryBudgetTests(QueryBudgetTestCase):
+    def test_platform_list(self):
+        response = self.assertConstantQueries('get', reverse('streaming-platform-list'), budget=3)
+        self.assertEqual(len(response.data['results']), StreamingPlatform.objects.count())
+
+    def test_platform_create(self):
+        self.authenticate(self.admin_token)
+        data = {'name': 'New Platform', 'website': 'https://example.com'}
+        response = self.assertQueryBudget(4, 'post', reverse('streaming-platform-list'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_platform_detail(self):
+        self.make_catalog(titles_per_platform=4)
+        platform = StreamingPlatform.objects.first()
+        url = reverse('streaming-platform-detail', args=[platform.pk]) + '?expand=watchlist.reviews'
+        response = self.assertQueryBudget(3, 'get', url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['watchlist']), 4)
+
+    def test_platform_update(self):
+        self.make_catalog()
+        platform = StreamingPlatform.objects.first()
+        self.authenticate(self.admin_token)
+        data = {'name': 'Renamed Platform', 'website': 'https://example.com'}
+        response = self.assertQueryBudget(
+            6, 'put', reverse('streaming-platform-detail', args=[platform.pk]), data
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_platform_delete(self):
+        self.make_catalog()
+        platform = StreamingPlatform.objects.first()
+        self.authenticate(self.admin_token)
+        response = self.assertQueryBudget(
+            9, 'delete', reverse('streaming-platform-detail', args=[platform.pk])
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class ReviewQueryBudgetTests(QueryBudgetTestCase):
+    def test_review_list(self):
+        self.make_catalog(reviews_per_title=3)
+        movie = WatchList.objects.first()
+        response = self.assertQueryBudget(1, 'get', reverse('review-list', args=[movie.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_review_create(self):
+        self.make_catalog(reviews_per_title=0)
+        movie = WatchList.objects.first()
+        self.authenticate(self.user_token)
+        data = {'review_text': 'Great.', 'rating': 9}
+        # Savepoint statements of the atomic block are counted too, and the title
+        # joins its leaderboards (read title and entries, upsert, trim)
+        response = self.assertQueryBudget(10, 'post', reverse('review-create', args=[movie.pk]), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_duplicate_review_rejected_by_constraint(self):
+        self.make_catalog(reviews_per_title=1)
+        movie = WatchList.objects.first()
+        self.authenticate(self.user_token)
+        data = {'review_text': 'Again.', 'rating': 3}
+        response = self.client.post(reverse('review-create', args=[movie.pk]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, ['You have already reviewed this movie.'])
+        movie.refresh_from_db()
+        self.assertEqual((movie.number_of_reviews, movie.rating_sum), (1, 7))
+
+    def test_other_integrity_errors_are_not_reported_as_duplicates(self):
+        self.make_catalog(reviews_per_title=0)
+        movie = WatchList.objects.first()
+        self.authenticate(self.user_token)
+        data = {'review_text': 'Broken.', 'rating': 3}
+        error = IntegrityError('CHECK constraint failed: other')
+        with mock.patch.object(aggregates, 'review_created', side_effect=error):
+            with self.assertRaises(IntegrityError):
+                self.client.post(reverse('review-create', args=[movie.pk]), data, format='json')
+        self.assertFalse(Review.objects.exists())
+
+    def test_review_detail(self):
+        self.make_catalog()
+        review = Review.objects.first()
+        response = self.assertQueryBudget(1, 'get', reverse('review-detail', args=[review.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_review_update(self):
+        self.make_catalog()
+        review = Review.objects.filter(review_user=self.users[0]).first()
+        self.authenticate(self.user_token)
+        data = {'review_text': 'Changed my mind.', 'rating': 4}
+        response = self.assertQueryBudget(11, 'put', reverse('review-detail', args=[review.pk]), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_review_delete(self):
+        self.make_catalog()
+        review = Review.objects.filter(review_user=self.users[0]).first()
+        self.authenticate(self.user_token)
+        response = self.assertQueryBudget(11, 'delete', reverse('review-detail', args=[review.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_user_reviews(self):
+        self.assertConstantQueries('get', reverse('user-reviews') + '?username=user0', budget=2)
+
+
+class KeysetPaginationTests(QueryBudgetTestCase):
+    def walk(self, url):
+        """
+        Follow `next` links and return the ids seen plus every SQL statement issued.
+        """
+        ids, statements = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            statements += [query['sql'] for query in ctx.captured_queries]
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        return ids, statements
+
+    def test_pages_cover_catalog_in_order_without_count_or_offset(self):
+        self.make_catalog(platforms=3, titles_per_platform=3, reviews_per_title=0)
+        ids, statements = self.walk(reverse('movie-list') + '?page_size=2')
+        expected = list(WatchList.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        for sql in statements:
+            self.assertNotIn('COUNT(', sql.upper())
+            self.assertNotIn('OFFSET', sql.upper())
+
+    def test_page_size_is_capped(self):
+        self.make_catalog(platforms=1, titles_per_platform=3, reviews_per_title=0)
+        response = self.client.get(reverse('movie-list') + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_is_stable_across_inserts(self):
+        self.make_catalog(platforms=1, titles_per_platform=4, reviews_per_title=0)
+        first = self.client.get(reverse('movie-list') + '?page_size=2')
+        # A title inserted after page one must not shift the rows of page two
+        self.make_catalog(platforms=1, titles_per_platform=1, reviews_per_title=0)
+        second = self.client.get(first.data['next'])
+        expected = list(WatchList.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([item['id'] for item in second.data['results']], expected[3:5])
+
+    def test_previous_link_returns_to_prior_page(self):
+        self.make_catalog(platforms=1, titles_per_platform=5, reviews_per_title=0)
+        first = self.client.get(reverse('movie-list') + '?page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_ordering_filter_is_used_as_keyset(self):
+        self.make_catalog(platforms=2, titles_per_platform=3, reviews_per_title=0)
+        for rating, movie in enumerate(WatchList.objects.all()):
+            WatchList.objects.filter(pk=movie.pk).update(average_rating=rating % 3)
+        ids, _ = self.walk(reverse('search-list') + '?ordering=-average_rating&page_size=4')
+        expected = list(WatchList.objects.order_by('-average_rating', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('movie-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_review_pages(self):
+        self.make_catalog(platforms=1, titles_per_platform=1, reviews_per_title=3)
+        movie = WatchList.objects.get()
+        ids, _ = self.walk(reverse('review-list', args=[movie.pk]) + '?page_size=1')
+        self.assertEqual(ids, list(movie.reviews.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+
+class RatingAggregateTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog(platforms=1, titles_per_platform=1, reviews_per_title=0)
+        self.movie = WatchList.objects.get()
+
+    def post_review(self, user, rating):
+        self.authenticate(Token.objects.get_or_create(user=user)[0])
+        return self.client.post(
+            reverse('review-create', args=[self.movie.pk]),
+            {'review_text': 'Noted.', 'rating': rating},
+            format='json',
+        )
+
+    def assertAggregates(self, count, total, average):
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.number_of_reviews, count)
+        self.assertEqual(self.movie.rating_sum, total)
+        self.assertEqual(float(self.movie.average_rating), average)
+
+    def test_create_update_delete(self):
+        self.post_review(self.users[0], 8)
+        self.post_review(self.users[1], 5)
+        self.assertAggregates(2, 13, 6.5)
+
+        review = Review.objects.get(review_user=self.users[1])
+        self.authenticate(Token.objects.get(user=self.users[1]))
+        response = self.client.put(
+            reverse('review-detail', args=[review.pk]),
+            {'review_text': 'Better on rewatch.', 'rating': 9},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAggregates(2, 17, 8.5)
+
+        response = self.client.delete(reverse('review-detail', args=[review.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertAggregates(1, 8, 8.0)
+
+        self.authenticate(Token.objects.get(user=self.users[0]))
+        self.client.delete(reverse('review-detail', args=[Review.objects.get().pk]))
+        self.assertAggregates(0, 0, 0.0)
+
+    def test_average_is_rounded(self):
+        for user, rating in zip(self.users, (7, 7, 8)):
+            self.post_review(user, rating)
+        self.assertAggregates(3, 22, 7.3)
+
+    def test_create_writes_only_aggregate_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.post_review(self.users[0], 6)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"title"', updates[0])
+
+    def test_reconcile_command(self):
+        Review.objects.create(review_user=self.users[0], watchlist=self.movie, review_text='x', rating=4)
+        Review.objects.create(review_user=self.users[1], watchlist=self.movie, review_text='y', rating=9)
+        out = StringIO()
+        call_command('reconcile_ratings', '--dry-run', stdout=out)
+        self.assertIn('1 title(s) have drifted', out.getvalue())
+        call_command('reconcile_ratings', stdout=out)
+        self.assertAggregates(2, 13, 6.5)
+        out = StringIO()
+        call_command('reconcile_ratings', stdout=out)
+        self.assertIn('0 title(s) reconciled', out.getvalue())
+
+    def test_rating_sum_migration_recomputes_the_average(self):
+        migration = import_module('watchlist_app.migrations.0008_watchlist_rating_sum')
+        other = WatchList.objects.create(title='Unreviewed', description='A description long enough to validate.',
+                                         release_date=date(2020, 1, 1))
+        Review.objects.create(review_user=self.users[0], watchlist=self.movie, review_text='x', rating=7)
+        Review.objects.create(review_user=self.users[1], watchlist=self.movie, review_text='y', rating=8)
+        # As the old code could leave them: rounded at every step, stale after deletes
+        WatchList.objects.filter(pk=self.movie.pk).update(average_rating=8.0)
+        WatchList.objects.filter(pk=other.pk).update(average_rating=8.0, number_of_reviews=1)
+        migration.populate_rating_sum(apps, None)
+        self.assertAggregates(2, 15, 7.5)
+        other.refresh_from_db()
+        self.assertEqual((other.number_of_reviews, float(other.average_rating)), (0, 0.0))
+
+    def assertHistogram(self, **counts):
+        expected = {str(rating): counts.get(f'r{rating}', 0) for rating in range(1, 11)}
+        self.client.credentials()
+        response = self.assertQueryBudget(1, 'get', reverse('rating-histogram', args=[self.movie.pk]))
+        self.assertEqual(response.data['histogram'], expected)
+        self.assertEqual(response.data['number_of_reviews'], sum(counts.values()))
+        return expected
+
+    def test_histogram_follows_reviews(self):
+        self.post_review(self.users[0], 8)
+        self.post_review(self.users[1], 8)
+        self.post_review(self.users[2], 3)
+        self.assertHistogram(r3=1, r8=2)
+
+        self.authenticate(Token.objects.get(user=self.users[2]))
+        self.client.put(reverse('review-detail', args=[Review.objects.get(review_user=self.users[2]).pk]),
+                        {'review_text': 'Grew on me.', 'rating': 9}, format='json')
+        self.assertHistogram(r8=2, r9=1)
+
+        self.authenticate(Token.objects.get(user=self.users[0]))
+        self.client.delete(reverse('review-detail', args=[Review.objects.get(review_user=self.users[0]).pk]))
+        expected = self.assertHistogram(r8=1, r9=1)
+        detail = self.client.get(reverse('movie-detail', args=[self.movie.pk]))
+        self.assertEqual(detail.data['rating_histogram'], expected)
+        self.assertEqual(self.client.get(reverse('rating-histogram', args=[0])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_reconcile_histograms_command(self):
+        self.post_review(self.users[0], 6)
+        Review.objects.create(review_user=self.users[1], watchlist=self.movie, review_text='x', rating=4)
+        out = StringIO()
+        call_command('reconcile_histograms', '--dry-run', stdout=out)
+        self.assertIn('1 histogram(s) have drifted', out.getvalue())
+        call_command('reconcile_histograms', stdout=out)
+        aggregates.reconcile()
+        self.assertHistogram(r4=1, r6=1)
+        out = StringIO()
+        call_command('reconcile_histograms', stdout=out)
+        self.assertIn('0 histogram(s) reconciled', out.getvalue())
+
+
+class WeightedRatingTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog(platforms=1, titles_per_platform=3, reviews_per_title=0)
+        self.lone, self.acclaimed, self.panned = WatchList.objects.order_by('pk')
+        reviewers = [User.objects.create_user(f'critic{i}', password='userpassword') for i in range(6)]
+        for title, ratings in ((self.lone, [10]), (self.acclaimed, [9] * 6), (self.panned, [5] * 5)):
+            for user, rating in zip(reviewers, ratings):
+                Review.objects.create(review_user=user, watchlist=title, review_text='Noted.', rating=rating)
+        aggregates.reconcile()
+        self.reviewers = reviewers
+
+    def assertWeighted(self, title):
+        # (v/(v+m))·R + (m/(v+m))·C against the stored prior
+        title.refresh_from_db()
+        prior = RatingPrior.objects.get()
+        expected = (title.rating_sum + prior.min_reviews * prior.mean) / (title.number_of_reviews + prior.min_reviews)
+        self.assertAlmostEqual(title.weighted_rating, round(expected, 4))
+
+    def test_few_reviews_are_pulled_towards_the_mean(self):
+        out = StringIO()
+        call_command('refresh_rating_prior', stdout=out)
+        self.assertIn('3 weighted ratings rewritten', out.getvalue())
+        prior = RatingPrior.objects.get()
+        self.assertAlmostEqual(prior.mean, 89 / 12)
+        self.assertEqual(prior.min_reviews, 4.0)
+        for title in (self.lone, self.acclaimed, self.panned):
+            self.assertWeighted(title)
+
+        # A single 10 ranks below six 9s
+        response = self.client.get(reverse('search-list'), {'ordering': '-weighted_rating'})
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [self.acclaimed.pk, self.lone.pk, self.panned.pk])
+
+        call_command('refresh_rating_prior', stdout=out)
+        self.assertIn('Prior unchanged', out.getvalue())
+
+    def test_migration_honours_the_configured_min_reviews(self):
+        migration = import_module('watchlist_app.migrations.0012_weighted_rating')
+        editor = mock.Mock(connection=connection)
+        migration.populate_weighted_rating(apps, editor)
+        self.assertEqual(RatingPrior.objects.get().min_reviews, 4.0)
+        with self.settings(WEIGHTED_RATING_MIN_REVIEWS=25):
+            migration.populate_weighted_rating(apps, editor)
+            self.assertEqual(RatingPrior.objects.get().min_reviews, 25.0)
+            for title in (self.lone, self.acclaimed, self.panned):
+                self.assertWeighted(title)
+            # Nothing left for refresh_rating_prior to do
+            self.assertEqual(aggregates.refresh_prior()[1], 0)
+
+    def test_review_writes_keep_it_current(self):
+        call_command('refresh_rating_prior', stdout=StringIO())
+        self.authenticate(Token.objects.get_or_create(user=self.users[0])[0])
+        self.client.post(reverse('review-create', args=[self.lone.pk]), {'review_text': 'Meh.', 'rating': 2},
+                         format='json')
+        self.assertWeighted(self.lone)
+        self.authenticate(Token.objects.get_or_create(user=self.reviewers[0])[0])
+        self.client.delete(reverse('review-detail', args=[Review.objects.get(review_user=self.reviewers[0],
+                                                                              watchlist=self.lone).pk]))
+        self.assertWeighted(self.lone)
+        self.authenticate(Token.objects.get_or_create(user=self.users[0])[0])
+        self.client.delete(reverse('review-detail', args=[Review.objects.get(review_user=self.users[0]).pk]))
+        self.lone.refresh_from_db()
+        self.assertEqual(self.lone.weighted_rating, 0.0)
+        self.assertFalse(aggregates.drifted().exists())
+
+
+class TitleSearchTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.platform = StreamingPlatform.objects.create(name='Netflix')
+        for title in ('The Godfather', 'The Godfather Part II', 'Goodfellas', 'Casablanca'):
+            WatchList.objects.create(
+                title=title,
+                description='A description long enough to validate.',
+                platform=self.platform if title == 'Casablanca' else None,
+                release_date=date(1970, 1, 1),
+            )
+
+    def search(self, term):
+        response = self.client.get(reverse('search-list'), {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data['results']]
+
+    def test_ranked_by_relevance(self):
+        titles = self.search('godfather')
+        self.assertEqual(set(titles[:2]), {'The Godfather', 'The Godfather Part II'})
+        self.assertNotIn('Casablanca', titles)
+
+    def test_typo_still_matches(self):
+        self.assertEqual(self.search('godfathr')[0][:13], 'The Godfather')
+
+    def test_platform_name_matches(self):
+        self.assertIn('Casablanca', self.search('netflix'))
+
+    def test_index_follows_saves(self):
+        movie = WatchList.objects.get(title='Goodfellas')
+        movie.title = 'Heat'
+        movie.save()
+        self.assertNotIn('Heat', self.search('goodfellas'))
+        self.assertEqual(self.search('heat'), ['Heat'])
+        movie.delete()
+        self.assertEqual(self.search('heat'), [])
+
+    def test_explicit_ordering_overrides_relevance(self):
+        WatchList.objects.filter(title='The Godfather Part II').update(average_rating=9)
+        response = self.client.get(reverse('search-list'), {'search': 'godfather', 'ordering': '-average_rating'})
+        self.assertEqual(response.data['results'][0]['title'], 'The Godfather Part II')
+
+    def test_pages_of_tied_ranks_past_the_candidate_window(self):
+        for _ in range(7):
+            WatchList.objects.create(title='Alien', description='A description long enough to validate.',
+                                     release_date=date(1979, 1, 1))
+        expected = list(WatchList.objects.filter(title='Alien').order_by('-id').values_list('id', flat=True))
+        ids, url, pages = [], reverse('search-list') + '?search=alien&page_size=2', []
+        # Three candidates per page: every page boundary falls between equal ranks
+        with mock.patch('watchlist_app.search.FTS_MAX_CANDIDATES', 3):
+            while url:
+                response = self.client.get(url)
+                pages.append(response.data)
+                ids += [item['id'] for item in response.data['results']]
+                url = response.data['next']
+            self.assertEqual(ids, expected)
+            back = self.client.get(pages[-1]['previous'])
+        self.assertEqual(back.data['results'], pages[-2]['results'])
+
+
+class ResponseCacheTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog()
+        self.movie = WatchList.objects.first()
+
+    def test_repeat_hits_skip_the_orm(self):
+        url = reverse('movie-list')
+        first, _ = self.request('get', url)
+        second, queries = self.request('get', url)
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertTrue(first['ETag'].startswith('"'))
+
+    def test_if_none_match_returns_304_without_queries(self):
+        url = reverse('movie-detail', args=[self.movie.pk])
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_if_none_match_on_a_cold_cache(self):
+        url = reverse('streaming-platform-list')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_invalidate_dependent_responses(self):
+        detail = reverse('movie-detail', args=[self.movie.pk]) + '?expand=reviews'
+        reviews = reverse('review-list', args=[self.movie.pk])
+        platforms = reverse('streaming-platform-list') + '?expand=watchlist.reviews'
+        before = {url: self.client.get(url)['ETag'] for url in (detail, reviews, platforms)}
+
+        Review.objects.create(review_user=self.admin, watchlist=self.movie, review_text='New.', rating=2)
+        for url in (detail, reviews, platforms):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=before[url])
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertNotEqual(response['ETag'], before[url])
+
+    def test_platform_rename_invalidates_titles(self):
+        url = reverse('movie-detail', args=[self.movie.pk]) + '?expand=platform'
+        self.client.get(url)
+        self.movie.platform.name = 'Renamed'
+        self.movie.platform.save()
+        self.assertEqual(self.client.get(url).data['platform']['name'], 'Renamed')
+
+
+class SparseFieldsetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog(platforms=2, titles_per_platform=2, reviews_per_title=2)
+        self.movie = WatchList.objects.first()
+
+    def test_default_response_is_compact(self):
+        data = self.client.get(reverse('movie-detail', args=[self.movie.pk])).data
+        self.assertEqual(data['platform'], self.movie.platform_id)
+        self.assertNotIn('reviews', data)
+        platform = self.client.get(reverse('streaming-platform-detail', args=[self.movie.platform_id])).data
+        self.assertNotIn('watchlist', platform)
+
+    def test_fields_limits_response_and_columns(self):
+        url = reverse('movie-list') + '?fields=id,title'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"average_rating"', sql)
+
+    def test_method_field_loads_its_source(self):
+        response = self.client.get(reverse('movie-detail', args=[self.movie.pk]) + '?fields=len_title')
+        self.assertEqual(response.data, {'len_title': len(self.movie.title)})
+
+    def test_nested_expansion(self):
+        url = reverse('streaming-platform-detail', args=[self.movie.platform_id])
+        response, queries = self.request('get', url + '?fields=name&expand=watchlist.reviews')
+        self.assertEqual(set(response.data), {'name', 'watchlist'})
+        self.assertEqual(len(response.data['watchlist'][0]['reviews']), 2)
+        self.assertEqual(queries, 3)
+
+    def test_review_preview_is_capped(self):
+        self.make_catalog(platforms=1, titles_per_platform=3, reviews_per_title=4)
+        with self.settings(REVIEW_PREVIEW_SIZE=2):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('movie-list') + '?expand=reviews')
+        # One query for the page and one windowed query for every title's preview
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn('ROW_NUMBER()', ctx.captured_queries[1]['sql'])
+        for movie in response.data['results']:
+            latest = Review.objects.filter(watchlist=movie['id']).order_by('-created_at', '-id')[:2]
+            self.assertEqual([review['id'] for review in movie['reviews']], [review.pk for review in latest])
+            self.assertEqual(movie['reviews_url'], reverse('review-list', args=[movie['id']]))
+
+    def test_naming_relation_in_fields_expands_it(self):
+        url = reverse('movie-detail', args=[self.movie.pk]) + '?fields=title,platform'
+        data = self.client.get(url).data
+        self.assertEqual(data['platform']['name'], self.movie.platform.name)
+
+    def test_platform_is_writable_by_id(self):
+        self.authenticate(self.admin_token)
+        other = StreamingPlatform.objects.exclude(pk=self.movie.platform_id).first()
+        data = {
+            'title': 'Moved',
+            'description': 'A description long enough to validate.',
+            'release_date': '2020-01-01',
+            'platform': other.pk,
+        }
+        response = self.client.put(reverse('movie-detail', args=[self.movie.pk]), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.platform_id, other.pk)
+
+
+class BulkWriteTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog(platforms=2, titles_per_platform=1, reviews_per_title=0)
+        self.platform = StreamingPlatform.objects.first()
+
+    def title(self, n, **extra):
+        return {
+            'title': f'Bulk {n}',
+            'description': 'A description long enough to validate.',
+            'release_date': '2020-01-01',
+            'platform': self.platform.pk,
+            **extra,
+        }
+
+    def test_create_reports_invalid_items(self):
+        self.authenticate(self.admin_token)
+        items = [self.title(0), self.title(1, description='short'), 'nope', self.title(3, platform=9999)]
+        response = self.client.post(reverse('movie-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2, 3])
+        self.assertIn('description', response.data['errors'][0]['errors'])
+        self.assertIn('platform', response.data['errors'][2]['errors'])
+        self.assertTrue(WatchList.objects.filter(title='Bulk 0', platform=self.platform).exists())
+
+    def test_query_count_does_not_grow_with_payload(self):
+        self.authenticate(self.admin_token)
+        self.request('post', reverse('movie-bulk'), [])  # Resolve (and cache) the token first
+        _, small = self.request('post', reverse('movie-bulk'), [self.title(i) for i in range(2)])
+        # Within SQLite's 999 parameters per INSERT, so bulk_create needs one batch
+        _, large = self.request('post', reverse('movie-bulk'), [self.title(i) for i in range(40)])
+        self.assertEqual(small, large)
+        self.assertEqual(WatchList.objects.filter(title__startswith='Bulk').count(), 42)
+
+    def test_ndjson_payload(self):
+        self.authenticate(self.admin_token)
+        body = '\n'.join([json.dumps(self.title(0)), '{broken', '', json.dumps(self.title(2))])
+        response = self.client.post(reverse('movie-bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+
+    def test_upsert_titles_by_id(self):
+        self.authenticate(self.admin_token)
+        movie = WatchList.objects.first()
+        items = [self.title(0, id=movie.pk), self.title(1), self.title(2, id=999999)]
+        response = self.client.put(reverse('movie-bulk'), items, format='json')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        movie.refresh_from_db()
+        self.assertEqual(movie.title, 'Bulk 0')
+
+    def test_upsert_platforms_by_name(self):
+        self.authenticate(self.admin_token)
+        items = [
+            {'name': self.platform.name, 'website': 'https://new.example.com'},
+            {'name': 'Fresh', 'website': 'https://fresh.example.com'},
+            {'name': 'Fresh', 'website': 'https://dupe.example.com'},
+        ]
+        response = self.client.post(reverse('streaming-platform-bulk'), items, format='json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([e['index'] for e in response.data['errors']], [0, 2])
+        response = self.client.put(reverse('streaming-platform-bulk'), items[:2], format='json')
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 2))
+        self.platform.refresh_from_db()
+        self.assertEqual(self.platform.website, 'https://new.example.com')
+
+    def test_titles_and_platforms_require_admin(self):
+        self.authenticate(self.user_token)
+        response = self.client.post(reverse('movie-bulk'), [self.title(0)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_reviews_update_aggregates(self):
+        self.authenticate(self.user_token)
+        movies = list(WatchList.objects.all())
+        items = [{'watchlist': m.pk, 'review_text': 'Bulk review.', 'rating': 8} for m in movies]
+        response = self.client.post(reverse('review-bulk'), items, format='json')
+        self.assertEqual(response.data['created'], len(movies))
+        items[0]['rating'] = 4
+        response = self.client.put(reverse('review-bulk'), items[:1], format='json')
+        self.assertEqual(response.data['updated'], 1)
+        # Recounts are deferred, one job per title
+        self.assertTrue(aggregates.drifted().exists())
+        self.assertEqual(jobs.run_pending(), len(movies))
+        self.assertFalse(aggregates.drifted().exists())
+        movie = WatchList.objects.get(pk=movies[0].pk)
+        self.assertEqual((movie.number_of_reviews, movie.rating_sum), (1, 4))
+        self.assertEqual(Review.objects.get(watchlist=movie).review_user, self.users[0])
+
+    def test_reviews_are_throttled_per_item(self):
+        # Reviews may be created 5 a day, in one request or many
+        self.make_catalog(platforms=1, titles_per_platform=4, reviews_per_title=0)
+        self.authenticate(self.user_token)
+        items = [{'watchlist': m.pk, 'review_text': 'Bulk review.', 'rating': 8} for m in WatchList.objects.all()]
+        response = self.client.post(reverse('review-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Review.objects.exists())
+        response = self.client.post(reverse('review-bulk'), items[:4], format='json')
+        self.assertEqual(response.data['created'], 4)
+        response = self.client.post(reverse('review-bulk'), items[4:6], format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(reverse('review-create', args=[items[5]['watchlist']]),
+                                    {'review_text': 'One more.', 'rating': 7}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('review-create', args=[items[4]['watchlist']]),
+                                    {'review_text': 'Too many.', 'rating': 7}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_bulk_write_invalidates_cached_lists(self):
+        url = reverse('movie-list')
+        before = self.client.get(url)['ETag']
+        self.authenticate(self.admin_token)
+        self.client.post(reverse('movie-bulk'), [self.title(0)], format='json')
+        self.assertNotEqual(self.client.get(url)['ETag'], before)
+
+
+class ExportTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog(platforms=2, titles_per_platform=3, reviews_per_title=2)
+        self.authenticate(self.admin_token)
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_streams_every_title(self):
+        response, body = self.export(reverse('movie-export'))
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(WatchList.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(rows[0]['platform_name'], 'Platform 0')
+
+    def test_csv_with_filters(self):
+        platform = StreamingPlatform.objects.get(name='Platform 1')
+        WatchList.objects.filter(title='Title 1-0').update(active=False)
+        response, body = self.export(reverse('movie-export'), format='csv', platform=platform.pk, active='true')
+        self.assertIn('watchlist.csv', response['Content-Disposition'])
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'title'])
+        self.assertEqual(sorted(line.split(',')[1] for line in lines[1:]), ['Title 1-1', 'Title 1-2'])
+
+    def test_created_at_range(self):
+        cutoff = WatchList.objects.order_by('pk')[3].created_at
+        _, body = self.export(reverse('review-export'), created_after=cutoff.isoformat())
+        self.assertEqual(len(body.splitlines()), Review.objects.filter(created_at__gte=cutoff).count())
+        response = self.client.get(reverse('review-export'), {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_csv_cells_cannot_be_formulas(self):
+        WatchList.objects.filter(title='Title 0-0').update(title='=HYPERLINK("http://evil.example")')
+        Review.objects.filter(pk=Review.objects.order_by('pk')[0].pk).update(review_text='@SUM(A1:A9)')
+        _, body = self.export(reverse('movie-export'), format='csv')
+        titles = {row['title'] for row in csv.DictReader(body.splitlines())}
+        self.assertIn('\'=HYPERLINK("http://evil.example")', titles)
+        self.assertIn('Title 0-1', titles)
+        _, body = self.export(reverse('review-export'), format='csv')
+        self.assertEqual(next(csv.DictReader(body.splitlines()))['review_text'], "'@SUM(A1:A9)")
+
+    def test_csv_error_lists_are_flattened(self):
+        response = self.client.get(reverse('movie-export'), {'created_after': 'yesterday', 'platform': 'x'},
+                                   HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        header, row = list(csv.reader(response.content.decode().splitlines()))
+        self.assertEqual(sorted(header), ['created_after', 'platform'])
+        errors = dict(zip(header, row))
+        self.assertEqual(errors['created_after'], 'Enter a valid date/time.')
+        self.assertEqual(errors['platform'], 'Enter a number.')
+
+    def test_review_export_by_platform(self):
+        platform = StreamingPlatform.objects.get(name='Platform 0')
+        _, body = self.export(reverse('review-export'), platform=platform.pk)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row['review_user'] for row in rows}, {'user0', 'user1'})
+
+    def test_requires_admin(self):
+        self.authenticate(self.user_token)
+        self.assertEqual(self.client.get(reverse('movie-export')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+def _hammer_throttle(path, attempts, results):
+    store = SQLiteThrottleStore(path)
+    results.put(sum(store.acquire('hot', 60.0, 600.0)[0] for _ in range(attempts)))
+
+
+class ThrottleStoreTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'throttle.sqlite3')
+
+    def test_burst_then_steady_rate(self):
+        store = SQLiteThrottleStore(self.path)
+        # 10 per 600s: a burst of 10, then one every 60s
+        results = [store.acquire('k', 60.0, 600.0) for _ in range(11)]
+        self.assertTrue(all(allowed for allowed, _ in results[:10]))
+        allowed, wait = results[10]
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 60.0, delta=1.0)
+        self.assertTrue(store.acquire('other', 60.0, 600.0)[0])
+
+    def test_cost_larger_than_burst_is_refused(self):
+        store = SQLiteThrottleStore(self.path)
+        self.assertEqual(store.acquire('k', 60.0, 600.0, cost=11), (False, None))
+        self.assertTrue(store.acquire('k', 60.0, 600.0, cost=10)[0])
+        self.assertFalse(store.acquire('k', 60.0, 600.0)[0])
+
+    def test_limit_is_shared_across_processes(self):
+        SQLiteThrottleStore(self.path).clear()
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_hammer_throttle, args=(self.path, 10, results))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sum(results.get() for _ in workers), 10)
+
+    def test_views_use_shared_store(self):
+        self.make_catalog()
+        url = reverse('movie-detail', args=[WatchList.objects.first().pk])
+        statuses = [self.client.get(url).status_code for _ in range(5)]
+        self.assertEqual(statuses, [status.HTTP_200_OK] * 5)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+
+class BatchLookupTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_catalog(platforms=2, titles_per_platform=2, reviews_per_title=2)
+        self.ids = list(WatchList.objects.order_by('-pk').values_list('pk', flat=True))
+        self.missing = max(self.ids) + 1
+
+    def test_get_returns_titles_keyed_by_id(self):
+        ids = [self.ids[0], self.missing, self.ids[1]]
+        url = reverse('movie-batch') + '?ids=' + ','.join(map(str, ids))
+        # The titles with their platforms, then every title's review preview
+        response = self.assertQueryBudget(2, 'get', url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results']), [str(pk) for pk in ids])
+        self.assertIsNone(response.data['results'][str(self.missing)])
+        self.assertEqual(response.data['not_found'], [self.missing])
+        movie = response.data['results'][str(self.ids[0])]
+        self.assertEqual(movie['platform']['id'], WatchList.objects.get(pk=self.ids[0]).platform_id)
+        self.assertEqual(len(movie['reviews']), 2)
+        self.assertIn('rating_histogram', movie)
+
+    def test_post_body_and_sparse_fields(self):
+        url = reverse('movie-batch') + '?fields=id,title'
+        response = self.client.post(url, {'ids': self.ids + self.ids[:1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), len(self.ids))
+        self.assertEqual(set(response.data['results'][str(self.ids[0])]), {'id', 'title'})
+        self.assertEqual(response.data['not_found'], [])
+
+    def test_invalid_ids(self):
+        url = reverse('movie-batch')
+        for query in ('', '?ids=1,x'):
+            self.assertEqual(self.client.get(url + query).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'ids': '1,2'}, format='json').status_code, 400)
+        with self.settings(BATCH_LOOKUP_MAX_IDS=3):
+            self.assertEqual(self.client.post(url, {'ids': self.ids}, format='json').status_code, 400)
+        for ids, shown in (([True], 'true'), ([1.0], '1.0'), ([0], '0'), ([2 ** 63], str(2 ** 63)), (['-1'], '-1')):
+            response = self.client.post(url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['ids'], f'{shown} is not a movie id.')
+        response = self.client.get(url + '?ids=99999999999999999999999')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('99999999999999999999999', response.data['ids'])
+
+    def test_throttle_charges_per_id(self):
+        url = reverse('movie-batch')
+        with mock.patch.dict(SharedScopedRateThrottle.THROTTLE_RATES, {'batch': '5/day'}):
+            self.assertEqual(self.client.post(url, {'ids': self.ids[:3]}, format='json').status_code, 200)
+            self.assertEqual(self.client.post(url, {'ids': self.ids[:3]}, format='json').status_code, 429)
+            self.assertEqual(self.client.post(url, {'ids': self.ids[:2]}, format='json').status_code, 200)
+            self.authenticate(self.user_token)  # Counted per user from here
+            self.assertEqual(self.client.post(url, {'ids': self.ids}, format='json').status_code, 200)
+            self.assertEqual(self.client.post(url, {'ids': self.ids[:2]}, format='json').status_code, 429)
+
+    def test_batches_are_capped_at_the_burst(self):
+        url = reverse('movie-batch')
+        ids = self.ids + [self.missing, self.missing + 1]
+        # Six ids would cost more than a burst of 5 and never be admitted
+        with mock.patch.dict(SharedScopedRateThrottle.THROTTLE_RATES, {'batch': '5/day'}):
+            response = self.client.post(url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['ids'], 'Give between 1 and 5 ids.')
+        # The batch rate admits a full batch at once, even anonymously
+        ids = list(range(self.missing, self.missing + 100))
+        response = self.client.post(url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['not_found']), 100)
+        response = self.client.post(url, {'ids': ids + [self.ids[0]]}, format='json')
+        self.assertEqual(response.data['ids'], 'Give between 1 and 100 ids.')
+
+
+class ExplainQueriesTests(QueryBudgetTestCase):
+    def test_hot_queries_use_indexes(self):
+        self.make_catalog()
+        out = StringIO()
+        call_command('explain_queries', '--fail', stdout=out)
+        self.assertNotIn('SEQ SCAN', out.getvalue())
+        self.assertIn('OK        user-reviews', out.getvalue())
+
+
+class BenchmarkSupportTests(QueryBudgetTestCase):
+    def test_seeded_aggregates_match_reviews(self):
+        seed_catalog(platforms=3, titles=40, reviews=300, users=12, batch_size=16)
+        self.assertEqual(WatchList.objects.count(), 40)
+        self.assertEqual(Review.objects.count(), 300)
+        self.assertFalse(aggregates.drifted().exists())
+        self.assertEqual(aggregates.reconcile_histograms(dry_run=True), 0)
+        # Weighted ratings are filled in once the catalog is written
+        self.assertFalse(WatchList.objects.filter(number_of_reviews__gt=0, weighted_rating=0).exists())
+
+    def test_seed_data_is_deterministic_and_skewed(self):
+        def snapshot():
+            return list(WatchList.objects.order_by('created_at').values_list(
+                'title', 'number_of_reviews', 'rating_sum', 'average_rating', 'created_at',
+            ))
+
+        options = {'platforms': 2, 'titles': 30, 'reviews': 200, 'users': 20, 'tokens': 3, 'stdout': StringIO()}
+        call_command('seed_data', **options)
+        first = snapshot()
+        self.assertEqual(Review.objects.count(), 200)
+        self.assertEqual(Token.objects.filter(user__username__startswith='seed').count(), 3)
+        self.assertFalse(aggregates.drifted().exists())
+        # Popular titles get many reviews, the long tail only a few
+        counts = sorted(row[1] for row in first)
+        self.assertGreaterEqual(counts[-1], 4 * max(counts[0], 1))
+
+        WatchList.objects.all().delete()
+        call_command('seed_data', **options)
+        self.assertEqual(snapshot(), first)
+
+    def test_baseline_comparison(self):
+        endpoint = {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 2}
+        baseline = {'endpoints': {'movie-list GET': endpoint}}
+        slower = {'endpoints': {'movie-list GET': {**endpoint, 'p95_ms': 30.0, 'queries': 3}}}
+        noise = {'endpoints': {'movie-list GET': {**endpoint, 'p50_ms': 10.5}}}
+        self.assertEqual(len(compare(slower, baseline, 20.0, 1.0)), 2)
+        self.assertEqual(compare(noise, baseline, 1.0, 1.0), [])
+
+
+class RequestMetricsTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+
+    def test_server_timing_and_histograms(self):
+        self.make_catalog()
+        response = self.client.get(reverse('movie-list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        for name in ('app', 'render', 'total'):
+            self.assertIn(f'{name};dur=', timing)
+
+        self.authenticate(self.admin_token)  # counted by the token cache collector
+        scrape = self.client.get('/metrics')
+        self.assertEqual(scrape.status_code, status.HTTP_200_OK)
+        self.assertTrue(scrape['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = scrape.content.decode()
+        labels = 'route="movie-list",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', body)
+        self.assertIn(f'http_response_size_bytes_sum{{{labels}}} {len(response.content)}', body)
+        self.assertIn('token_cache_lookups_total{result="miss"}', body)
+
+    def test_async_views_count_their_queries(self):
+        self.make_catalog()
+        query_count = re.compile(r'desc="(\d+) queries"')
+        cache.clear()
+        expected = query_count.search(self.client.get(reverse('movie-list'))['Server-Timing']).group(1)
+        cache.clear()
+        with self.settings(ROOT_URLCONF='imdb.async_urls'):
+            response = async_to_sync(self.async_client.get)(reverse('movie-list'))
+        self.assertNotEqual(expected, '0')
+        self.assertEqual(query_count.search(response['Server-Timing']).group(1), expected)
+
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.settings(SLOW_REQUEST_MS=0), self.assertLogs('imdb.requests', 'WARNING') as logs:
+            self.client.get(reverse('movie-list'))
+        self.assertIn('movie-list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class AsyncReadViewTests(QueryBudgetTestCase):
+    """
+    The async read views (imdb/async_urls.py, used by the ASGI application)
+    must answer exactly like the sync ones.
+    """
+
+    def async_request(self, method, url, data=None, token=None):
+        headers = {'Authorization': f'Token {token.key}'} if token else {}
+        with self.settings(ROOT_URLCONF='imdb.async_urls'):
+            return async_to_sync(getattr(self.async_client, method))(
+                url, data, content_type='application/json', headers=headers,
+            )
+
+    def test_views_are_async(self):
+        for name, args in (('movie-list', []), ('review-list', [1]), ('user-reviews', [])):
+            match = resolve(reverse(name, args=args), urlconf='imdb.async_urls')
+            self.assertTrue(iscoroutinefunction(match.func), name)
+
+    def test_read_endpoints_match_sync_views(self):
+        self.make_catalog()
+        movie = WatchList.objects.first()
+        platform = StreamingPlatform.objects.first()
+        urls = [
+            reverse('movie-list') + '?expand=platform',
+            reverse('movie-list') + '?page_size=2&fields=id,title',
+            reverse('movie-detail', args=[movie.pk]) + '?expand=reviews',
+            reverse('search-list') + '?search=Title',
+            reverse('streaming-platform-list') + '?expand=watchlist.reviews',
+            reverse('streaming-platform-detail', args=[platform.pk]),
+            reverse('review-list', args=[movie.pk]),
+            reverse('user-reviews') + '?username=user0',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                expected = self.client.get(url)
+                cache.clear()
+                response = self.async_request('get', url)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_not_found_and_bad_requests(self):
+        self.assertEqual(
+            self.async_request('get', reverse('movie-detail', args=[999])).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertEqual(
+            self.async_request('get', reverse('user-reviews')).status_code, status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.async_request('get', reverse('user-reviews') + '?username=nobody').status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_writes_still_work_on_async_routes(self):
+        data = {
+            'title': 'Async Title',
+            'description': 'A description long enough to validate.',
+            'release_date': '2020-01-01',
+            'active': True,
+        }
+        response = self.async_request('post', reverse('movie-list'), data, token=self.admin_token)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(WatchList.objects.filter(title='Async Title').exists())
+        # Permissions are still enforced for the sync handlers
+        response = self.async_request('post', reverse('movie-list'), data, token=self.user_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_exports_stream_from_an_async_iterator(self):
+        self.make_catalog(platforms=2, titles_per_platform=3, reviews_per_title=2)
+        self.authenticate(self.admin_token)
+
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        for url in (reverse('movie-export'), reverse('movie-export') + '?format=csv', reverse('review-export')):
+            with self.subTest(url=url):
+                expected = b''.join(self.client.get(url).streaming_content)
+                response = self.async_request('get', url, token=self.admin_token)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.is_async)
+                self.assertEqual(async_to_sync(read)(response), expected)
+        response = self.async_request('get', reverse('movie-export') + '?created_after=yesterday', token=self.admin_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# A second database standing in for a replica. It is registered when the tests
+# are loaded, so the test runner creates and migrates it like the default one;
+# rows written only there show which database a read hit.
+REPLICA = 'replica'
+connections.settings.setdefault(REPLICA, {
+    **connections.settings['default'],
+    'TEST': {**connections.settings['default']['TEST'], 'NAME': None, 'MIRROR': None},
+})
+
+
+class ReplicaRoutingTests(QueryBudgetTestCase):
+    """
+    Reads go to a replica, writers read their own writes from the primary.
+    """
+
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        super().setUp()
+        selector.forget()
+        fields = {'description': 'A description long enough to validate.', 'release_date': date(2020, 1, 1)}
+        self.primary_movie = WatchList.objects.create(title='On the primary', **fields)
+        WatchList.objects.using(REPLICA).create(title='On the replica', **fields)
+        replicas = self.settings(DATABASE_REPLICAS=[REPLICA])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+    def listed_titles(self):
+        # Bypass the response cache, which responses read from the primary fill
+        response_cache.bump('watchlist')
+        return [movie['title'] for movie in self.client.get(reverse('movie-list')).data['results']]
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertEqual(self.listed_titles(), ['On the replica'])
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.listed_titles(), ['On the primary'])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        self.authenticate(self.user_token)
+        self.assertEqual(self.listed_titles(), ['On the replica'])
+        response = self.client.post(
+            reverse('review-create', args=[self.primary_movie.pk]),
+            {'review_text': 'Seen it.', 'rating': 8}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # The writer now reads its own write; other clients keep using the replica
+        self.assertEqual(self.listed_titles(), ['On the primary'])
+        self.authenticate(self.admin_token)
+        self.assertEqual(self.listed_titles(), ['On the replica'])
+        # Once the pin expires the writer is back on the replica
+        cache.clear()
+        self.authenticate(self.user_token)
+        self.assertEqual(self.listed_titles(), ['On the replica'])
+
+    def test_cache_keeps_read_your_writes(self):
+        url = reverse('movie-list')
+
+        def titles():
+            return [movie['title'] for movie in json.loads(self.client.get(url).content)['results']]
+
+        self.authenticate(self.user_token)
+        response = self.client.post(
+            reverse('review-create', args=[self.primary_movie.pk]),
+            {'review_text': 'Seen it.', 'rating': 8}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # The write bumped the generations; the replica's stale rows must not be cached under them
+        self.client.credentials()
+        self.assertEqual(titles(), ['On the replica'])
+        self.authenticate(self.user_token)
+        self.assertEqual(titles(), ['On the primary'])
+        # What the primary returned is cached for everyone
+        self.client.credentials()
+        with CaptureQueriesContext(connections[REPLICA]) as ctx:
+            self.assertEqual(titles(), ['On the primary'])
+        self.assertEqual(ctx.captured_queries, [])
+
+    def test_exports_stream_from_the_replica(self):
+        self.authenticate(self.admin_token)
+        url = reverse('movie-export')
+
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        # The rows are read while the body streams, after the middleware returned
+        body = b''.join(self.client.get(url).streaming_content)
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['On the replica'])
+        with self.settings(ROOT_URLCONF='imdb.async_urls'):
+            response = async_to_sync(self.async_client.get)(url, headers={'Authorization': f'Token {self.admin_token.key}'})
+        self.assertTrue(response.is_async)
+        body = async_to_sync(read)(response)
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['On the replica'])
+
+    def test_replica_selection(self):
+        lags = {'a': 3.0, 'b': 1.0, 'c': 60.0}
+        with mock.patch.object(ReplicaSelector, 'measure_lag', side_effect=lags.get), \
+                self.settings(DATABASE_REPLICAS=['a', 'b', 'c'], REPLICA_MAX_LAG_SECONDS=10):
+            # 'c' lags too much to be used
+            self.assertEqual([selector.choose() for _ in range(4)], ['a', 'b', 'a', 'b'])
+            with self.settings(REPLICA_SELECTION='least_lag'):
+                self.assertEqual(selector.choose(), 'b')
+            with self.settings(REPLICA_MAX_LAG_SECONDS=0.5):
+                self.assertIsNone(selector.choose())
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(ReplicaSelector, 'measure_lag', return_value=float('inf')):
+            self.assertEqual(self.listed_titles(), ['On the primary'])
+
+
+class ConnectionPoolTests(QueryBudgetTestCase):
+    def make_pool(self, **options):
+        self.connects = 0
+
+        def connect():
+            self.connects += 1
+            return sqlite3.connect(':memory:', check_same_thread=False)
+
+        def check(connection):
+            try:
+                connection.execute('SELECT 1')
+            except sqlite3.ProgrammingError:
+                return False
+            return True
+
+        pool = ConnectionPool(connect, check=check, name='test', **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.getconn()
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        second = pool.getconn()
+        self.assertIsNot(second, first)
+        self.assertEqual(self.connects, 2)
+        self.assertEqual(pool.snapshot()['in_use'], 2)
+
+    def test_checkout_waits_then_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        connection = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        # A connection returned while waiting is handed over
+        threading.Timer(0.01, pool.putconn, [connection]).start()
+        pool.timeout = 5
+        self.assertIs(pool.getconn(), connection)
+        stats = pool.snapshot()
+        self.assertEqual((stats['waits'], stats['timeouts']), (2, 1))
+
+    def test_broken_and_idle_connections_are_replaced(self):
+        pool = self.make_pool(max_size=2, check_after=0, max_idle=0.05)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        connection.close()  # e.g. the server restarted
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertEqual(pool.snapshot()['failed_checks'], 1)
+
+        idle = pool.getconn()
+        pool.putconn(idle)
+        time.sleep(0.06)
+        self.assertIsNot(pool.getconn(), idle)
+        stats = pool.snapshot()
+        self.assertEqual((stats['size'], stats['closed']), (2, 2))
+
+    def test_pool_metrics(self):
+        pool = get_pool(('test',), lambda: self.make_pool(max_size=3))
+        pool.putconn(pool.getconn())
+        self.addCleanup(close_pools)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('db_pool_max_size{database="test"} 3', body)
+        self.assertIn('db_pool_idle{database="test"} 1', body)
+        self.assertIn('db_pool_checkouts_total{database="test"} 1', body)
+
+
+class LeaderboardTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        small = self.settings(LEADERBOARD_SIZE=3)
+        small.enable()
+        self.addCleanup(small.disable)
+        # Rate limits are not under test here
+        throttles = mock.patch.object(APIView, 'check_throttles', lambda self, request: None)
+        throttles.start()
+        self.addCleanup(throttles.stop)
+
+    def boards(self):
+        # Boards are updated by deferred jobs
+        jobs.run_pending()
+        stored = {}
+        for member in LeaderboardEntry.objects.order_by('board', *leaderboards.ENTRY_RANKING):
+            stored.setdefault(member.board, []).append(member.watchlist_id)
+        return stored
+
+    def expected_boards(self):
+        # Rank the whole catalog from scratch
+        expected = {}
+        for title in leaderboards.eligible().order_by(*leaderboards.TITLE_RANKING):
+            for board in leaderboards.board_keys(title.platform_id, title.release_date):
+                if len(expected.setdefault(board, [])) < 3:
+                    expected[board].append(title.pk)
+        return expected
+
+    def test_boards_follow_review_and_title_writes(self):
+        self.make_catalog(platforms=2, titles_per_platform=4, reviews_per_title=0)
+        titles = list(WatchList.objects.order_by('pk'))
+        for i, title in enumerate(titles):
+            title.release_date = date(2018 + i % 2, 1, 1)
+            title.save()
+        tokens = {user: Token.objects.get_or_create(user=user)[0] for user in self.users}
+        rng = random.Random(7)
+        for step in range(60):
+            user = rng.choice(self.users)
+            self.authenticate(tokens[user])
+            title = rng.choice(titles)
+            review = Review.objects.filter(watchlist=title, review_user=user).first()
+            if review is None:
+                self.client.post(reverse('review-create', args=[title.pk]),
+                                 {'review_text': 'Seen it.', 'rating': rng.randint(1, 10)}, format='json')
+            elif rng.random() < 0.5:
+                self.client.put(reverse('review-detail', args=[review.pk]),
+                                {'review_text': 'Changed.', 'rating': rng.randint(1, 10)}, format='json')
+            else:
+                self.client.delete(reverse('review-detail', args=[review.pk]))
+            self.assertEqual(self.boards(), self.expected_boards(), f'after step {step}')
+
+        # Moving, deactivating and deleting titles
+        self.authenticate(self.admin_token)
+        moved = titles[0]
+        data = {'title': moved.title, 'description': moved.description, 'release_date': '2019-06-01',
+                'platform': titles[-1].platform_id, 'active': True}
+        self.assertEqual(self.client.put(reverse('movie-detail', args=[moved.pk]), data, format='json').status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(self.boards(), self.expected_boards())
+        best = LeaderboardEntry.objects.filter(board='all').order_by(*leaderboards.ENTRY_RANKING).first()
+        self.client.delete(reverse('movie-detail', args=[best.watchlist_id]))
+        self.assertEqual(self.boards(), self.expected_boards())
+        self.client.delete(reverse('streaming-platform-detail', args=[titles[1].platform_id]))
+        self.assertEqual(self.boards(), self.expected_boards())
+
+    def test_top_rated_endpoint(self):
+        self.make_catalog(platforms=2, titles_per_platform=3, reviews_per_title=1)
+        for rating, title in enumerate(WatchList.objects.order_by('pk'), 1):
+            WatchList.objects.filter(pk=title.pk).update(average_rating=rating, weighted_rating=rating)
+        out = StringIO()
+        call_command('rebuild_leaderboards', stdout=out)
+        self.assertIn('leaderboard entries written', out.getvalue())
+        self.assertEqual(self.boards(), self.expected_boards())
+
+        response = self.assertQueryBudget(1, 'get', reverse('top-rated') + '?limit=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['board'], 'all')
+        self.assertEqual([item['rank'] for item in response.data['results']], [1, 2])
+        self.assertEqual(response.data['results'][0]['average_rating'], '6.0')
+        platform = StreamingPlatform.objects.order_by('pk').first()
+        response = self.client.get(reverse('top-rated-platform', args=[platform.pk]))
+        self.assertEqual([item['platform'] for item in response.data['results']], [platform.pk] * 3)
+        response = self.client.get(reverse('top-rated-year', args=[2020]))
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(reverse('top-rated') + '?limit=4')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# Calls made by the test jobs below, and how many times each should fail first
+job_calls = []
+job_failures = {}
+
+
+@jobs.task('tests.record')
+def record_job(value):
+    job_calls.append(value)
+    if job_failures.get(value, 0) > 0:
+        job_failures[value] -= 1
+        raise RuntimeError(f'{value} failed')
+
+
+class JobQueueTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        job_calls.clear()
+        job_failures.clear()
+
+    def test_dedup_keys_collapse_queued_jobs(self):
+        self.make_catalog(platforms=1, titles_per_platform=1, reviews_per_title=0)
+        movie = WatchList.objects.get()
+        for user in self.users:
+            self.authenticate(Token.objects.get_or_create(user=user)[0])
+            self.client.post(reverse('review-create', args=[movie.pk]),
+                             {'review_text': 'Seen it.', 'rating': 6}, format='json')
+        self.assertEqual(Job.objects.filter(name='leaderboards.titles_changed').count(), 1)
+
+        # A claimed job doesn't absorb work queued after it started
+        jobs.enqueue('tests.record', {'value': 'a'}, dedup_key='a')
+        claimed = jobs.claim(10)
+        jobs.enqueue('tests.record', {'value': 'a'}, dedup_key='a')
+        self.assertEqual(Job.objects.filter(dedup_key='a', status=Job.QUEUED).count(), 1)
+        for job in claimed:
+            jobs.execute(job)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(job_calls, ['a', 'a'])
+        self.assertEqual(LeaderboardEntry.objects.filter(watchlist=movie, board='all').count(), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_retries_back_off_then_fail(self):
+        job_failures.update(flaky=1, broken=99)
+        jobs.enqueue('tests.record', {'value': 'flaky'})
+        jobs.enqueue('tests.record', {'value': 'broken'})
+        with self.assertLogs('imdb.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 2)
+        retried = Job.objects.get(kwargs__value='flaky')
+        self.assertEqual((retried.status, retried.attempts), (Job.QUEUED, 1))
+        self.assertIn('flaky failed', retried.last_error)
+        self.assertGreater(retried.run_after, retried.started_at)  # Not due yet
+        Job.objects.update(run_after=retried.started_at)
+        with self.settings(JOB_RETRY_BACKOFF=0, JOB_MAX_ATTEMPTS=3), self.assertLogs('imdb.jobs', 'ERROR'):
+            jobs.run_pending()
+        self.assertEqual(job_calls.count('flaky'), 2)
+        self.assertEqual(job_calls.count('broken'), 3)
+        failed = Job.objects.get()
+        self.assertEqual((failed.kwargs, failed.status, failed.attempts), ({'value': 'broken'}, Job.FAILED, 3))
+
+    def test_lost_jobs_are_requeued(self):
+        jobs.enqueue('tests.record', {'value': 'lost'}, dedup_key='lost')
+        jobs.claim(1)
+        self.assertEqual(jobs.requeue_lost(), 0)
+        with self.settings(JOB_TIMEOUT=-1):
+            self.assertEqual(jobs.requeue_lost(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(job_calls, ['lost'])
+
+    def test_eager_mode_and_metrics(self):
+        with self.settings(JOBS_EAGER=True):
+            jobs.enqueue('tests.record', {'value': 'now'})
+        self.assertEqual(job_calls, ['now'])
+        jobs.enqueue('tests.record', {'value': 'later'}, delay=60)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('job_queue_depth{status="queued"} 1', body)
+        self.assertIn('job_queue_oldest_due_seconds 0', body)
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def setUp(self):
+        job_calls.clear()
+        job_failures.clear()
 
+    def test_thread_pool_drains_the_queue(self):
+        jobs.enqueue_many('tests.record', [({'value': i}, None) for i in range(20)])
+        out = StringIO()
+        # One worker: the in-memory test database locks whole tables between threads
+        call_command('run_jobs', workers=1, batch_size=3, drain=True, stdout=out)
+        self.assertIn('1 thread worker(s) running.', out.getvalue())
+        self.assertEqual(sorted(job_calls), list(range(20)))
+        self.assertFalse(Job.objects.exists())
 